@@ -0,0 +1,46 @@
+"""add per-viewer indexes on votes for the voted-set lookup
+
+Revision ID: 0dc527678fa5
+Revises: 4d54697cf586
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0dc527678fa5"
+down_revision: Union[str, None] = "4d54697cf586"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # votes_unique_user / votes_unique_device lead with quote_id and cannot
+    # serve "every vote of this viewer"; these can, as index-only scans.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "votes_by_user",
+            "votes",
+            ["user_id", "quote_id"],
+            postgresql_where=sa.text("user_id IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "votes_by_device",
+            "votes",
+            ["device_id", "quote_id"],
+            postgresql_where=sa.text("device_id IS NOT NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("votes_by_device", table_name="votes", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("votes_by_user", table_name="votes", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,83 @@
+"""add indexes on the foreign keys walked by user and quote deletion
+
+Revision ID: 499a30665aab
+Revises: 73477cc0cd62
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "499a30665aab"
+down_revision: Union[str, None] = "73477cc0cd62"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (name, table, column, partial): without them every ON DELETE action and
+# every deletion chunk is a sequential scan of the child table
+INDEXES = [
+    ("ix_devices_user_id", "devices", "user_id", False),
+    ("quotes_by_user", "quotes", "user_id", True),
+    ("quotes_by_moderator", "quotes", "moderated_by", True),
+    ("reports_by_user", "reports", "user_id", True),
+    ("reports_by_reviewer", "reports", "reviewed_by", True),
+    ("ai_moderation_logs_by_quote", "ai_moderation_logs", "quote_id", False),
+    ("ai_moderation_logs_by_override_user", "ai_moderation_logs", "override_by", True),
+    ("monthly_rankings_by_quote", "monthly_rankings", "quote_id", False),
+    ("ix_iap_purchases_user_id", "iap_purchases", "user_id", False),
+    ("ix_pdf_booklets_user_id", "pdf_booklets", "user_id", False),
+    ("ix_notifications_user_id", "notifications", "user_id", False),
+]
+
+PARTITIONED_INDEXES = [
+    ("analytics_events_by_user", "analytics_events", "user_id"),
+    ("analytics_events_by_quote", "analytics_events", "quote_id"),
+]
+
+
+def _partitions(table: str) -> list[str]:
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    ).scalars().all()
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, column, partial in INDEXES:
+            op.create_index(
+                name,
+                table,
+                [column],
+                postgresql_where=sa.text(f"{column} IS NOT NULL") if partial else None,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+        # CONCURRENTLY is not available on a partitioned table: create the
+        # parent index empty (ON ONLY), build each partition's concurrently,
+        # then attach them; the parent becomes valid with the last one
+        for name, table, column in PARTITIONED_INDEXES:
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} ({column}) WHERE {column} IS NOT NULL")
+            for partition in _partitions(table):
+                child = f"{partition}_{column}_idx"
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} ({column}) WHERE {column} IS NOT NULL"
+                )
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def downgrade() -> None:
+    for name, _, _ in PARTITIONED_INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
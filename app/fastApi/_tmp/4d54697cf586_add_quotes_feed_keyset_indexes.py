@@ -0,0 +1,46 @@
+"""add (sort column, id) indexes on quotes for keyset pagination
+
+Revision ID: 4d54697cf586
+Revises: a1b2c3d4e5f6
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4d54697cf586"
+down_revision: Union[str, None] = "a1b2c3d4e5f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+FEED_SORT_COLUMNS = ["created_at", "trending_score", "bayesian_score", "vote_count"]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY so the feed keeps being served while the indexes build;
+    # it cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        for column in FEED_SORT_COLUMNS:
+            op.create_index(
+                f"quotes_feed_{column}",
+                "quotes",
+                [column, "id"],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in FEED_SORT_COLUMNS:
+            op.drop_index(
+                f"quotes_feed_{column}",
+                table_name="quotes",
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
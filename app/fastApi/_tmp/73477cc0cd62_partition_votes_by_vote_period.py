@@ -0,0 +1,129 @@
+"""partition votes by vote_period
+
+Revision ID: 73477cc0cd62
+Revises: d868bc189a23
+Create Date: 2026-10-17
+
+"""
+import re
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "73477cc0cd62"
+down_revision: Union[str, None] = "d868bc189a23"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# partitions created past the current month; python -m app.fastApi.partitions
+# maintain keeps this many ahead afterwards
+MONTHS_AHEAD = 3
+
+PERIOD = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+COLUMNS = "id, quote_id, user_id, device_id, vote_period, created_at"
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _rename_indexes(table: str, suffix: str) -> None:
+    # index names are schema-wide: free them for the new table
+    op.execute(
+        f"""
+        DO $$
+        DECLARE idx record;
+        BEGIN
+            FOR idx IN SELECT indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = '{table}'::regclass LOOP
+                EXECUTE format('ALTER INDEX %s RENAME TO %I', idx.name, left(idx.name, 63 - length('{suffix}')) || '{suffix}');
+            END LOOP;
+        END $$;
+        """
+    )
+
+
+def _create_table(name: str, partitioned: bool) -> None:
+    primary_key = "PRIMARY KEY (id, vote_period)" if partitioned else "PRIMARY KEY (id)"
+    op.execute(
+        f"""
+        CREATE TABLE {name} (
+            id           BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            quote_id     BIGINT NOT NULL CONSTRAINT votes_quote_id_fkey REFERENCES quotes (id) ON DELETE CASCADE,
+            user_id      BIGINT CONSTRAINT votes_user_id_fkey REFERENCES users (id) ON DELETE CASCADE,
+            device_id    TEXT CONSTRAINT votes_device_id_fkey REFERENCES devices (id) ON DELETE CASCADE,
+            vote_period  TEXT NOT NULL,
+            created_at   TIMESTAMPTZ NOT NULL DEFAULT now(),
+            {primary_key},
+            CONSTRAINT votes_user_or_device CHECK ((user_id IS NOT NULL) <> (device_id IS NOT NULL))
+        ){" PARTITION BY LIST (vote_period)" if partitioned else ""}
+        """
+    )
+    # unique indexes of a partitioned table must contain the partition key:
+    # one vote per viewer, quote and period
+    unique_key = ["vote_period"] if partitioned else []
+    op.create_index(
+        "votes_unique_user", name, ["quote_id", "user_id", *unique_key],
+        unique=True, postgresql_where=sa.text("user_id IS NOT NULL"),
+    )
+    op.create_index(
+        "votes_unique_device", name, ["quote_id", "device_id", *unique_key],
+        unique=True, postgresql_where=sa.text("device_id IS NOT NULL"),
+    )
+    op.create_index("votes_by_user", name, ["user_id", "quote_id"], postgresql_where=sa.text("user_id IS NOT NULL"))
+    op.create_index("votes_by_device", name, ["device_id", "quote_id"], postgresql_where=sa.text("device_id IS NOT NULL"))
+
+
+def _reset_identity(table: str) -> None:
+    op.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"coalesce((SELECT max(id) FROM {table}), 0) + 1, false)"
+    )
+
+
+def upgrade() -> None:
+    # Runs in one transaction: votes are blocked while the rows are copied.
+    # Switch VOTE_INGEST_MODE to write_behind (or stop the API) meanwhile.
+    op.execute("LOCK TABLE votes IN EXCLUSIVE MODE")
+    op.rename_table("votes", "votes_old")
+    _rename_indexes("votes_old", "_old")
+    _create_table("votes", partitioned=True)
+
+    existing = op.get_bind().execute(sa.text("SELECT DISTINCT vote_period FROM votes_old")).scalars().all()
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    months = {_add_months(current, offset) for offset in range(MONTHS_AHEAD + 1)}
+    months.update(datetime.strptime(period, "%Y-%m").date() for period in existing if PERIOD.match(period))
+    for month in sorted(months):
+        op.execute(f"CREATE TABLE votes_y{month.year:04d}m{month.month:02d} PARTITION OF votes FOR VALUES IN ('{month:%Y-%m}')")
+    # legacy rows whose period is not 'YYYY-MM'; no DEFAULT partition, it
+    # would forbid DETACH ... CONCURRENTLY
+    invalid = sorted(period for period in existing if not PERIOD.match(period))
+    if invalid:
+        op.execute(
+            f"CREATE TABLE votes_invalid_period PARTITION OF votes FOR VALUES IN ({', '.join(map(_literal, invalid))})"
+        )
+
+    op.execute(f"INSERT INTO votes ({COLUMNS}) SELECT {COLUMNS} FROM votes_old")
+    _reset_identity("votes")
+    op.drop_table("votes_old")
+
+
+def downgrade() -> None:
+    # A viewer may have voted for a quote in several periods: only the first
+    # vote survives. Run python -m app.fastApi.scoring --rebuild afterwards.
+    op.execute("LOCK TABLE votes IN EXCLUSIVE MODE")
+    op.rename_table("votes", "votes_partitioned")
+    _rename_indexes("votes_partitioned", "_part")
+    _create_table("votes", partitioned=False)
+    op.execute(f"INSERT INTO votes ({COLUMNS}) SELECT {COLUMNS} FROM votes_partitioned ORDER BY id ON CONFLICT DO NOTHING")
+    _reset_identity("votes")
+    # drops every partition with it
+    op.drop_table("votes_partitioned")
@@ -0,0 +1,36 @@
+"""add a partial index on the quotes awaiting moderation
+
+Revision ID: 9c3e7a1b5d08
+Revises: b5d1e9a3c7f2
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3e7a1b5d08"
+down_revision: Union[str, None] = "b5d1e9a3c7f2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the moderation workers claim the oldest pending quotes first
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "quotes_pending_moderation",
+            "quotes",
+            ["created_at", "id"],
+            postgresql_where=sa.text("status = 'pending' AND deleted_at IS NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("quotes_pending_moderation", table_name="quotes", postgresql_concurrently=True, if_exists=True)
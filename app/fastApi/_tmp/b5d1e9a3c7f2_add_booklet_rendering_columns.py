@@ -0,0 +1,42 @@
+"""add the booklet renderer's columns and queue index
+
+Revision ID: b5d1e9a3c7f2
+Revises: f2a6c8d0e4b7
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b5d1e9a3c7f2"
+down_revision: Union[str, None] = "f2a6c8d0e4b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable, no default: no table rewrite
+    op.add_column("pdf_booklets", sa.Column("generation_started_at", sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column("pdf_booklets", sa.Column("generation_ms", sa.Integer(), nullable=True))
+
+    # the renderers claim pending booklets in id order
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "pdf_booklets_pending",
+            "pdf_booklets",
+            ["id"],
+            postgresql_where=sa.text("status = 'pending'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("pdf_booklets_pending", table_name="pdf_booklets", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("pdf_booklets", "generation_ms")
+    op.drop_column("pdf_booklets", "generation_started_at")
@@ -0,0 +1,37 @@
+"""add a partial index on the notifications waiting to be pushed
+
+Revision ID: c4e8a1f5b9d2
+Revises: 499a30665aab
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4e8a1f5b9d2"
+down_revision: Union[str, None] = "499a30665aab"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the dispatcher claims pending rows in id order: the index only holds
+    # those, so it stays small however many notifications were sent
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "notifications_pending",
+            "notifications",
+            ["id"],
+            postgresql_where=sa.text("NOT is_sent AND send_error IS NULL"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("notifications_pending", table_name="notifications", postgresql_concurrently=True, if_exists=True)
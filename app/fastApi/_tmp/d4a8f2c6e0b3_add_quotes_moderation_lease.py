@@ -0,0 +1,41 @@
+"""add the moderation workers' lease column and index
+
+Revision ID: d4a8f2c6e0b3
+Revises: 9c3e7a1b5d08
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a8f2c6e0b3"
+down_revision: Union[str, None] = "9c3e7a1b5d08"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # nullable, no default: no table rewrite
+    op.add_column("quotes", sa.Column("moderation_started_at", sa.TIMESTAMP(timezone=True), nullable=True))
+
+    # the workers put expired leases back to pending
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "quotes_moderating",
+            "quotes",
+            ["moderation_started_at"],
+            postgresql_where=sa.text("status = 'moderating'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    op.execute("UPDATE quotes SET status = 'pending' WHERE status = 'moderating'")
+    with op.get_context().autocommit_block():
+        op.drop_index("quotes_moderating", table_name="quotes", postgresql_concurrently=True, if_exists=True)
+    op.drop_column("quotes", "moderation_started_at")
@@ -0,0 +1,109 @@
+"""partition analytics_events by month on created_at
+
+Revision ID: d868bc189a23
+Revises: 0dc527678fa5
+Create Date: 2026-10-17
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d868bc189a23"
+down_revision: Union[str, None] = "0dc527678fa5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# partitions created past the current month; python -m app.fastApi.partitions
+# maintain keeps this many ahead afterwards
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, event_name, user_id, device_id, quote_id, properties, created_at"
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _rename_indexes(table: str, suffix: str) -> None:
+    # index names are schema-wide: free them for the new table
+    op.execute(
+        f"""
+        DO $$
+        DECLARE idx record;
+        BEGIN
+            FOR idx IN SELECT indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = '{table}'::regclass LOOP
+                EXECUTE format('ALTER INDEX %s RENAME TO %I', idx.name, left(idx.name, 63 - length('{suffix}')) || '{suffix}');
+            END LOOP;
+        END $$;
+        """
+    )
+
+
+def _create_table(name: str, partitioned: bool) -> None:
+    primary_key = "PRIMARY KEY (id, created_at)" if partitioned else "PRIMARY KEY (id)"
+    op.execute(
+        f"""
+        CREATE TABLE {name} (
+            id          BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            event_name  TEXT NOT NULL,
+            user_id     BIGINT REFERENCES users (id) ON DELETE SET NULL,
+            device_id   TEXT REFERENCES devices (id) ON DELETE SET NULL,
+            quote_id    BIGINT REFERENCES quotes (id) ON DELETE SET NULL,
+            properties  JSONB,
+            created_at  TIMESTAMPTZ NOT NULL DEFAULT now(),
+            {primary_key}
+        ){" PARTITION BY RANGE (created_at)" if partitioned else ""}
+        """
+    )
+    op.create_index("ix_analytics_events_event_name", name, ["event_name"])
+    op.create_index("ix_analytics_events_created_at", name, ["created_at"])
+
+
+def _copy_rows(source: str, target: str) -> None:
+    op.execute(f"INSERT INTO {target} ({COLUMNS}) SELECT {COLUMNS} FROM {source}")
+    op.execute(
+        f"SELECT setval(pg_get_serial_sequence('{target}', 'id'), "
+        f"coalesce((SELECT max(id) FROM {target}), 0) + 1, false)"
+    )
+
+
+def upgrade() -> None:
+    # Runs in one transaction: ingest is blocked while the rows are copied.
+    # Flush and pause the analytics buffer (or accept the 503s) meanwhile.
+    op.execute("LOCK TABLE analytics_events IN EXCLUSIVE MODE")
+    op.rename_table("analytics_events", "analytics_events_old")
+    _rename_indexes("analytics_events_old", "_old")
+    _create_table("analytics_events", partitioned=True)
+
+    # no DEFAULT partition: it would forbid DETACH ... CONCURRENTLY later on
+    bounds = op.get_bind().execute(sa.text("SELECT min(created_at), max(created_at) FROM analytics_events_old")).one()
+    now = datetime.now(timezone.utc)
+    first = min(bounds[0] or now, now).astimezone(timezone.utc).date().replace(day=1)
+    last = _add_months(max(bounds[1] or now, now).astimezone(timezone.utc).date().replace(day=1), MONTHS_AHEAD)
+    month = first
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE analytics_events_y{month.year:04d}m{month.month:02d} PARTITION OF analytics_events "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+        )
+        month = upper
+
+    _copy_rows("analytics_events_old", "analytics_events")
+    op.drop_table("analytics_events_old")
+
+
+def downgrade() -> None:
+    op.execute("LOCK TABLE analytics_events IN EXCLUSIVE MODE")
+    op.rename_table("analytics_events", "analytics_events_partitioned")
+    _rename_indexes("analytics_events_partitioned", "_part")
+    _create_table("analytics_events", partitioned=False)
+    _copy_rows("analytics_events_partitioned", "analytics_events")
+    # drops every partition with it
+    op.drop_table("analytics_events_partitioned")
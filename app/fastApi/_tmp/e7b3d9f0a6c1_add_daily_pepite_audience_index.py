@@ -0,0 +1,38 @@
+"""add a partial index on the audience of the daily pépite
+
+Revision ID: e7b3d9f0a6c1
+Revises: c4e8a1f5b9d2
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e7b3d9f0a6c1"
+down_revision: Union[str, None] = "c4e8a1f5b9d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the fan-out walks each locale's opted-in users by id, in pages
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "users_daily_pepite_audience",
+            "users",
+            ["locale", "id"],
+            postgresql_where=sa.text(
+                "is_active AND NOT is_banned AND notif_daily_pepite AND push_token IS NOT NULL AND deleted_at IS NULL"
+            ),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("users_daily_pepite_audience", table_name="users", postgresql_concurrently=True, if_exists=True)
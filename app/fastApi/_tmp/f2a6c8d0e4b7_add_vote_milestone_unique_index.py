@@ -0,0 +1,42 @@
+"""add a unique index on the vote milestone notifications
+
+Revision ID: f2a6c8d0e4b7
+Revises: e7b3d9f0a6c1
+Create Date: 2026-10-17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2a6c8d0e4b7"
+down_revision: Union[str, None] = "e7b3d9f0a6c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # a quote's milestone is notified once, whichever vote path reaches it
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "notifications_vote_milestone_unique",
+            "notifications",
+            [sa.text("(data->>'quote_id')"), sa.text("(data->>'milestone')")],
+            unique=True,
+            postgresql_where=sa.text("type = 'vote_milestone'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "notifications_vote_milestone_unique",
+            table_name="notifications",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Annotated
+
+from pydantic import Field, TypeAdapter
+from sqlalchemy import BigInteger, Text, cast, column, insert, select, values
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
+
+from app.fastApi import models, schemas
+from .config import settings
+from .database import SessionLocal, is_transient_error
+from .instrumentation import analytics_events_dropped
+from .partitions import ANALYTICS_EVENTS, create_missing, missing_partition
+
+
+logger = logging.getLogger(__name__)
+
+# at most one attempt a minute to create missing partitions from the writer
+PARTITION_RETRY_SECONDS = 60.0
+
+# a whole request body is parsed and validated in one pydantic-core pass
+events_adapter = TypeAdapter(
+    Annotated[
+        list[schemas.AnalyticsEventCreate],
+        Field(min_length=1, max_length=settings.ANALYTICS_MAX_EVENTS_PER_REQUEST),
+    ]
+)
+
+
+def insert_events(db, rows: list[tuple]) -> None:
+    """One INSERT ... SELECT FROM (VALUES ...) for a batch of events.
+
+    References to a user, device or quote that does not exist (any more) are
+    stored as NULL, like ON DELETE SET NULL would have left them.
+    """
+    batch = values(
+        column("event_name", Text),
+        column("user_id", BigInteger),
+        column("device_id", Text),
+        column("quote_id", BigInteger),
+        column("properties", JSONB),
+        column("created_at", TIMESTAMP(timezone=True)),
+        name="e",
+    ).data(rows)
+    source = (
+        select(
+            cast(batch.c.event_name, Text),
+            models.User.id,
+            models.Device.id,
+            models.Quote.id,
+            cast(batch.c.properties, JSONB),
+            cast(batch.c.created_at, TIMESTAMP(timezone=True)),
+        )
+        .select_from(batch)
+        .outerjoin(models.User, models.User.id == batch.c.user_id)
+        .outerjoin(models.Device, models.Device.id == batch.c.device_id)
+        .outerjoin(models.Quote, models.Quote.id == batch.c.quote_id)
+    )
+    db.execute(
+        insert(models.AnalyticsEvent).from_select(
+            ["event_name", "user_id", "device_id", "quote_id", "properties", "created_at"], source
+        )
+    )
+
+
+class EventBuffer:
+    """Bounded in-memory buffer of analytics events, written in batches.
+
+    A background thread writes a batch as soon as ``batch_size`` events are
+    waiting, or every ``flush_interval`` seconds otherwise. ``offer`` refuses
+    a request outright when it would overflow ``max_events``, which the
+    endpoint turns into a 503 so clients back off. A batch that fails because
+    the database is unavailable is put back in front of the buffer (space
+    permitting) and retried. A batch that finds no analytics_events
+    partition (the partition cron lapsed) creates the missing ones and is
+    retried. Otherwise it is written row by row and the events that fail on
+    their own are dropped. Dropped events are counted in
+    analytics_events_dropped_total (GET /metrics).
+    """
+
+    def __init__(self, session_factory, batch_size: int, flush_interval: float, max_events: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self._events: deque = deque()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+        self._partitions_tried_at = float("-inf")
+
+    def offer(self, events: list[schemas.AnalyticsEventCreate]) -> bool:
+        received_at = datetime.now(timezone.utc)
+        with self._cond:
+            if len(self._events) + len(events) > self.max_events:
+                return False
+            self._events.extend(
+                (e.event_name, e.user_id, e.device_id, e.quote_id, e.properties, received_at) for e in events
+            )
+            if len(self._events) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        return len(self._events)
+
+    def start(self) -> None:
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="analytics-events", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _take(self) -> list[tuple]:
+        with self._cond:
+            return [self._events.popleft() for _ in range(min(self.batch_size, len(self._events)))]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stop or len(self._events) >= self.batch_size, self.flush_interval)
+                stopping = self._stop
+            # the writer thread must outlive any error: a dead thread turns every later POST into a 503
+            try:
+                while batch := self._take():
+                    if not self._write(batch):
+                        break
+                    if not stopping and len(self._events) < self.batch_size:
+                        break
+            except Exception:
+                logger.exception("analytics writer failed")
+            if stopping:
+                return
+
+    def _requeue(self, rows: list[tuple]) -> None:
+        with self._cond:
+            room = max(0, self.max_events - len(self._events))
+            self._events.extendleft(reversed(rows[:room]))
+        if len(rows) > room:
+            logger.warning("analytics buffer full, %d deferred events dropped", len(rows) - room)
+            analytics_events_dropped.inc(("buffer_full",), len(rows) - room)
+
+    def _create_partitions(self) -> bool:
+        """Create the missing analytics_events partitions; True when some were."""
+        now = time.monotonic()
+        if now - self._partitions_tried_at < PARTITION_RETRY_SECONDS:
+            return False
+        self._partitions_tried_at = now
+        try:
+            created = create_missing(ANALYTICS_EVENTS)
+        except Exception:
+            logger.exception("analytics: could not create the missing partitions")
+            return False
+        logger.warning("analytics: no partition for the events, created %s", created)
+        return bool(created)
+
+    def _write(self, batch: list[tuple]) -> bool:
+        """Write ``batch``; False when the database is unavailable and the rest was put back."""
+        started = time.perf_counter()
+        with self.session_factory() as db:
+            try:
+                insert_events(db, batch)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                if is_transient_error(exc):
+                    logger.warning("analytics batch of %d events deferred: %r", len(batch), exc)
+                    self._requeue(batch)
+                    return False
+                if missing_partition(exc) and self._create_partitions():
+                    return self._write(batch)
+                logger.warning("analytics batch of %d events failed (%r), retrying row by row", len(batch), exc)
+                return self._write_one_by_one(db, batch)
+        logger.debug("analytics: %d events written in %.3fs", len(batch), time.perf_counter() - started)
+        return True
+
+    def _write_one_by_one(self, db, batch: list[tuple]) -> bool:
+        for i, row in enumerate(batch):
+            try:
+                insert_events(db, [row])
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                if is_transient_error(exc):
+                    self._requeue(batch[i:])
+                    return False
+                logger.exception("dropping analytics event %r", row[0])
+                analytics_events_dropped.inc(("no_partition" if missing_partition(exc) else "rejected",))
+        return True
+
+
+analytics_buffer = EventBuffer(
+    SessionLocal,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    flush_interval=settings.ANALYTICS_FLUSH_INTERVAL_SECONDS,
+    max_events=settings.ANALYTICS_BUFFER_MAX,
+)
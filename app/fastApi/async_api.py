@@ -0,0 +1,142 @@
+# Async versions of the users, quotes and votes endpoints (DB_ASYNC=true).
+# Same routes and behaviour as main.py, on an AsyncSession.
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.fastApi import (
+    deletion, exports, fast_json, feed, milestones, models, pagination, read_models, schemas, vote_ingest,
+)
+from app.fastApi.config import settings
+from app.fastApi.feed_cache import feed_cache
+from app.fastApi.leaderboard import current_period, leaderboard
+from app.fastApi.vote_ingest import vote_writer
+from app.fastApi.voted_sets import load_statement, viewer_key, voted_sets
+from .deps import get_async_db
+
+
+router = APIRouter()
+
+
+# users endpoints:
+@router.get("/users", response_model=list[schemas.UserRead])
+async def read_users(db: AsyncSession = Depends(get_async_db)):
+    users = (await db.execute(read_models.users_statement(limit=settings.LIST_STREAM_THRESHOLD + 1))).all()
+    if len(users) <= settings.LIST_STREAM_THRESHOLD:
+        return fast_json.typed_response(list[schemas.UserRead], users)
+    return exports.json_array_response(read_models.users_statement(), use_async=True)
+
+@router.get("/users/{user_id}", response_model=schemas.UserRead)
+async def read_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user_to_get = await db.get(models.User, user_id)
+    if not user_to_get:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user_to_get
+
+@router.post("/users", response_model=schemas.UserRead)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    new_user = models.User(display_name=user.display_name, email=user.email)
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return new_user
+
+@router.delete("/users/{user_id}", response_model=schemas.UserRead)
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
+    user_deleted = await db.run_sync(deletion.delete_user, user_id)
+    if user_deleted is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    feed_cache.invalidate()
+    voted_sets.evict(viewer_key(user_id, None))
+    return user_deleted._asdict()
+
+@router.put("/users/{user_id}", response_model=schemas.UserRead)
+async def update_user(user_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db)):
+    user_to_update = await db.get(models.User, user_id)
+    if not user_to_update:
+        raise HTTPException(status_code=404, detail="User not found")
+    user_to_update.display_name = user.display_name
+    user_to_update.email = user.email
+    await db.commit()
+    await db.refresh(user_to_update)
+    return user_to_update
+
+
+# quotes endpoints:
+@router.get("/quotes", response_model=schemas.QuotePage)
+async def get_quotes(
+    limit: int = Query(100, ge=1),
+    sort: str = "created_at",
+    order: str = "desc",
+    cursor: str | None = None,
+    language: str | None = None,
+    user_id: int | None = None,
+    device_id: str | None = None,
+    vote_period: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if sort not in pagination.SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail="Invalid sort column")
+    order = "desc" if order == "desc" else "asc"
+
+    cache_key = (sort, order, limit, language, cursor)
+    cache_version = feed_cache.version(sort)
+    page = feed_cache.get(cache_key)
+    if page is None:
+        try:
+            stmt = feed.feed_statement(sort, order, limit, language, cursor)
+        except pagination.InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        page = feed.cache_page((await db.execute(stmt)).all(), sort, order, limit)
+        feed_cache.put(cache_key, page, cache_version)
+
+    viewer = viewer_key(user_id, device_id)
+
+    async def fetch_voted():
+        return (await db.execute(load_statement(viewer))).scalars().all()
+
+    voted_quote_ids = await voted_sets.aget_or_load(viewer, fetch_voted)
+    return fast_json.typed_response(schemas.QuotePage, feed.quote_page(page, voted_quote_ids))
+
+@router.get("/quotes/{quote_id}", response_model=schemas.QuoteRead)
+async def read_quote(quote_id: int, db: AsyncSession = Depends(get_async_db)):
+    quote_to_get = (await db.execute(read_models.quote_statement(quote_id))).first()
+    if not quote_to_get:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    return quote_to_get
+
+@router.post("/quotes", response_model=schemas.QuoteRead)
+async def create_quote(quote: schemas.QuoteCreate, db: AsyncSession = Depends(get_async_db)):
+    new_quote = models.Quote(quote=quote.quote, child_name=quote.child_name)
+    db.add(new_quote)
+    await db.commit()
+    feed_cache.invalidate()
+    await db.refresh(new_quote)
+    return new_quote
+
+
+@router.delete("/quotes/{quote_id}", response_model=schemas.QuoteRead)
+async def delete_quote(quote_id: int, db: AsyncSession = Depends(get_async_db)):
+    quote_deleted = await db.run_sync(deletion.delete_quote, quote_id)
+    if quote_deleted is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    feed_cache.invalidate()
+    return quote_deleted._asdict()
+
+
+#  votes endpoints:
+@router.post("/votes", response_model=schemas.VoteRead, responses={202: {"model": schemas.VoteQueued}})
+async def create_vote(vote: schemas.VoteCreate, db: AsyncSession = Depends(get_async_db)):
+    if vote_writer is not None:
+        return vote_ingest.accept(vote)
+    # one vote per viewer and quote; its month (the partition key) is the server's, never the client's
+    period = current_period()
+    # insert, vote_count bump and milestone notification in one round trip
+    row = (await db.execute(milestones.vote_statement(vote, period))).first()
+    await db.commit()
+    if row is None:
+        raise HTTPException(status_code=409, detail="Already voted")
+    feed_cache.invalidate("vote_count")
+    voted_sets.add(viewer_key(vote.user_id, vote.device_id), vote.quote_id)
+    leaderboard.bump(period, vote.quote_id)
+    return row._asdict()
@@ -0,0 +1,457 @@
+# PDF booklets: pending pdf_booklets rows -> PDF files on local disk.
+#
+#   python -m app.fastApi.booklets                 # render what is pending, then exit
+#   python -m app.fastApi.booklets --loop          # keep polling, for a worker process
+#   python -m app.fastApi.booklets --workers 4
+#
+# The queue is pdf_booklets.status (pending -> generating -> ready | error).
+# The dispatcher claims pending rows with FOR UPDATE SKIP LOCKED, over the
+# pdf_booklets_pending partial index, and hands each one to a renderer
+# process. There are BOOKLET_WORKERS of them and a booklet goes to its
+# user's, so a user's regenerations find their pages already rendered.
+#
+# A renderer fetches the booklet's quotes with one = ANY(quote_ids) query.
+# Each quote is one page, and its content stream (laid out and deflated) is
+# kept in the process's LRU of BOOKLET_FRAGMENT_CACHE_MAX_BYTES, keyed by a
+# hash of what the page prints: a booklet rebuilt with mostly the same
+# quotes only lays out the new ones. Objects are written to BOOKLET_DIR as
+# they are produced; the file size and render time are recorded on the row.
+#
+# A row left in generating for BOOKLET_STALE_SECONDS, whose renderer was
+# killed with the dispatcher, is put back to pending.
+
+import argparse
+import hashlib
+import logging
+import os
+import time
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from sqlalchemy import BigInteger, any_, bindparam, func, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal, engine
+
+
+logger = logging.getLogger(__name__)
+
+# bump when the page layout changes: cached pages of the old layout are not reused
+LAYOUT_VERSION = 1
+
+PAGE_WIDTH, PAGE_HEIGHT = 420, 595      # A5, in points
+MARGIN = 48
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+QUOTE_SIZES = (16, 14, 12, 10)          # the first one whose page fits
+
+# Helvetica advance widths (1/1000 em) of ASCII 32..126, from the standard AFM
+_ASCII_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+)
+WIDTHS = {chr(32 + i): width for i, width in enumerate(_ASCII_WIDTHS)}
+WIDTHS.update({"«": 556, "»": 556, "“": 333, "”": 333, "’": 222, "…": 1000, "—": 1000, "–": 556, "œ": 944, "Œ": 1000})
+
+FONTS = {
+    "F1": "Helvetica",
+    "F2": "Helvetica-Bold",
+    "F3": "Helvetica-Oblique",
+}
+
+
+def char_width(char: str) -> int:
+    width = WIDTHS.get(char)
+    if width is None:
+        # accented letters are as wide as their base letter
+        base = unicodedata.normalize("NFD", char)[:1]
+        width = WIDTHS.get(base, 556)
+    return width
+
+
+def text_width(text: str, size: float) -> float:
+    return sum(char_width(char) for char in text) * size / 1000
+
+
+def wrap(text: str, size: float, width: float = TEXT_WIDTH) -> list[str]:
+    """Greedy line breaking; explicit newlines are kept, overlong words split."""
+    lines = []
+    for paragraph in text.splitlines() or [""]:
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if text_width(candidate, size) <= width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            line = ""
+            for char in word:
+                if line and text_width(line + char, size) > width:
+                    lines.append(line)
+                    line = ""
+                line += char
+        lines.append(line)
+    return lines
+
+
+def pdf_string(text: str) -> bytes:
+    """A PDF literal string in WinAnsiEncoding; other characters print as '?'."""
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def text_block(lines: list[str], font: str, size: float, leading: float, x: float, y: float, gray: float = 0) -> bytes:
+    ops = [b"BT /%s %g Tf %g TL %g g %g %g Td" % (font.encode(), size, leading, gray, x, y)]
+    for i, line in enumerate(lines):
+        ops.append((b"T* " if i else b"") + pdf_string(line) + b" Tj")
+    ops.append(b"ET")
+    return b"\n".join(ops) + b"\n"
+
+
+def age_label(years: int, months: int) -> str:
+    parts = []
+    if years:
+        parts.append(f"{years} an" if years == 1 else f"{years} ans")
+    if months or not years:
+        parts.append(f"{months} mois")
+    return " et ".join(parts)
+
+
+def fragment_key(quote) -> bytes:
+    """Identifies what a quote's page prints: an edited quote gets a new page."""
+    fields = (LAYOUT_VERSION, quote.quote, quote.child_name, quote.child_age_years, quote.child_age_months, quote.context)
+    return hashlib.blake2b(repr(fields).encode(), digest_size=16).digest()
+
+
+def quote_page(quote) -> bytes:
+    """The deflated content stream of a quote's page."""
+    signature = f"— {quote.child_name}, {age_label(quote.child_age_years, quote.child_age_months)}"
+    context = wrap(quote.context, 9) if quote.context else []
+    for size in QUOTE_SIZES:
+        lines = wrap(f"“{quote.quote}”", size)
+        height = len(lines) * size * 1.3 + 40 + len(context) * 12
+        if height <= PAGE_HEIGHT - 2 * MARGIN - 40:
+            break
+    top = PAGE_HEIGHT - MARGIN - 40
+    content = text_block(lines, "F3", size, size * 1.3, MARGIN, top)
+    y = top - len(lines) * size * 1.3 - 16
+    content += text_block([signature], "F2", 11, 14, MARGIN, y)
+    if context:
+        content += text_block(context, "F1", 9, 12, MARGIN, y - 24, gray=0.4)
+    return zlib.compress(content, 6)
+
+
+def cover_page(booklet, pages: int) -> bytes:
+    title = booklet.title or (f"Les pépites de {booklet.child_name}" if booklet.child_name else "Mes pépites")
+    content = text_block(wrap(title, 24), "F2", 24, 30, MARGIN, PAGE_HEIGHT / 2 + 40)
+    content += text_block([f"{pages} pépites"], "F1", 12, 14, MARGIN, PAGE_HEIGHT / 2 - 10, gray=0.4)
+    return zlib.compress(content, 6)
+
+
+def page_number(number: int) -> bytes:
+    label = str(number)
+    x = (PAGE_WIDTH - text_width(label, 9)) / 2
+    return text_block([label], "F1", 9, 11, x, MARGIN / 2, gray=0.4)
+
+
+class FragmentCache:
+    """Deflated page streams by fragment key, LRU-evicted under a byte budget.
+
+    One per renderer process, shared by every booklet the process renders.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[bytes, bytes] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: bytes, render) -> bytes:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = render()
+        if len(data) <= self.max_bytes:
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return data
+
+
+fragments = FragmentCache(settings.BOOKLET_FRAGMENT_CACHE_MAX_BYTES)
+
+
+class PdfWriter:
+    """PDF 1.4 written object by object to ``file``, cross-reference table last."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offsets: list[int | None] = [None]     # by object number, 0 is the free list head
+        self.size = 0
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data: bytes) -> None:
+        self.file.write(data)
+        self.size += len(data)
+
+    def reserve(self) -> int:
+        """An object number to refer to before the object is written."""
+        self.offsets.append(None)
+        return len(self.offsets) - 1
+
+    def add(self, body: bytes, number: int | None = None) -> int:
+        number = number or self.reserve()
+        self.offsets[number] = self.size
+        self._write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        return number
+
+    def add_stream(self, data: bytes, deflated: bool = True) -> int:
+        flate = b" /Filter /FlateDecode" if deflated else b""
+        return self.add(b"<< /Length %d%s >>\nstream\n%s\nendstream" % (len(data), flate, data))
+
+    def close(self, root: int) -> int:
+        """Write the cross-reference table and trailer; returns the file size."""
+        xref = self.size
+        entries = b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets[1:])
+        self._write(
+            b"xref\n0 %d\n0000000000 65535 f \n%strailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(self.offsets), entries, len(self.offsets), root, xref)
+        )
+        return self.size
+
+
+def write_booklet(file, booklet, quotes) -> int:
+    """Write the PDF of ``booklet``: a cover, then one page per quote. Returns its size."""
+    pdf = PdfWriter(file)
+    catalog, pages = pdf.reserve(), pdf.reserve()
+    fonts = b" ".join(
+        b"/%s %d 0 R"
+        % (name.encode(), pdf.add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % base.encode()))
+        for name, base in FONTS.items()
+    )
+    resources = pdf.add(b"<< /Font << %s >> >>" % fonts)
+
+    def add_page(streams: list[int]) -> int:
+        contents = b" ".join(b"%d 0 R" % number for number in streams)
+        return pdf.add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %d 0 R /Contents [%s] >>"
+            % (pages, PAGE_WIDTH, PAGE_HEIGHT, resources, contents)
+        )
+
+    kids = [add_page([pdf.add_stream(cover_page(booklet, len(quotes)))])]
+    for number, quote in enumerate(quotes, start=2):
+        page = fragments.get_or_render(fragment_key(quote), lambda: quote_page(quote))
+        kids.append(add_page([pdf.add_stream(page), pdf.add_stream(page_number(number), deflated=False)]))
+    pdf.add(
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % kid for kid in kids), len(kids)),
+        number=pages,
+    )
+    pdf.add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages, number=catalog)
+    return pdf.close(catalog)
+
+
+def fetch_quotes(db, quote_ids: list[int]) -> list:
+    """The booklet's quotes that still exist, in the booklet's order, in one query."""
+    Q = models.Quote
+    rows = db.execute(
+        select(Q.id, Q.quote, Q.child_name, Q.child_age_years, Q.child_age_months, Q.context).where(
+            Q.id == any_(bindparam("quote_ids", quote_ids, type_=ARRAY(BigInteger))), Q.deleted_at.is_(None)
+        )
+    ).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[quote_id] for quote_id in quote_ids if quote_id in by_id]
+
+
+def storage_path(booklet) -> str:
+    return os.path.join(settings.BOOKLET_DIR, str(booklet.user_id), f"booklet-{booklet.id}.pdf")
+
+
+def finish(db, booklet_id: int, **values) -> None:
+    B = models.PdfBooklet
+    db.execute(update(B).where(B.id == booklet_id, B.status == "generating").values(**values))
+    db.commit()
+
+
+def render_booklet(booklet_id: int) -> dict:
+    """Render a claimed booklet and record the outcome; runs in a renderer process."""
+    B = models.PdfBooklet
+    started = time.perf_counter()
+    hits, misses = fragments.hits, fragments.misses
+    with SessionLocal() as db:
+        booklet = db.execute(
+            select(B.id, B.user_id, B.quote_ids, B.child_name, B.title).where(B.id == booklet_id)
+        ).first()
+        if booklet is None:
+            return {"status": "gone"}
+        quotes = fetch_quotes(db, booklet.quote_ids)
+        if not quotes:
+            finish(db, booklet_id, status="error", error_message="none of the booklet's quotes exists anymore")
+            return {"status": "error"}
+        path = storage_path(booklet)
+        partial = f"{path}.{os.getpid()}.part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(partial, "wb") as file:
+                size = write_booklet(file, booklet, quotes)
+            os.replace(partial, path)
+        except Exception as exc:
+            logger.exception("booklet %d: rendering failed", booklet_id)
+            if os.path.exists(partial):
+                os.remove(partial)
+            finish(db, booklet_id, status="error", error_message=str(exc)[:500])
+            return {"status": "error"}
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
+        finish(
+            db,
+            booklet_id,
+            status="ready",
+            error_message=None,
+            storage_path=path,
+            file_size_bytes=size,
+            generation_ms=elapsed_ms,
+            generated_at=func.now(),
+        )
+    reused = fragments.hits - hits
+    logger.info(
+        "booklet %d: %d pages, %d bytes in %d ms, %d/%d quote pages reused",
+        booklet_id, len(quotes) + 1, size, elapsed_ms, reused, reused + fragments.misses - misses,
+    )
+    return {"status": "ready", "bytes": size, "ms": elapsed_ms, "pages_reused": reused}
+
+
+def claim(db, limit: int) -> list:
+    """Mark up to ``limit`` pending booklets as generating and commit; returns (id, user_id) rows."""
+    B = models.PdfBooklet
+    pending = (
+        select(B.id).where(B.status == "pending").order_by(B.id).limit(limit).with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(B)
+        .where(B.id.in_(pending))
+        .values(status="generating", generation_started_at=func.now(), error_message=None)
+        .returning(B.id, B.user_id)
+    ).all()
+    db.commit()
+    return rows
+
+
+def requeue_stale(db) -> int:
+    """Put back to pending the booklets whose renderer never reported."""
+    B = models.PdfBooklet
+    cutoff = func.now() - timedelta(seconds=settings.BOOKLET_STALE_SECONDS)
+    result = db.execute(
+        update(B)
+        .where(B.status == "generating", or_(B.generation_started_at < cutoff, B.generation_started_at.is_(None)))
+        .values(status="pending")
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _init_renderer() -> None:
+    # connections inherited from the dispatcher through fork belong to it
+    engine.dispose(close=False)
+
+
+class RendererPool:
+    """One single-process executor per renderer; a booklet goes to its user's."""
+
+    def __init__(self, workers: int):
+        self.executors = [self._executor() for _ in range(workers)]
+
+    @staticmethod
+    def _executor() -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, initializer=_init_renderer)
+
+    def _index(self, user_id: int) -> int:
+        return user_id % len(self.executors)
+
+    def submit(self, booklet_id: int, user_id: int):
+        return self.executors[self._index(user_id)].submit(render_booklet, booklet_id)
+
+    def restart(self, user_id: int) -> None:
+        """Replace a renderer whose process died (its cache goes with it)."""
+        index = self._index(user_id)
+        self.executors[index].shutdown(wait=False, cancel_futures=True)
+        self.executors[index] = self._executor()
+
+    def shutdown(self) -> None:
+        for executor in self.executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def dispatch_batch(pool: RendererPool, workers: int) -> Counter | None:
+    """Claim, render and wait for one batch; None when nothing was pending."""
+    with SessionLocal() as db:
+        if requeue_stale(db):
+            logger.warning("booklets: stale generating rows put back to pending")
+        # two per renderer: one rendering, one queued behind it
+        claimed = claim(db, 2 * workers)
+    if not claimed:
+        return None
+    stats = Counter()
+    futures = [(row, pool.submit(row.id, row.user_id)) for row in claimed]
+    for row, future in futures:
+        try:
+            outcome = future.result()
+        except Exception as exc:
+            # the renderer died (or could not reach the database): do not retry a booklet that may kill it again
+            logger.exception("booklet %d: renderer failed", row.id)
+            if isinstance(exc, BrokenProcessPool):
+                pool.restart(row.user_id)
+            with SessionLocal() as db:
+                finish(db, row.id, status="error", error_message=f"renderer failed: {exc!r}"[:500])
+            outcome = {"status": "error"}
+        stats[outcome["status"]] += 1
+        stats["bytes"] += outcome.get("bytes", 0)
+        stats["pages_reused"] += outcome.get("pages_reused", 0)
+    return stats
+
+
+def run(workers: int = settings.BOOKLET_WORKERS, loop: bool = False) -> Counter:
+    total = Counter()
+    pool = RendererPool(workers)
+    try:
+        while True:
+            stats = dispatch_batch(pool, workers)
+            if stats is not None:
+                logger.info(
+                    "booklets: ready=%d error=%d bytes=%d pages_reused=%d",
+                    stats["ready"], stats["error"], stats["bytes"], stats["pages_reused"],
+                )
+                total += stats
+                continue
+            if not loop:
+                return total
+            time.sleep(settings.BOOKLET_POLL_SECONDS)
+    finally:
+        pool.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Render the pending PDF booklets.")
+    parser.add_argument("--workers", type=int, default=settings.BOOKLET_WORKERS, help="renderer processes")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new booklets")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    run(args.workers, args.loop)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,116 @@
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # Async stack (AsyncEngine on asyncpg) for the users/quotes/votes endpoints.
+    # ASYNC_DATABASE_URL defaults to DATABASE_URL with the asyncpg driver.
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: str | None = None
+
+    # Connection pool, applied to both engines (per worker process)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Feed cache (GET /quotes)
+    FEED_CACHE_MAX_ENTRIES: int = 1024
+    FEED_CACHE_TTL_SECONDS: float = 30.0
+
+    # Per-viewer voted sets (user_has_voted overlay)
+    VOTED_SETS_MAX_BYTES: int = 64 * 1024 * 1024
+    VOTED_SETS_TTL_SECONDS: float = 300.0
+
+    # Vote ingestion: one transaction per vote, or queued and written in batches
+    VOTE_INGEST_MODE: Literal["sync", "write_behind"] = "sync"
+    VOTE_BATCH_SIZE: int = 500
+    VOTE_FLUSH_INTERVAL_SECONDS: float = 0.5
+    VOTE_QUEUE_MAX: int = 50_000
+
+    # Scoring engine (python -m app.fastApi.scoring)
+    SCORING_HALF_LIFE_HOURS: float = 24.0
+    SCORING_PRIOR_WEIGHT_DAYS: float = 7.0
+    SCORING_BATCH_SIZE: int = 50_000
+    SCORING_LAG_SECONDS: float = 30.0
+
+    # Monthly ranking snapshots (python -m app.fastApi.rankings)
+    RANKING_TOP_N: int = 100
+
+    # Live leaderboard of the current vote_period (GET /leaderboard/current)
+    LEADERBOARD_SIZE: int = 100
+    LEADERBOARD_RECONCILE_SECONDS: float = 60.0
+
+    # Analytics events ingestion (POST /analytics/events)
+    ANALYTICS_MAX_EVENTS_PER_REQUEST: int = 500
+    ANALYTICS_BATCH_SIZE: int = 1000
+    ANALYTICS_FLUSH_INTERVAL_SECONDS: float = 2.0
+    ANALYTICS_BUFFER_MAX: int = 100_000
+
+    # Monthly partitions (python -m app.fastApi.partitions maintain)
+    ANALYTICS_RETENTION_DAYS: int = 90
+    PARTITIONS_MONTHS_AHEAD: int = 3
+
+    # Streaming exports (GET /exports/{table}); list endpoints stream above the threshold
+    EXPORT_CHUNK_SIZE: int = 1000
+    LIST_STREAM_THRESHOLD: int = 1000
+
+    # GDPR data export archives (GET/POST /users/{id}/export)
+    GDPR_EXPORT_DIR: str = "gdpr_exports"
+    GDPR_EXPORT_WORKERS: int = 2
+    GDPR_EXPORT_STALE_SECONDS: float = 900.0       # a queued/running job silent that long has failed
+    GDPR_EXPORT_RETENTION_SECONDS: float = 7 * 86400.0
+
+    # Bulk deletion of users and quotes: rows per DELETE/UPDATE transaction
+    DELETE_CHUNK_SIZE: int = 5000
+
+    # Request instrumentation (GET /metrics): share of access logs kept, slow requests are always logged
+    LOG_SAMPLE_RATE: float = 0.01
+    SLOW_REQUEST_SECONDS: float = 1.0
+
+    # Push notifications through Expo (python -m app.fastApi.push)
+    EXPO_PUSH_URL: str = "https://exp.host/--/api/v2/push/send"
+    EXPO_ACCESS_TOKEN: str | None = None
+    PUSH_CLAIM_BATCH: int = 1000
+    PUSH_CONCURRENCY: int = 8
+    PUSH_TIMEOUT_SECONDS: float = 10.0
+    PUSH_POLL_SECONDS: float = 5.0
+
+    # Daily pépite fan-out (python -m app.fastApi.daily_pepite)
+    DAILY_PEPITE_BATCH_SIZE: int = 5000
+    DAILY_PEPITE_LOOKBACK_DAYS: int = 7
+
+    # Vote milestones notified to the quote's author
+    VOTE_MILESTONES: list[int] = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+    # PDF booklet rendering (python -m app.fastApi.booklets); the fragment cache is per renderer process
+    BOOKLET_DIR: str = "booklets"
+    BOOKLET_WORKERS: int = 2
+    BOOKLET_FRAGMENT_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    BOOKLET_POLL_SECONDS: float = 5.0
+    BOOKLET_STALE_SECONDS: float = 600.0
+
+    # AI moderation of pending quotes (python -m app.fastApi.moderation); prices in USD per million tokens
+    OPENAI_API_KEY: str | None = None
+    MODERATION_API_URL: str = "https://api.openai.com/v1/chat/completions"
+    MODERATION_MODEL: str = "gpt-4o-mini"
+    MODERATION_PROMPT_USD_PER_MTOK: float = 0.15
+    MODERATION_COMPLETION_USD_PER_MTOK: float = 0.60
+    MODERATION_CLAIM_BATCH: int = 200
+    MODERATION_QUOTES_PER_REQUEST: int = 20
+    MODERATION_CONCURRENCY: int = 4
+    MODERATION_REQUESTS_PER_MINUTE: float = 300.0
+    MODERATION_TIMEOUT_SECONDS: float = 60.0
+    MODERATION_POLL_SECONDS: float = 5.0
+    MODERATION_MIN_SAFETY: float = 0.8      # approvals below it are flagged for a human
+    MODERATION_STATS_WINDOW_SECONDS: float = 900.0
+    MODERATION_LEASE_SECONDS: float = 600.0     # a quote left moderating longer is put back to pending
+
     class Config:
         env_file = ".env.local"
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,192 @@
+# Daily pépite: one quote of the day, pushed to every opted-in user.
+#
+#   python -m app.fastApi.daily_pepite             # today's (UTC), from a daily cron
+#   python -m app.fastApi.daily_pepite --date 2026-10-17
+#
+# The quote is picked once and the title/body rendered once per locale; the
+# notifications are then written by INSERT ... SELECT straight from users,
+# DAILY_PEPITE_BATCH_SIZE users at a time, walking the audience by keyset
+# (locale, id) over the users_daily_pepite_audience partial index. No user
+# row goes through Python. The push dispatcher sends them afterwards.
+#
+# The run's state lives in app_config under daily_pepite.<date> and is
+# updated in each batch's transaction, under an advisory lock: a rerun, or
+# a concurrent run, resumes after the last committed batch and never
+# notifies anyone twice.
+
+import argparse
+import json
+import logging
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, literal, not_, select
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "daily_pepite.{}"
+BODY_MAX_CHARS = 140
+
+# locale -> (title, body); other locales get DEFAULT_LOCALE's
+TEMPLATES = {
+    "fr": ("La pépite du jour ✨", "« {quote} » — {child_name}"),
+    "en": ("Today's gem ✨", "“{quote}” — {child_name}"),
+}
+DEFAULT_LOCALE = "fr"
+
+
+def _get_state(db, day: date) -> dict | None:
+    value = db.execute(select(models.AppConfig.value).where(models.AppConfig.key == STATE_KEY.format(day))).scalar()
+    return None if value is None else json.loads(value)
+
+
+def _set_state(db, day: date, state: dict) -> None:
+    stmt = pg_insert(models.AppConfig).values(
+        key=STATE_KEY.format(day), value=json.dumps(state), description="daily pépite fan-out"
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.AppConfig.key],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+    )
+
+
+def recent_pepites(db, day: date) -> list[int]:
+    """Quotes already chosen in the last DAILY_PEPITE_LOOKBACK_DAYS days."""
+    keys = [STATE_KEY.format(day - timedelta(days=n)) for n in range(1, settings.DAILY_PEPITE_LOOKBACK_DAYS + 1)]
+    values = db.execute(select(models.AppConfig.value).where(models.AppConfig.key.in_(keys))).scalars()
+    return [json.loads(value)["quote_id"] for value in values]
+
+
+def pick_quote(db, day: date):
+    """The best trending approved quote published lately and not picked already."""
+    Q = models.Quote
+    since = datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc) - timedelta(
+        days=settings.DAILY_PEPITE_LOOKBACK_DAYS
+    )
+    stmt = (
+        select(Q.id, Q.quote, Q.child_name)
+        .where(Q.status == models.ModerationStatusEnum.approved.value, Q.published_at >= since, Q.deleted_at.is_(None))
+        .order_by(Q.trending_score.desc(), Q.id.desc())
+        .limit(1)
+    )
+    excluded = recent_pepites(db, day)
+    if excluded:
+        stmt = stmt.where(Q.id.not_in(excluded))
+    return db.execute(stmt).first()
+
+
+def render(quote, locale: str) -> tuple[str, str]:
+    title, body = TEMPLATES.get(locale, TEMPLATES[DEFAULT_LOCALE])
+    text = quote.quote if len(quote.quote) <= BODY_MAX_CHARS else quote.quote[: BODY_MAX_CHARS - 1].rstrip() + "…"
+    return title, body.format(quote=text, child_name=quote.child_name)
+
+
+def audience_filter():
+    """Same predicate as the users_daily_pepite_audience partial index."""
+    U = models.User
+    return (
+        U.is_active,
+        not_(U.is_banned),
+        U.notif_daily_pepite,
+        U.push_token.is_not(None),
+        U.deleted_at.is_(None),
+    )
+
+
+def insert_batch(db, quote, locale: str | None, after_id: int) -> list[int]:
+    """Notify the next batch of the audience of ``locale`` (None: every locale without a template).
+
+    Returns the ids of the users notified, in order.
+    """
+    U, N = models.User, models.Notification
+    title, body = render(quote, locale or DEFAULT_LOCALE)
+    locale_filter = U.locale == locale if locale is not None else U.locale.not_in(list(TEMPLATES))
+    page = (
+        select(U.id)
+        .where(*audience_filter(), locale_filter, U.id > after_id)
+        .order_by(U.id)
+        .limit(settings.DAILY_PEPITE_BATCH_SIZE)
+        .subquery()
+    )
+    source = select(
+        page.c.id,
+        literal(models.NotificationTypeEnum.daily_pepite.value),
+        literal(title),
+        literal(body),
+        literal({"type": models.NotificationTypeEnum.daily_pepite.value, "quote_id": quote.id}, JSONB),
+    )
+    return sorted(
+        db.execute(
+            pg_insert(N).from_select(["user_id", "type", "title", "body", "data"], source).returning(N.user_id)
+        ).scalars()
+    )
+
+
+def _lock(db, day: date) -> None:
+    # concurrent runs for the same day take turns, batch by batch
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(STATE_KEY.format(day)))))
+
+
+def fan_out(db, day: date) -> dict:
+    """Create ``day``'s notifications, or finish a run that was interrupted."""
+    _lock(db, day)
+    state = _get_state(db, day)
+    if state is None:
+        quote = pick_quote(db, day)
+        if quote is None:
+            logger.info("daily pépite %s: no quote to pick", day)
+            return {}
+        _set_state(db, day, {"quote_id": quote.id, "status": "running", "inserted": 0, "after": {}})
+    elif state["status"] == "done":
+        return state
+    else:
+        Q = models.Quote
+        quote = db.execute(select(Q.id, Q.quote, Q.child_name).where(Q.id == state["quote_id"])).first()
+        if quote is None:
+            logger.warning("daily pépite %s: quote %d was deleted, run left unfinished", day, state["quote_id"])
+            return state
+    db.commit()
+
+    # keys of state["after"]: a template locale, or "*" for all the others
+    for locale in [*TEMPLATES, None]:
+        key = locale or "*"
+        while True:
+            _lock(db, day)
+            state = _get_state(db, day)
+            user_ids = insert_batch(db, quote, locale, state["after"].get(key, 0))
+            if user_ids:
+                state["after"][key] = user_ids[-1]
+                state["inserted"] += len(user_ids)
+                _set_state(db, day, state)
+            db.commit()
+            if len(user_ids) < settings.DAILY_PEPITE_BATCH_SIZE:
+                break
+
+    _lock(db, day)
+    state = _get_state(db, day)
+    state["status"] = "done"
+    _set_state(db, day, state)
+    db.commit()
+    logger.info("daily pépite %s: quote %d, %d notifications", day, state["quote_id"], state["inserted"])
+    return state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Create the daily pépite notifications.")
+    parser.add_argument("--date", type=date.fromisoformat, default=None, help="YYYY-MM-DD, default today (UTC)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with SessionLocal() as db:
+        fan_out(db, args.date or datetime.now(timezone.utc).date())
+
+
+if __name__ == "__main__":
+    main()
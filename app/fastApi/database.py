@@ -1,11 +1,62 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base
 from .config import settings
+from .instrumentation import track_statements
+from .pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
 
 engine = create_engine(
     settings.DATABASE_URL,
     implicit_returning=True,
+    poolclass=InstrumentedQueuePool,
+    **pool_options(),
 )
+instrument(engine, "sync")
+track_statements(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """True when the database or the connection failed, not the statement's rows.
+
+    The same statement may then succeed later; anything else (a constraint,
+    a bad value, a NUL byte the driver refuses) will fail again.
+    """
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError))
+
+
+def async_database_url(url: str) -> str:
+    # postgres://, postgresql:// or postgresql+psycopg2:// -> postgresql+asyncpg://
+    return "postgresql+asyncpg://" + url.partition("://")[2]
+
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+        poolclass=InstrumentedAsyncQueuePool,
+        **pool_options(),
+    )
+    instrument(async_engine.sync_engine, "async")
+    track_statements(async_engine.sync_engine, "async")
+    # expire_on_commit=False: attributes can't be lazily reloaded once the
+    # handler has returned the object to FastAPI for serialization
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
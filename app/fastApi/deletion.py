@@ -0,0 +1,138 @@
+# Bulk deletion of users and quotes.
+#
+# The foreign keys already say what goes with a row (ON DELETE CASCADE / SET
+# NULL); going through the ORM would load every child into the session
+# first. Large fan-outs (votes, notifications, analytics events, ...) are
+# cleared beforehand in chunks of DELETE_CHUNK_SIZE rows, one transaction
+# per chunk, so locks are held briefly and a failure leaves a partial
+# deletion that simply resumes on the next attempt. The final DELETE of the
+# parent only has small leftovers to cascade, and returns the deleted row.
+#
+# Foreign keys without an ON DELETE action (moderated_by, reviewed_by,
+# override_by, monthly_rankings.quote_id) are cleared explicitly, and so are
+# rows whose author check would fail once the user is set to NULL.
+
+from collections import Counter
+
+from sqlalchemy import BigInteger, Integer, column, delete, select, tuple_, update, values
+
+from app.fastApi import models
+from .config import settings
+
+
+def _chunk_of(model, *criteria):
+    primary_key = list(model.__table__.primary_key.columns)
+    return tuple_(*primary_key).in_(select(*primary_key).where(*criteria).limit(settings.DELETE_CHUNK_SIZE))
+
+
+def delete_chunked(db, model, *criteria, on_chunk=None, returning=()) -> int:
+    """DELETE the rows of ``model`` matching ``criteria``, a chunk per transaction.
+
+    ``on_chunk(db, rows)`` gets the ``returning`` columns of each chunk and
+    runs in the same transaction.
+    """
+    total = 0
+    while True:
+        stmt = delete(model).where(_chunk_of(model, *criteria)).execution_options(synchronize_session=False)
+        if on_chunk is not None:
+            rows = db.execute(stmt.returning(*returning)).all()
+            count = len(rows)
+            if rows:
+                on_chunk(db, rows)
+        else:
+            count = db.execute(stmt).rowcount
+        db.commit()
+        total += count
+        if count < settings.DELETE_CHUNK_SIZE:
+            return total
+
+
+def nullify_chunked(db, attribute, *criteria) -> int:
+    """SET ``attribute`` = NULL on the rows matching ``criteria``, a chunk per transaction."""
+    model = attribute.class_
+    total = 0
+    while True:
+        count = db.execute(
+            update(model)
+            .where(_chunk_of(model, *criteria))
+            .values({attribute.key: None})
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        total += count
+        if count < settings.DELETE_CHUNK_SIZE:
+            return total
+
+
+def _decrement_vote_counts(db, rows) -> None:
+    counts = Counter(row.quote_id for row in rows)
+    decrements = values(column("id", BigInteger), column("n", Integer), name="dec").data(sorted(counts.items()))
+    db.execute(
+        update(models.Quote)
+        .where(models.Quote.id == decrements.c.id)
+        .values(vote_count=models.Quote.vote_count - decrements.c.n)
+    )
+
+
+def _delete_returning(db, model, key):
+    table = model.__table__
+    row = db.execute(delete(table).where(table.c.id == key).returning(*table.c)).first()
+    db.commit()
+    return row
+
+
+def _clear_quote_children(db, quote_ids) -> None:
+    """Clear what is attached to the quotes ``quote_ids`` (a list, or a SELECT of ids)."""
+    delete_chunked(db, models.Vote, models.Vote.quote_id.in_(quote_ids))
+    delete_chunked(db, models.Report, models.Report.quote_id.in_(quote_ids))
+    delete_chunked(db, models.AiModerationLog, models.AiModerationLog.quote_id.in_(quote_ids))
+    delete_chunked(db, models.MonthlyRanking, models.MonthlyRanking.quote_id.in_(quote_ids))
+    nullify_chunked(db, models.AnalyticsEvent.quote_id, models.AnalyticsEvent.quote_id.in_(quote_ids))
+
+
+def delete_quote(db, quote_id: int):
+    """Delete a quote and everything attached to it; returns the deleted row, or None."""
+    if db.get(models.Quote, quote_id) is None:
+        return None
+    _clear_quote_children(db, [quote_id])
+    return _delete_returning(db, models.Quote, quote_id)
+
+
+def delete_user(db, user_id: int):
+    """Delete a user and their data; returns the deleted row, or None.
+
+    Their votes are removed and the vote_count of the quotes they voted for
+    is decremented. Quotes and reports also tied to a device are kept,
+    anonymized; the others are deleted.
+    """
+    if db.get(models.User, user_id) is None:
+        return None
+
+    delete_chunked(
+        db,
+        models.Vote,
+        models.Vote.user_id == user_id,
+        on_chunk=_decrement_vote_counts,
+        returning=(models.Vote.quote_id,),
+    )
+    delete_chunked(db, models.Notification, models.Notification.user_id == user_id)
+    nullify_chunked(db, models.AnalyticsEvent.user_id, models.AnalyticsEvent.user_id == user_id)
+
+    # quotes_author / reports_author: user_id OR device_id must stay set
+    own = (models.Quote.user_id == user_id, models.Quote.device_id.is_(None))
+    _clear_quote_children(db, select(models.Quote.id).where(*own))
+    delete_chunked(db, models.Quote, *own)
+    nullify_chunked(db, models.Quote.user_id, models.Quote.user_id == user_id)
+    delete_chunked(db, models.Report, models.Report.user_id == user_id, models.Report.device_id.is_(None))
+    nullify_chunked(db, models.Report.user_id, models.Report.user_id == user_id)
+
+    # references without ON DELETE action
+    nullify_chunked(db, models.Quote.moderated_by, models.Quote.moderated_by == user_id)
+    nullify_chunked(db, models.Report.reviewed_by, models.Report.reviewed_by == user_id)
+    nullify_chunked(db, models.AiModerationLog.override_by, models.AiModerationLog.override_by == user_id)
+
+    # purchases and booklets are few: left to the FK cascade. Devices are kept,
+    # unlinked by devices.user_id ON DELETE SET NULL: deleting them would set
+    # quotes.device_id / reports.device_id to NULL too (also SET NULL), and the
+    # anonymized rows kept above would fail their author check.
+    return _delete_returning(db, models.User, user_id)
@@ -1,4 +1,4 @@
-from .database import SessionLocal
+from .database import AsyncSessionLocal, SessionLocal
 
 def get_db():
     db = SessionLocal()
@@ -8,3 +8,6 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
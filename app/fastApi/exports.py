@@ -0,0 +1,129 @@
+# Streaming exports (GET /exports/{table}) and large list responses.
+#
+# Rows are read through a server-side cursor (yield_per) and encoded chunk by
+# chunk, so memory stays bounded by EXPORT_CHUNK_SIZE rows whatever the size
+# of the table. The generators open their own session: the response body is
+# produced after the endpoint has returned.
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.fastApi import models
+from .config import settings
+from .database import AsyncSessionLocal, SessionLocal
+
+
+# exported columns per table, in output order
+EXPORT_COLUMNS = {
+    "users": (
+        models.User.id,
+        models.User.display_name,
+        models.User.email,
+        models.User.locale,
+        models.User.is_active,
+        models.User.created_at,
+    ),
+    "quotes": (
+        models.Quote.id,
+        models.Quote.quote,
+        models.Quote.child_name,
+        models.Quote.language,
+        models.Quote.status,
+        models.Quote.vote_count,
+        models.Quote.published_at,
+        models.Quote.created_at,
+    ),
+    "votes": (
+        models.Vote.id,
+        models.Vote.quote_id,
+        models.Vote.user_id,
+        models.Vote.device_id,
+        models.Vote.vote_period,
+        models.Vote.created_at,
+    ),
+}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+def export_statement(table: str, vote_period: str | None = None):
+    columns = EXPORT_COLUMNS[table]
+    stmt = select(*columns).order_by(columns[0])
+    if table == "votes" and vote_period is not None:
+        # a single partition is scanned
+        stmt = stmt.where(models.Vote.vote_period == vote_period)
+    return stmt
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _json_objects(rows) -> list[str]:
+    return [json.dumps(row._asdict(), default=_json_default, ensure_ascii=False) for row in rows]
+
+
+def encode_ndjson(rows, first: bool) -> bytes:
+    return "".join(line + "\n" for line in _json_objects(rows)).encode()
+
+
+def encode_csv(rows, first: bool) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def encode_json_array(rows, first: bool) -> bytes:
+    return (("" if first else ",") + ",".join(_json_objects(rows))).encode()
+
+
+ENCODERS = {"ndjson": encode_ndjson, "csv": encode_csv}
+
+
+def stream_rows(statement, encode, prefix: bytes = b"", suffix: bytes = b""):
+    with SessionLocal() as db:
+        result = db.execute(statement.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+        yield prefix
+        first = True
+        for rows in result.partitions():
+            yield encode(rows, first)
+            first = False
+        yield suffix
+
+
+async def astream_rows(statement, encode, prefix: bytes = b"", suffix: bytes = b""):
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+        yield prefix
+        first = True
+        async for rows in result.partitions():
+            yield encode(rows, first)
+            first = False
+        yield suffix
+
+
+def export_response(table: str, fmt: str, vote_period: str | None = None) -> StreamingResponse:
+    statement = export_statement(table, vote_period)
+    # the CSV header is written even when there is no row
+    header = encode_csv([statement.selected_columns.keys()], True) if fmt == "csv" else b""
+    return StreamingResponse(
+        stream_rows(statement, ENCODERS[fmt], prefix=header),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{fmt}"'},
+    )
+
+
+def json_array_response(statement, use_async: bool = False) -> StreamingResponse:
+    """A JSON array of ``statement``'s rows, streamed."""
+    stream = astream_rows if use_async else stream_rows
+    return StreamingResponse(stream(statement, encode_json_array, b"[", b"]"), media_type="application/json")
@@ -0,0 +1,38 @@
+# JSON responses serialized by pydantic-core.
+#
+# FastJSONResponse is the app's default response class: pydantic_core.to_json
+# encodes dicts, lists, datetimes, Decimals and models straight to bytes,
+# without jsonable_encoder's intermediate copy nor the stdlib json module.
+#
+# typed_response() is for hot endpoints returning many rows: the payload is
+# validated once against a cached TypeAdapter (no model __init__ per row) and
+# dumped to bytes by the same adapter. The Response it returns is passed
+# through by FastAPI as is, so the route's response_model is only used for
+# the OpenAPI schema and nothing is validated twice.
+
+from functools import lru_cache
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content)
+
+
+@lru_cache(maxsize=None)
+def adapter(type_) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+
+def typed_response(type_, content: Any, status_code: int = 200, headers: dict | None = None) -> Response:
+    """Validate ``content`` as ``type_`` in one pass and serialize it to JSON bytes.
+
+    ``content`` may hold dicts, ORM objects or SQLAlchemy rows.
+    """
+    type_adapter = adapter(type_)
+    body = type_adapter.dump_json(type_adapter.validate_python(content, from_attributes=True))
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
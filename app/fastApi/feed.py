@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.fastApi import models, pagination, read_models
+from app.fastApi.feed_cache import FeedRow
+
+
+# the feed only shows quotes from the last 30 days
+FEED_WINDOW = timedelta(days=30)
+
+
+def feed_statement(sort: str, order: str, limit: int, language: str | None = None, cursor: str | None = None):
+    """Viewer-independent feed query, shared by the sync and async handlers.
+
+    Raises ``pagination.InvalidCursor`` for a malformed or mismatched cursor.
+    """
+    # date limite = maintenant - 30 jours
+    cutoff_date = datetime.now(timezone.utc) - FEED_WINDOW
+    # the page only needs QuoteRead's columns, plus the sort key for the cursor
+    sort_column = pagination.SORT_COLUMNS[sort][0]
+    stmt = select(*read_models.QUOTE_READ, sort_column).where(models.Quote.created_at >= cutoff_date)
+    if language is not None:
+        stmt = stmt.where(models.Quote.language == language)
+    return pagination.paginate(stmt, sort, order, limit, cursor)
+
+
+def cache_page(rows, sort: str, order: str, limit: int):
+    """Turn fetched rows into the cacheable (rows, next_cursor) page."""
+    rows, next_cursor = pagination.split_page(rows, sort, order, limit)
+    return tuple(FeedRow(q.id, q.quote, q.child_name) for q in rows), next_cursor
+
+
+def quote_page(page, voted_quote_ids) -> dict:
+    """The QuotePage payload of a cached page, as plain dicts."""
+    quotes, next_cursor = page
+    return {
+        "items": [
+            {"id": q.id, "quote": q.quote, "child_name": q.child_name, "user_has_voted": q.id in voted_quote_ids}
+            for q in quotes
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from .config import settings
+
+
+class FeedRow(NamedTuple):
+    id: int
+    quote: str | None
+    child_name: str | None
+
+
+class FeedCache:
+    """Size and TTL bounded LRU of viewer-independent feed pages.
+
+    Keys start with the sort column. Each entry remembers the version it was
+    read under; a write bumps the version of the sorts it can reorder, which
+    makes the matching pages stale without touching the others.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._sort_versions: dict[str, int] = {}
+
+    def version(self, sort: str) -> tuple[int, int]:
+        return self._generation, self._sort_versions.get(sort, 0)
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            version, expires_at, page = entry
+            if version != self.version(key[0]) or expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return page
+
+    def put(self, key: tuple, page, version: tuple[int, int]) -> None:
+        """Store ``page`` unless a write happened since ``version`` was read."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if version != self.version(key[0]):
+                return
+            self._entries[key] = (version, time.monotonic() + self.ttl_seconds, page)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sort: str | None = None) -> None:
+        """Drop the pages ordered by ``sort``, or every page when it is None."""
+        with self._lock:
+            if sort is None:
+                self._generation += 1
+                self._entries.clear()
+            else:
+                self._sort_versions[sort] = self._sort_versions.get(sort, 0) + 1
+
+
+feed_cache = FeedCache(settings.FEED_CACHE_MAX_ENTRIES, settings.FEED_CACHE_TTL_SECONDS)
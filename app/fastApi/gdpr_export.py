@@ -0,0 +1,334 @@
+# GDPR data export: every row tied to a user, as a zip of NDJSON files.
+#
+#   GET  /users/{id}/export          # the archive, streamed as it is built
+#   POST /users/{id}/export          # build it in the background into GDPR_EXPORT_DIR
+#   python -m app.fastApi.gdpr_export 42
+#
+# Each table is read through a server-side cursor and deflated straight into
+# the archive, which is handed out chunk by chunk: memory stays bounded by
+# EXPORT_CHUNK_SIZE rows whatever the user's history. Background jobs record
+# their progress in app_config under gdpr_export.<user_id>.
+#
+# That row is also the job's lock, across processes: a request only queues a
+# job when the upsert finds no queued or running one, and each job writes
+# its progress only while the row still carries its id. A queued or running
+# state left without progress for GDPR_EXPORT_STALE_SECONDS (its process
+# died) counts as failed and can be requested again. Each job builds its
+# own .part file and renames it into place.
+#
+# Archives are deleted GDPR_EXPORT_RETENTION_SECONDS after they are built:
+#   python -m app.fastApi.gdpr_export --purge     # from cron; POST also purges
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import cast, func, or_, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+from .exports import encode_ndjson
+
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = "gdpr_export.{}"
+ACTIVE = ("queued", "running")
+ARCHIVE_PATTERN = re.compile(r"user-(\d+)\.zip")
+
+
+class _Superseded(Exception):
+    """The job's state was taken over by a newer request."""
+
+
+def _user_devices(user_id: int):
+    return select(models.Device.id).where(models.Device.user_id == user_id)
+
+
+def sections(user_id: int) -> list[tuple[str, object]]:
+    """(file name, statement) of every table in the archive.
+
+    Rows recorded from one of the user's devices before they signed in are
+    included as well.
+    """
+    devices = _user_devices(user_id)
+    return [
+        ("user", select(models.User.__table__).where(models.User.id == user_id)),
+        ("devices", select(models.Device.__table__).where(models.Device.user_id == user_id)),
+        (
+            "quotes",
+            select(models.Quote.__table__)
+            .where(or_(models.Quote.user_id == user_id, models.Quote.device_id.in_(devices)))
+            .order_by(models.Quote.id),
+        ),
+        (
+            "votes",
+            select(models.Vote.__table__)
+            .where(or_(models.Vote.user_id == user_id, models.Vote.device_id.in_(devices)))
+            .order_by(models.Vote.id),
+        ),
+        (
+            "reports",
+            select(models.Report.__table__)
+            .where(or_(models.Report.user_id == user_id, models.Report.device_id.in_(devices)))
+            .order_by(models.Report.id),
+        ),
+        (
+            "iap_purchases",
+            select(models.IapPurchase.__table__).where(models.IapPurchase.user_id == user_id).order_by(models.IapPurchase.id),
+        ),
+        (
+            "pdf_booklets",
+            select(models.PdfBooklet.__table__).where(models.PdfBooklet.user_id == user_id).order_by(models.PdfBooklet.id),
+        ),
+        (
+            "notifications",
+            select(models.Notification.__table__).where(models.Notification.user_id == user_id).order_by(models.Notification.id),
+        ),
+        (
+            "analytics_events",
+            select(models.AnalyticsEvent.__table__)
+            .where(or_(models.AnalyticsEvent.user_id == user_id, models.AnalyticsEvent.device_id.in_(devices)))
+            .order_by(models.AnalyticsEvent.created_at),
+        ),
+    ]
+
+
+class _ChunkSink:
+    """Write-only, unseekable file: zipfile streams into it, we drain it."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def archive_chunks(user_id: int, on_progress=None):
+    """Yield the zip archive of ``user_id``'s data, one piece at a time.
+
+    ``on_progress(section, rows)`` is called after every chunk of rows.
+    """
+    sink = _ChunkSink()
+    with SessionLocal() as db, zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, statement in sections(user_id):
+            rows = 0
+            # sizes are unknown up front, zip64 headers keep any size valid
+            with archive.open(f"{name}.ndjson", "w", force_zip64=True) as entry:
+                result = db.execute(statement.execution_options(yield_per=settings.EXPORT_CHUNK_SIZE))
+                for chunk in result.partitions():
+                    entry.write(encode_ndjson(chunk, False))
+                    rows += len(chunk)
+                    if on_progress is not None:
+                        on_progress(name, rows)
+                    yield sink.drain()
+            if on_progress is not None:
+                on_progress(name, rows)
+            yield sink.drain()
+    # central directory, written on close
+    yield sink.drain()
+
+
+def archive_name(user_id: int) -> str:
+    return f"user-{user_id}.zip"
+
+
+def _state_field(name: str):
+    return cast(models.AppConfig.value, JSONB)[name].astext
+
+
+def _is_stale():
+    return models.AppConfig.updated_at < func.now() - timedelta(seconds=settings.GDPR_EXPORT_STALE_SECONDS)
+
+
+def get_progress(db, user_id: int) -> dict | None:
+    """The state of ``user_id``'s export; a job that stopped reporting shows as failed."""
+    A = models.AppConfig
+    row = db.execute(select(A.value, _is_stale().label("stale")).where(A.key == PROGRESS_KEY.format(user_id))).first()
+    if row is None:
+        return None
+    state = json.loads(row.value)
+    if state["status"] in ACTIVE and row.stale:
+        state["status"] = "failed"
+    return state
+
+
+def _set_progress(user_id: int, state: dict, only_if=None) -> bool:
+    """Upsert the job state; with ``only_if``, an existing row is only replaced when it holds.
+
+    Returns whether the state was written.
+    """
+    A = models.AppConfig
+    stmt = pg_insert(A).values(key=PROGRESS_KEY.format(user_id), value=json.dumps(state), description="GDPR export progress")
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[A.key],
+        set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        where=only_if,
+    ).returning(A.key)
+    with SessionLocal() as db:
+        written = db.execute(stmt).first() is not None
+        db.commit()
+    return written
+
+
+def _set_job_progress(user_id: int, state: dict) -> None:
+    """Write the progress of the job ``state["job"]``, unless a newer request replaced it."""
+    if not _set_progress(user_id, state, only_if=_state_field("job") == state["job"]):
+        raise _Superseded(state["job"])
+
+
+def request_export(db, user_id: int) -> dict | None:
+    """Mark a job as queued and record the request on the user; None when one is already queued or running."""
+    requested_at = datetime.now(timezone.utc)
+    state = {"status": "queued", "requested_at": requested_at.isoformat(), "job": uuid.uuid4().hex}
+    if not _set_progress(user_id, state, only_if=or_(_state_field("status").not_in(ACTIVE), _is_stale())):
+        return None
+    db.execute(update(models.User).where(models.User.id == user_id).values(data_export_requested_at=requested_at))
+    db.commit()
+    return state
+
+
+def run_export(user_id: int, requested_at: str | None, job: str) -> str | None:
+    """Build the archive into GDPR_EXPORT_DIR; returns its path, None if the job was superseded."""
+    os.makedirs(settings.GDPR_EXPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.GDPR_EXPORT_DIR, archive_name(user_id))
+    partial = f"{path}.{job}.part"
+    state = {"status": "running", "requested_at": requested_at, "job": job, "section": None, "rows": 0}
+    previous_sections = 0   # rows of the sections already written
+    calls = 0
+
+    def on_progress(section: str, rows: int) -> None:
+        nonlocal previous_sections, calls
+        changed = section != state["section"]
+        if changed and state["section"] is not None:
+            previous_sections = state["rows"]
+        state.update(section=section, rows=previous_sections + rows)
+        calls += 1
+        # one app_config write per section and per 10 chunks at most
+        if changed or calls % 10 == 0:
+            _set_job_progress(user_id, state)
+
+    try:
+        _set_job_progress(user_id, state)
+        with open(partial, "wb") as file:
+            for data in archive_chunks(user_id, on_progress):
+                file.write(data)
+        _set_job_progress(
+            user_id,
+            {**state, "status": "done", "section": None, "finished_at": datetime.now(timezone.utc).isoformat()},
+        )
+        # renamed once recorded as done: a superseded job never replaces the archive
+        os.replace(partial, path)
+    except _Superseded:
+        logger.warning("GDPR export of user %d: job %s superseded by a newer request", user_id, job)
+        _remove(partial)
+        return None
+    except Exception:
+        logger.exception("GDPR export of user %d failed", user_id)
+        _remove(partial)
+        _set_progress(user_id, {**state, "status": "failed"}, only_if=_state_field("job") == job)
+        raise
+    return path
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_archives() -> int:
+    """Delete the archives older than GDPR_EXPORT_RETENTION_SECONDS, and abandoned .part files; returns the count."""
+    if not os.path.isdir(settings.GDPR_EXPORT_DIR):
+        return 0
+    now = time.time()
+    removed = 0
+    for entry in os.scandir(settings.GDPR_EXPORT_DIR):
+        archive = ARCHIVE_PATTERN.fullmatch(entry.name)
+        if archive is not None:
+            max_age = settings.GDPR_EXPORT_RETENTION_SECONDS
+        elif entry.name.endswith(".part"):
+            max_age = settings.GDPR_EXPORT_STALE_SECONDS
+        else:
+            continue
+        if now - entry.stat().st_mtime < max_age:
+            continue
+        _remove(entry.path)
+        removed += 1
+        if archive is not None:
+            user_id = int(archive.group(1))
+            with SessionLocal() as db:
+                state = get_progress(db, user_id)
+            if state is not None and state["status"] == "done":
+                _set_progress(user_id, {**state, "status": "expired"}, only_if=_state_field("job") == state.get("job"))
+    return removed
+
+
+# exports run off the request path, a few at a time
+export_jobs = ThreadPoolExecutor(max_workers=settings.GDPR_EXPORT_WORKERS, thread_name_prefix="gdpr-export")
+# user_id -> (job id, future) of the jobs this process queued
+
+
+_jobs: dict[int, tuple[str, Future]] = {}
+
+
+def submit_export(db, user_id: int) -> dict:
+    """Queue the export of ``user_id``, unless one is already queued or running in any process."""
+    purge_archives()
+    state = request_export(db, user_id)
+    if state is None:
+        return get_progress(db, user_id) or {"status": "queued"}
+    future = export_jobs.submit(run_export, user_id, state["requested_at"], state["job"])
+    _jobs[user_id] = (state["job"], future)
+    future.add_done_callback(lambda _: _jobs.pop(user_id, None))
+    return state
+
+
+def shutdown() -> None:
+    """Mark the queued exports as failed, so they can be requested again, and wait for the running ones."""
+    for user_id, (job, future) in list(_jobs.items()):
+        if future.cancel():
+            with SessionLocal() as db:
+                state = get_progress(db, user_id) or {}
+            _set_progress(user_id, {**state, "status": "failed"}, only_if=_state_field("job") == job)
+    export_jobs.shutdown(wait=True, cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the GDPR data export of a user.")
+    parser.add_argument("user_id", type=int, nargs="?")
+    parser.add_argument("--purge", action="store_true", help="delete the archives past their retention")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.purge:
+        logger.info("gdpr export: %d files purged", purge_archives())
+    if args.user_id is None:
+        return
+    with SessionLocal() as db:
+        state = request_export(db, args.user_id)
+    if state is None:
+        parser.exit(1, f"an export of user {args.user_id} is already queued or running\n")
+    logger.info("gdpr export: %s", run_export(args.user_id, state["requested_at"], state["job"]))
+
+
+if __name__ == "__main__":
+    main()
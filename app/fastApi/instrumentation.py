@@ -0,0 +1,225 @@
+# Request latency, SQL statement counts and Prometheus exposition.
+#
+# MetricsMiddleware times every request and files it under its route
+# template (/quotes/{quote_id}, not /quotes/42). The cursor hooks of
+# track_statements() count the statements and the database time of the
+# request being served, through a context variable that follows the request
+# into the threadpool and into SQLAlchemy's greenlets: a route whose
+# statements-per-request histogram climbs with the page size is an N+1.
+# GET /metrics renders everything, pool metrics included, in the Prometheus
+# text format. Counters are per process.
+
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from . import pool_metrics
+from .config import settings
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label tuple."""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}    # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            base = _labels(zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{{{base},le=\"{bound}\"}} {cumulative}")
+            lines.append(f"{self.name}_bucket{{{base},le=\"+Inf\"}} {values[-1]}")
+            lines.append(f"{self.name}_sum{{{base}}} {values[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {values[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(zip(self.label_names, labels))}}} {value}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency.", ("method", "route", "status"), LATENCY_BUCKETS
+)
+request_statements = Histogram(
+    "http_request_db_statements", "SQL statements executed per request.", ("method", "route"), STATEMENT_BUCKETS
+)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements per request.", ("method", "route"), LATENCY_BUCKETS
+)
+statements_total = Counter("db_statements_total", "SQL statements executed.", ("engine", "context"))
+statement_seconds_total = Counter("db_statement_seconds_total", "Time spent in SQL statements.", ("engine", "context"))
+analytics_events_dropped = Counter("analytics_events_dropped_total", "Analytics events the writer gave up on.", ("reason",))
+
+
+def log_event(log: logging.Logger, name: str, level: int = logging.INFO, sample_rate: float | None = None, **fields) -> None:
+    """One structured log line (event name + JSON fields), kept with probability ``sample_rate``.
+
+    ``sample_rate`` defaults to LOG_SAMPLE_RATE; pass 1 for events that must
+    always be logged.
+    """
+    rate = settings.LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+    if not log.isEnabledFor(level) or (rate < 1 and random.random() >= rate):
+        return
+    log.log(level, "%s %s", name, json.dumps(fields, default=str, separators=(",", ":")))
+
+
+def track_statements(engine, name: str) -> None:
+    """Count the statements of ``engine`` (a sync Engine or an AsyncEngine's sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._instrumentation_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._instrumentation_started
+        stats = current_request.get()
+        labels = (name, "request" if stats is not None else "background")
+        statements_total.inc(labels)
+        statement_seconds_total.inc(labels, elapsed)
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request latency and per-request SQL statistics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            request_duration.observe((method, path, str(status)), elapsed)
+            request_statements.observe((method, path), stats.statements)
+            request_db_duration.observe((method, path), stats.db_seconds)
+            slow = elapsed >= settings.SLOW_REQUEST_SECONDS
+            log_event(
+                logger,
+                "http.request",
+                level=logging.WARNING if slow else logging.INFO,
+                sample_rate=1 if slow else None,
+                method=method,
+                route=path,
+                status=status,
+                duration_ms=round(elapsed * 1000, 2),
+                db_statements=stats.statements,
+                db_ms=round(stats.db_seconds * 1000, 2),
+            )
+
+
+def _pool_lines() -> list[str]:
+    pools = sorted(pool_metrics.snapshot().items())
+    lines = []
+    for key in ("pool_size", "checked_out", "checked_in", "overflow", "checkout_wait_seconds_max"):
+        lines.append(f"# TYPE db_pool_{key} gauge")
+        lines.extend(f'db_pool_{key}{{pool="{_escape(pool)}"}} {values[key]}' for pool, values in pools)
+    for key in ("connects", "checkouts", "checkins", "invalidations", "checkout_timeouts", "checkout_wait_seconds_total"):
+        name = f"db_pool_{key}" if key.endswith("_total") else f"db_pool_{key}_total"
+        lines.append(f"# TYPE {name} counter")
+        lines.extend(f'{name}{{pool="{_escape(pool)}"}} {values[key]}' for pool, values in pools)
+    return lines
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in (
+        request_duration, request_statements, request_db_duration, statements_total, statement_seconds_total,
+        analytics_events_dropped,
+    ):
+        lines.extend(metric.render())
+    lines.extend(_pool_lines())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,147 @@
+import logging
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+from .rankings import vote_counts_statement
+
+
+logger = logging.getLogger(__name__)
+
+
+def current_period(now: datetime | None = None) -> str:
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+
+class Leaderboard:
+    """Live top-k of the in-progress vote_period.
+
+    Keeps a counter per voted quote and the top ``size`` entries as a sorted
+    list of (-votes, quote_id). Counts only go up between two reconciliations,
+    so a quote outside the top can only enter it by passing the last entry;
+    each bump costs O(size) at worst. Readers get a prebuilt tuple.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.period: str | None = None
+        self._counts: dict[int, int] = {}
+        self._top: list[tuple[int, int]] = []
+        self._in_top: set[int] = set()
+        self._snapshot: tuple = ()
+        self._quotes: dict[int, tuple[str | None, str | None]] = {}
+        self._lock = threading.Lock()
+
+    def reset(self, period: str, counts: dict[int, int]) -> None:
+        top = sorted((-votes, quote_id) for quote_id, votes in counts.items())[: self.size]
+        with self._lock:
+            if period != self.period:
+                self._quotes = {}
+            self.period = period
+            self._counts = dict(counts)
+            self._top = top
+            self._in_top = {quote_id for _, quote_id in top}
+            self._refresh()
+
+    def bump(self, period: str, quote_id: int, votes: int = 1) -> None:
+        with self._lock:
+            if period != self.period:
+                return
+            previous = self._counts.get(quote_id, 0)
+            count = previous + votes
+            self._counts[quote_id] = count
+            entry = (-count, quote_id)
+            if quote_id in self._in_top:
+                del self._top[bisect_left(self._top, (-previous, quote_id))]
+                insort(self._top, entry)
+            elif len(self._top) < self.size:
+                insort(self._top, entry)
+                self._in_top.add(quote_id)
+            elif entry < self._top[-1]:
+                insort(self._top, entry)
+                self._in_top.discard(self._top.pop()[1])
+                self._in_top.add(quote_id)
+            else:
+                return
+            self._refresh()
+
+    def record_inserted(self, rows) -> None:
+        """Vote flush listener: bump every inserted (quote_id, vote_period) row."""
+        for row in rows:
+            self.bump(row.vote_period, row.quote_id)
+
+    def snapshot(self) -> tuple[str | None, tuple]:
+        return self.period, self._snapshot
+
+    def quote_text(self, quote_id: int):
+        return self._quotes.get(quote_id)
+
+    def remember_quotes(self, rows) -> None:
+        with self._lock:
+            for row in rows:
+                self._quotes[row.id] = (row.quote, row.child_name)
+
+    def _refresh(self) -> None:
+        self._snapshot = tuple(
+            (rank, quote_id, -neg_votes) for rank, (neg_votes, quote_id) in enumerate(self._top, start=1)
+        )
+
+
+def quote_text_statement(quote_ids):
+    return select(models.Quote.id, models.Quote.quote, models.Quote.child_name).where(models.Quote.id.in_(quote_ids))
+
+
+def reconcile(db, board: "Leaderboard") -> None:
+    """Replace the in-memory counters with the database ones for the current period.
+
+    Picks up votes recorded by other workers and rolls the board over at the
+    start of a month. A vote committed while the aggregate runs can be
+    missed until the next reconciliation.
+    """
+    period = current_period()
+    counts = dict(db.execute(vote_counts_statement(period)).all())
+    board.reset(period, counts)
+    _, entries = board.snapshot()
+    missing = [quote_id for _, quote_id, _ in entries if board.quote_text(quote_id) is None]
+    if missing:
+        board.remember_quotes(db.execute(quote_text_statement(missing)).all())
+
+
+class Reconciler:
+    """Background thread: warms the board at startup, then reconciles it periodically."""
+
+    def __init__(self, board: Leaderboard, interval: float):
+        self.board = board
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leaderboard-reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with SessionLocal() as db:
+                    reconcile(db, self.board)
+            except Exception:
+                logger.exception("leaderboard reconciliation failed")
+            if self._stop.wait(self.interval):
+                return
+
+
+leaderboard = Leaderboard(settings.LEADERBOARD_SIZE)
+reconciler = Reconciler(leaderboard, settings.LEADERBOARD_RECONCILE_SECONDS)
@@ -1,4 +1,13 @@
-from fastapi import FastAPI, Depends
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Literal
+
+from fastapi import APIRouter, FastAPI, Depends, Path, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 from sqlalchemy import desc, asc
 
@@ -8,29 +17,69 @@ from fastapi import HTTPException
 from app.fastApi import schemas
 
 from app.fastApi import models
+from app.fastApi import (
+    async_api, deletion, exports, fast_json, feed, gdpr_export, instrumentation, milestones, moderation, pagination,
+    pool_metrics, rankings, read_models, vote_ingest,
+)
+from app.fastApi.analytics_ingest import analytics_buffer, events_adapter
+from app.fastApi.config import settings
+from app.fastApi.feed_cache import feed_cache
+from app.fastApi.leaderboard import current_period, leaderboard, quote_text_statement, reconciler
+from app.fastApi.vote_ingest import vote_writer
+from app.fastApi.voted_sets import load_statement, viewer_key, voted_sets
 from .deps import get_db
 from datetime import datetime, timedelta, timezone
 
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reconciler.start()
+    analytics_buffer.start()
+    if vote_writer is not None:
+        vote_writer.start()
+    yield
+    # flush what is still queued before the worker exits
+    if vote_writer is not None:
+        await asyncio.to_thread(vote_writer.stop)
+    await asyncio.to_thread(analytics_buffer.stop)
+    await asyncio.to_thread(reconciler.stop)
+    await asyncio.to_thread(gdpr_export.shutdown)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=fast_json.FastJSONResponse)
+app.add_middleware(instrumentation.MetricsMiddleware)
+router = APIRouter()
 
 @app.get("/")
 def read_root():
     return {"message": "Hello from Railway & FastAPI!"}
 
+@app.get("/metrics/pool")
+def read_pool_metrics():
+    return pool_metrics.snapshot()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(instrumentation.render_prometheus(), media_type=instrumentation.PROMETHEUS_CONTENT_TYPE)
+
 # users endpoints:
-@app.get("/users", response_model=list[schemas.UserRead])
+@router.get("/users", response_model=list[schemas.UserRead])
 def read_users(db: Session = Depends(get_db)):
-    return db.query(models.User).all()
+    users = db.execute(read_models.users_statement(limit=settings.LIST_STREAM_THRESHOLD + 1)).all()
+    if len(users) <= settings.LIST_STREAM_THRESHOLD:
+        return fast_json.typed_response(list[schemas.UserRead], users)
+    return exports.json_array_response(read_models.users_statement())
 
-@app.get("/users/{user_id}", response_model=schemas.UserRead)
+@router.get("/users/{user_id}", response_model=schemas.UserRead)
 def read_user(user_id: int, db: Session = Depends(get_db)):
     user_to_get = db.query(models.User).filter(models.User.id == user_id).first()
     if not user_to_get:
         raise HTTPException(status_code=404, detail="User not found")
     return user_to_get
 
-@app.post("/users", response_model=schemas.UserRead)
+@router.post("/users", response_model=schemas.UserRead)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     new_user = models.User(display_name=user.display_name, email=user.email)
     db.add(new_user)
@@ -38,16 +87,16 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.refresh(new_user)
     return new_user
 
-@app.delete("/users/{user_id}", response_model=schemas.UserRead)
+@router.delete("/users/{user_id}", response_model=schemas.UserRead)
 def delete_user(user_id: int, db: Session = Depends(get_db)):
-    user_to_delete = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user_to_delete:
+    user_deleted = deletion.delete_user(db, user_id)
+    if user_deleted is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user_to_delete)
-    db.commit()
-    return user_to_delete
+    feed_cache.invalidate()
+    voted_sets.evict(viewer_key(user_id, None))
+    return user_deleted._asdict()
 
-@app.put("/users/{user_id}", response_model=schemas.UserRead)
+@router.put("/users/{user_id}", response_model=schemas.UserRead)
 def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_db)):
     user_to_update = db.query(models.User).filter(models.User.id == user_id).first()
     if not user_to_update:
@@ -64,79 +113,195 @@ def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(ge
 # def read_quotes(db: Session = Depends(get_db)):
 #     return db.query(models.Quote).all()
 
-@app.get("/quotes", response_model=list[schemas.QuoteWithVoteRead])
+@router.get("/quotes", response_model=schemas.QuotePage)
 def get_quotes(
-    limit: int = 100,
+    limit: int = Query(100, ge=1),
     sort: str = "created_at",
     order: str = "desc",
+    cursor: str | None = None,
+    language: str | None = None,
     user_id: int | None = None,
     device_id: str | None = None,
     vote_period: str | None = None,
     db: Session = Depends(get_db),
 ):
-    query = db.query(models.Quote)
-
-   # date limite = maintenant - 30 jours
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
-    query = query.filter(models.Quote.created_at >= cutoff_date)
-    
-    if order == "desc":
-        query = query.order_by(desc(getattr(models.Quote, sort)))
-    else:
-        query = query.order_by(asc(getattr(models.Quote, sort)))
-    quotes = query.limit(limit).all()
-    quote_ids = [q.id for q in quotes]
-
-    print('user_id', user_id)
-    print('quotes', quotes)
-    print('quote_ids', quote_ids)
-    voted_quote_ids: set[int] = set()
-    if quote_ids:
-        vote_query = db.query(models.Vote.quote_id)
-        if user_id is not None:
-            vote_query = vote_query.filter(models.Vote.user_id == user_id)
-        elif device_id is not None:
-            vote_query = vote_query.filter(models.Vote.device_id == device_id)
-        print('vote_query', vote_query)
-        voted_quote_ids = {row[0] for row in vote_query.filter(models.Vote.quote_id.in_(quote_ids)).all()}
-    
-    print('voted_quote_ids', voted_quote_ids)
-    return [
-        schemas.QuoteWithVoteRead(
-            id=q.id,
-            quote=q.quote,
-            child_name=q.child_name,
-            user_has_voted=q.id in voted_quote_ids,
-        )
-        for q in quotes
-    ]
+    if sort not in pagination.SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail="Invalid sort column")
+    order = "desc" if order == "desc" else "asc"
+
+    # the shared part of the feed is cached, only the vote overlay is per viewer
+    cache_key = (sort, order, limit, language, cursor)
+    cache_version = feed_cache.version(sort)
+    page = feed_cache.get(cache_key)
+    if page is None:
+        try:
+            stmt = feed.feed_statement(sort, order, limit, language, cursor)
+        except pagination.InvalidCursor as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        page = feed.cache_page(db.execute(stmt).all(), sort, order, limit)
+        feed_cache.put(cache_key, page, cache_version)
+    quotes, next_cursor = page
+
+    viewer = viewer_key(user_id, device_id)
+    voted_quote_ids = voted_sets.get_or_load(
+        viewer,
+        lambda: db.execute(load_statement(viewer)).scalars().all(),
+    )
+    instrumentation.log_event(
+        logger,
+        "feed.page",
+        level=logging.DEBUG,
+        user_id=user_id,
+        device_id=device_id,
+        quote_ids=[q.id for q in quotes],
+        voted=len(voted_quote_ids),
+        next_cursor=next_cursor,
+    )
+    return fast_json.typed_response(schemas.QuotePage, feed.quote_page(page, voted_quote_ids))
 
-@app.get("/quotes/{quote_id}", response_model=schemas.QuoteRead)
+@router.get("/quotes/{quote_id}", response_model=schemas.QuoteRead)
 def read_quote(quote_id: int, db: Session = Depends(get_db)):
-    quote_to_get = db.query(models.Quote).filter(models.Quote.id == quote_id).first()
+    quote_to_get = db.execute(read_models.quote_statement(quote_id)).first()
     if not quote_to_get:
         raise HTTPException(status_code=404, detail="Quote not found")
     return quote_to_get
 
-@app.post("/quotes", response_model=schemas.QuoteRead)
+@router.post("/quotes", response_model=schemas.QuoteRead)
 def create_quote(quote: schemas.QuoteCreate, db: Session = Depends(get_db)):
     new_quote = models.Quote(quote=quote.quote, child_name=quote.child_name)
     db.add(new_quote)
     db.commit()
+    feed_cache.invalidate()
     db.refresh(new_quote)
     return new_quote
 
 
+@router.delete("/quotes/{quote_id}", response_model=schemas.QuoteRead)
+def delete_quote(quote_id: int, db: Session = Depends(get_db)):
+    quote_deleted = deletion.delete_quote(db, quote_id)
+    if quote_deleted is None:
+        raise HTTPException(status_code=404, detail="Quote not found")
+    feed_cache.invalidate()
+    return quote_deleted._asdict()
+
+
 #  votes endpoints:
-@app.post("/votes", response_model=schemas.VoteRead)
+@router.post("/votes", response_model=schemas.VoteRead, responses={202: {"model": schemas.VoteQueued}})
 def create_vote(vote: schemas.VoteCreate, db: Session = Depends(get_db)):
-    new_vote = models.Vote(
-        quote_id=vote.quote_id,
-        user_id=vote.user_id,
-        device_id=vote.device_id,
-        vote_period=vote.vote_period,
-    )
-    db.add(new_vote)
+    if vote_writer is not None:
+        return vote_ingest.accept(vote)
+    # one vote per viewer and quote; its month (the partition key) is the server's, never the client's
+    period = current_period()
+    # insert, vote_count bump and milestone notification in one round trip
+    row = db.execute(milestones.vote_statement(vote, period)).first()
     db.commit()
-    db.refresh(new_vote)
-    return new_vote
\ No newline at end of file
+    if row is None:
+        raise HTTPException(status_code=409, detail="Already voted")
+    feed_cache.invalidate("vote_count")
+    voted_sets.add(viewer_key(vote.user_id, vote.device_id), vote.quote_id)
+    leaderboard.bump(period, vote.quote_id)
+    return row._asdict()
+
+
+# rankings endpoints:
+@app.get("/rankings/{period}", response_model=schemas.RankingRead)
+def read_ranking(period: str = Path(pattern=rankings.PERIOD_PATTERN), db: Session = Depends(get_db)):
+    entries = rankings.finalized_entries(db, period)
+    if not entries:
+        raise HTTPException(status_code=404, detail="Ranking not found")
+    return fast_json.typed_response(schemas.RankingRead, {"period": period, "entries": entries})
+
+
+# exports endpoints:
+@app.get("/exports/{table}")
+def export_table(
+    table: Literal["users", "quotes", "votes"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    vote_period: str | None = Query(None, pattern=rankings.PERIOD_PATTERN),
+):
+    return exports.export_response(table, format, vote_period)
+
+
+# GDPR data export endpoints:
+def _get_user_or_404(db: Session, user_id: int) -> None:
+    if db.get(models.User, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+
+@app.get("/users/{user_id}/export")
+def export_user_data(user_id: int, db: Session = Depends(get_db)):
+    _get_user_or_404(db, user_id)
+    return StreamingResponse(
+        gdpr_export.archive_chunks(user_id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{gdpr_export.archive_name(user_id)}"'},
+    )
+
+@app.post("/users/{user_id}/export", status_code=202, response_model=schemas.DataExportStatus)
+def request_user_data_export(user_id: int, db: Session = Depends(get_db)):
+    _get_user_or_404(db, user_id)
+    return gdpr_export.submit_export(db, user_id)
+
+@app.get("/users/{user_id}/export/status", response_model=schemas.DataExportStatus)
+def read_user_data_export_status(user_id: int, db: Session = Depends(get_db)):
+    progress = gdpr_export.get_progress(db, user_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="No export requested")
+    return progress
+
+@app.get("/users/{user_id}/export/file")
+def download_user_data_export(user_id: int, db: Session = Depends(get_db)):
+    progress = gdpr_export.get_progress(db, user_id)
+    path = os.path.join(settings.GDPR_EXPORT_DIR, gdpr_export.archive_name(user_id))
+    if progress is None or progress["status"] != "done" or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Export not ready")
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        filename=gdpr_export.archive_name(user_id),
+    )
+
+
+# moderation endpoints:
+@app.get("/moderation/stats", response_model=schemas.ModerationStats)
+def read_moderation_stats(db: Session = Depends(get_db)):
+    return moderation.read_stats(db)
+
+
+# leaderboard endpoints:
+@app.get("/leaderboard/current", response_model=schemas.RankingRead)
+def read_current_leaderboard(db: Session = Depends(get_db)):
+    period, entries = leaderboard.snapshot()
+    missing = [quote_id for _, quote_id, _ in entries if leaderboard.quote_text(quote_id) is None]
+    if missing:
+        # only quotes that entered the top since the last reconciliation
+        leaderboard.remember_quotes(db.execute(quote_text_statement(missing)).all())
+    items = []
+    for rank, quote_id, vote_count in entries:
+        quote, child_name = leaderboard.quote_text(quote_id) or (None, None)
+        items.append(
+            {"rank": rank, "vote_count": vote_count, "quote_id": quote_id, "quote": quote, "child_name": child_name}
+        )
+    return fast_json.typed_response(schemas.RankingRead, {"period": period or current_period(), "entries": items})
+
+
+# analytics endpoints:
+@app.post(
+    "/analytics/events",
+    status_code=202,
+    response_model=schemas.AnalyticsEventsAccepted,
+    openapi_extra={
+        "requestBody": {"required": True, "content": {"application/json": {"schema": events_adapter.json_schema()}}}
+    },
+)
+async def create_analytics_events(request: Request):
+    try:
+        events = events_adapter.validate_json(await request.body())
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors(include_url=False))
+    if not analytics_buffer.offer(events):
+        raise HTTPException(status_code=503, detail="Analytics buffer is full, retry later", headers={"Retry-After": "5"})
+    return schemas.AnalyticsEventsAccepted(accepted=len(events))
+
+
+# users, quotes and votes endpoints run on the async stack when DB_ASYNC is set
+app.include_router(async_api.router if settings.DB_ASYNC else router)
@@ -0,0 +1,138 @@
+# Vote milestones: tell an author when their quote reaches 10, 50, 100, ... votes.
+#
+# Nothing is counted. POST /votes runs vote_statement(), one round trip:
+# the vote is inserted, quotes.vote_count is bumped by UPDATE ... RETURNING,
+# and when the returned count is a milestone the author's notification is
+# inserted, all in one statement. Batched inserts (write-behind) go through
+# notify_crossed() with the counts their own UPDATE returned.
+#
+# notifications_vote_milestone_unique, on (quote_id, milestone) of the
+# vote_milestone rows, makes a milestone notify once: reaching it again after
+# votes were deleted hits ON CONFLICT DO NOTHING.
+
+from sqlalchemy import BigInteger, Integer, Text, case, column, exists, func, literal, not_, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+
+
+# locale -> (title, body); body is a format() template of (milestone, child_name)
+TEMPLATES = {
+    "fr": ("Ta citation décolle 🎉", "La phrase de %2$s vient d'atteindre %1$s votes !"),
+    "en": ("Your quote is taking off 🎉", "%2$s's quote just reached %1$s votes!"),
+}
+DEFAULT_LOCALE = "fr"
+
+NOTIFICATION_COLUMNS = ["user_id", "type", "title", "body", "data"]
+
+
+def crossed(previous: int, current: int) -> list[int]:
+    """Milestones in (previous, current]."""
+    return [milestone for milestone in settings.VOTE_MILESTONES if previous < milestone <= current]
+
+
+def _localized(locale, index: int):
+    default = TEMPLATES[DEFAULT_LOCALE][index]
+    return case(
+        *((locale == name, literal(texts[index])) for name, texts in TEMPLATES.items() if name != DEFAULT_LOCALE),
+        else_=literal(default),
+    )
+
+
+def _notifications(source, quote_id, milestone):
+    """INSERT of the milestone notifications of ``source``'s (quote_id, milestone) rows.
+
+    Authors who turned milestones off, or who are banned or gone, are skipped.
+    """
+    U, Q = models.User, models.Quote
+    rows = (
+        select(
+            U.id,
+            literal(models.NotificationTypeEnum.vote_milestone.value),
+            _localized(U.locale, 0),
+            func.format(_localized(U.locale, 1), milestone, Q.child_name),
+            func.jsonb_build_object(
+                "type", models.NotificationTypeEnum.vote_milestone.value, "quote_id", quote_id, "milestone", milestone
+            ),
+        )
+        .select_from(source)
+        .join(Q, Q.id == quote_id)
+        .join(U, U.id == Q.user_id)
+        .where(U.notif_vote_milestone, U.is_active, not_(U.is_banned), U.deleted_at.is_(None))
+    )
+    return pg_insert(models.Notification.__table__).from_select(NOTIFICATION_COLUMNS, rows).on_conflict_do_nothing()
+
+
+def no_earlier_vote(quote_id, user_id, device_id, period):
+    """No vote of this viewer for this quote in a period before ``period``.
+
+    The unique indexes include the partition key, so they only catch a
+    second vote within a month; this keeps one vote per viewer and quote.
+    A quote's votes carry its creation month or a later one, which bounds
+    the partitions searched.
+    """
+    V, Q = models.Vote, models.Quote
+    created_period = select(func.to_char(func.timezone("UTC", Q.created_at), "YYYY-MM")).where(Q.id == quote_id)
+    return ~exists().where(
+        V.quote_id == quote_id,
+        or_(V.user_id == user_id, V.device_id == device_id),
+        V.vote_period < period,
+        V.vote_period >= created_period.correlate_except(Q).scalar_subquery(),
+    )
+
+
+def vote_statement(vote, period: str):
+    """Insert ``vote`` in ``period``, bump its quote and notify a milestone, in one statement.
+
+    Returns no row when the viewer already voted for the quote, in this
+    period or an earlier one; otherwise the vote's columns plus the new
+    vote_count.
+    """
+    V, Q = models.Vote.__table__, models.Quote.__table__
+    quote_id, user_id = literal(vote.quote_id, BigInteger), literal(vote.user_id, BigInteger)
+    device_id, vote_period = literal(vote.device_id, Text), literal(period, Text)
+    inserted = (
+        pg_insert(V)
+        .from_select(
+            ["quote_id", "user_id", "device_id", "vote_period"],
+            select(quote_id, user_id, device_id, vote_period).where(
+                no_earlier_vote(quote_id, user_id, device_id, vote_period)
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(V.c.id, V.c.quote_id, V.c.user_id, V.c.device_id, V.c.vote_period)
+        .cte("inserted")
+    )
+    bumped = (
+        update(Q)
+        .where(Q.c.id == inserted.c.quote_id)
+        .values(vote_count=Q.c.vote_count + 1)
+        .returning(Q.c.id, Q.c.vote_count)
+        .cte("bumped")
+    )
+    reached = select(bumped.c.id, bumped.c.vote_count).where(bumped.c.vote_count.in_(settings.VOTE_MILESTONES)).subquery()
+    notified = (
+        _notifications(reached, reached.c.id, reached.c.vote_count)
+        .returning(models.Notification.__table__.c.id)
+        .cte("notified")
+    )
+    # a data-modifying CTE runs whether or not it is read, but SQLAlchemy
+    # only renders the ones the final SELECT refers to
+    return select(
+        inserted,
+        bumped.c.vote_count,
+        select(func.count()).select_from(notified).scalar_subquery().label("milestones_notified"),
+    ).outerjoin(bumped, bumped.c.id == inserted.c.quote_id)
+
+
+def notify_crossed(db, counts) -> None:
+    """Notify the milestones crossed by (quote_id, new vote_count, increment) rows."""
+    reached = [
+        (quote_id, milestone)
+        for quote_id, vote_count, increment in counts
+        for milestone in crossed(vote_count - increment, vote_count)
+    ]
+    if reached:
+        rows = values(column("quote_id", BigInteger), column("milestone", Integer), name="reached").data(reached)
+        db.execute(_notifications(rows, rows.c.quote_id, rows.c.milestone))
@@ -54,11 +54,12 @@ class AuthProviderEnum(str, enum.Enum):
 
 
 class ModerationStatusEnum(str, enum.Enum):
-    pending  = "pending"
-    approved = "approved"
-    rejected = "rejected"
-    flagged  = "flagged"
-    archived = "archived"
+    pending    = "pending"
+    moderating = "moderating"    # pris en charge par un worker de modération IA
+    approved   = "approved"
+    rejected   = "rejected"
+    flagged    = "flagged"
+    archived   = "archived"
 
 
 class ModerationMethodEnum(str, enum.Enum):
@@ -172,6 +173,13 @@ class User(Base):
     __table_args__ = (
         UniqueConstraint("auth_provider", "provider_user_id", name="users_provider_unique"),
         # CheckConstraint sur le format email géré côté PostgreSQL, pas besoin de le répliquer en Python
+        # Audience de la pépite du jour, parcourue par (locale, id)
+        Index(
+            "users_daily_pepite_audience", "locale", "id",
+            postgresql_where=text(
+                "is_active AND NOT is_banned AND notif_daily_pepite AND push_token IS NOT NULL AND deleted_at IS NULL"
+            ),
+        ),
     )
 
     # Relationships
@@ -190,7 +198,8 @@ class User(Base):
 
     votes: Mapped[list["Vote"]] = relationship(
         "Vote",
-        back_populates="user"
+        back_populates="user",
+        passive_deletes=True,
     )
 
     reports_filed: Mapped[list["Report"]] = relationship(
@@ -201,17 +210,20 @@ class User(Base):
     
     iap_purchases: Mapped[list["IapPurchase"]] = relationship(
         "IapPurchase",
-        back_populates="user"
+        back_populates="user",
+        passive_deletes=True,
     )
 
     pdf_booklets: Mapped[list["PdfBooklet"]] = relationship(
         "PdfBooklet",
-        back_populates="user"
+        back_populates="user",
+        passive_deletes=True,
     )
 
     notifications: Mapped[list["Notification"]] = relationship(
         "Notification",
-        back_populates="user"
+        back_populates="user",
+        passive_deletes=True,
     )
 
     ai_moderation_logs: List["AiModerationLog"] = relationship(
@@ -231,7 +243,7 @@ class Device(Base):
 
     id                 = Column(Text, primary_key=True)
     device_fingerprint = Column(Text, nullable=False, unique=True)   # Hash anonymisé de l'appareil
-    user_id            = Column(BigInteger, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    user_id            = Column(BigInteger, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
     locale             = Column(Text, server_default="fr", nullable=False)
     platform           = Column(Text, nullable=True)                 # 'ios' ou 'android'
     app_version        = Column(Text, nullable=True)
@@ -298,6 +310,7 @@ class Quote(Base):
     moderation_notes  = Column(Text,    nullable=True)
     moderated_at      = Column(TIMESTAMP(timezone=True), nullable=True)
     moderated_by      = Column(BigInteger, ForeignKey("users.id"), nullable=True)
+    moderation_started_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Prise en charge par un worker IA
 
     # Scores IA (0.0 à 1.0)
     ai_safety_score  = Column(Numeric(4, 3), nullable=True)
@@ -327,6 +340,20 @@ class Quote(Base):
         CheckConstraint("child_age_months BETWEEN 0 AND 11",            name="quotes_age_months"),
         CheckConstraint("char_length(quote) BETWEEN 5 AND 800",         name="quotes_quote_length"),
         CheckConstraint("user_id IS NOT NULL OR device_id IS NOT NULL", name="quotes_author"),
+        # Index (colonne de tri, id) pour la pagination par curseur du feed
+        Index("quotes_feed_created_at",     "created_at",     "id"),
+        Index("quotes_feed_trending_score", "trending_score", "id"),
+        Index("quotes_feed_bayesian_score", "bayesian_score", "id"),
+        Index("quotes_feed_vote_count",     "vote_count",     "id"),
+        # Suppression d'un utilisateur (deletion.py)
+        Index("quotes_by_user",      "user_id",      postgresql_where=text("user_id IS NOT NULL")),
+        Index("quotes_by_moderator", "moderated_by", postgresql_where=text("moderated_by IS NOT NULL")),
+        # File de modération IA (python -m app.fastApi.moderation)
+        Index(
+            "quotes_pending_moderation", "created_at", "id",
+            postgresql_where=text("status = 'pending' AND deleted_at IS NULL"),
+        ),
+        Index("quotes_moderating", "moderation_started_at", postgresql_where=text("status = 'moderating'")),
     )
 
     # Relationships
@@ -350,19 +377,22 @@ class Quote(Base):
     votes: Mapped[list["Vote"]] = relationship(
         "Vote",
         back_populates="quote",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,   # ON DELETE CASCADE, les lignes ne sont pas chargées
     )
 
     reports: Mapped[list["Report"]] = relationship(
         "Report",
         back_populates="quote",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,   # ON DELETE CASCADE, les lignes ne sont pas chargées
     )
 
     ai_logs: Mapped[list["AiModerationLog"]] = relationship(
         "AiModerationLog",
         back_populates="quote",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True,   # ON DELETE CASCADE, les lignes ne sont pas chargées
     )
 
     monthly_rankings: Mapped[list["MonthlyRanking"]] = relationship(
@@ -388,13 +418,20 @@ class Vote(Base):
     quote_id    = Column(BigInteger, ForeignKey("quotes.id", ondelete="CASCADE"),  nullable=False)
     user_id     = Column(BigInteger, ForeignKey("users.id",  ondelete="CASCADE"),  nullable=True)   # connecté
     device_id   = Column(Text,       ForeignKey("devices.id", ondelete="CASCADE"), nullable=True)   # non connecté
-    vote_period = Column(Text, nullable=False)                       # Format : 'YYYY-MM'
+    vote_period = Column(Text, primary_key=True)                     # Format : 'YYYY-MM', clé de partition
     created_at  = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
+    # Partitionnée par LIST (vote_period), une partition par mois (votes_yYYYYmMM).
+    # Les index uniques incluent la clé de partition : ils n'empêchent qu'un second vote dans le même mois ;
+    # l'INSERT vérifie les mois précédents (milestones.no_earlier_vote) : un vote par citation, toutes périodes.
     __table_args__ = (
         CheckConstraint("(user_id IS NOT NULL) <> (device_id IS NOT NULL)", name="votes_user_or_device"),
-        Index("votes_unique_user", "quote_id", "user_id", unique=True, postgresql_where=text("user_id IS NOT NULL")),
-        Index("votes_unique_device", "quote_id", "device_id", unique=True, postgresql_where=text("device_id IS NOT NULL")),
+        Index("votes_unique_user", "quote_id", "user_id", "vote_period", unique=True, postgresql_where=text("user_id IS NOT NULL")),
+        Index("votes_unique_device", "quote_id", "device_id", "vote_period", unique=True, postgresql_where=text("device_id IS NOT NULL")),
+        # Chargement des votes d'un votant (index-only scan)
+        Index("votes_by_user",   "user_id",   "quote_id", postgresql_where=text("user_id IS NOT NULL")),
+        Index("votes_by_device", "device_id", "quote_id", postgresql_where=text("device_id IS NOT NULL")),
+        {"postgresql_partition_by": "LIST (vote_period)"},
     )
 
     # Relationships
@@ -432,6 +469,7 @@ class MonthlyRanking(Base):
 
     __table_args__ = (
         UniqueConstraint("period", "quote_id", name="monthly_rankings_unique"),
+        Index("monthly_rankings_by_quote", "quote_id"),
     )
 
     # Relationships
@@ -467,6 +505,8 @@ class Report(Base):
         UniqueConstraint("quote_id", "user_id",   name="reports_unique_user",   deferrable=True),
         UniqueConstraint("quote_id", "device_id", name="reports_unique_device", deferrable=True),
         CheckConstraint("user_id IS NOT NULL OR device_id IS NOT NULL", name="reports_author"),
+        Index("reports_by_user",     "user_id",     postgresql_where=text("user_id IS NOT NULL")),
+        Index("reports_by_reviewer", "reviewed_by", postgresql_where=text("reviewed_by IS NOT NULL")),
     )
 
     # Relationships
@@ -523,6 +563,11 @@ class AiModerationLog(Base):
 
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ai_moderation_logs_by_quote", "quote_id"),
+        Index("ai_moderation_logs_by_override_user", "override_by", postgresql_where=text("override_by IS NOT NULL")),
+    )
+
     # Relationships
     quote: Mapped["Quote"] = relationship(
         "Quote",
@@ -545,7 +590,7 @@ class IapPurchase(Base):
     __tablename__ = "iap_purchases"
 
     id      = Column(BigInteger, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
 
     # Produit
     product  = Column(String, nullable=False)                       # IapProductEnum
@@ -599,7 +644,7 @@ class PdfBooklet(Base):
     __tablename__ = "pdf_booklets"
 
     id          = Column(BigInteger, primary_key=True, autoincrement=True)
-    user_id     = Column(BigInteger, ForeignKey("users.id",         ondelete="CASCADE"), nullable=False)
+    user_id     = Column(BigInteger, ForeignKey("users.id",         ondelete="CASCADE"), nullable=False, index=True)
     purchase_id = Column(BigInteger, ForeignKey("iap_purchases.id"), nullable=True)      # NULL si premium
 
     # Contenu du livret
@@ -613,6 +658,8 @@ class PdfBooklet(Base):
     error_message       = Column(Text,    nullable=True)
     file_size_bytes     = Column(Integer, nullable=True)
     storage_path        = Column(Text,    nullable=True)            # Chemin Railway volumes / S3
+    generation_started_at = Column(TIMESTAMP(timezone=True), nullable=True)  # Prise en charge par un renderer
+    generation_ms         = Column(Integer, nullable=True)                   # Durée du rendu
     download_url        = Column(Text,    nullable=True)            # URL signée temporaire
     download_expires_at = Column(TIMESTAMP(timezone=True), nullable=True)
     download_count      = Column(Integer, server_default="0", nullable=False)
@@ -632,6 +679,11 @@ class PdfBooklet(Base):
         back_populates="pdf_booklets"
     )
 
+    __table_args__ = (
+        # File de rendu (python -m app.fastApi.booklets)
+        Index("pdf_booklets_pending", "id", postgresql_where=text("status = 'pending'")),
+    )
+
 
 # =============================================================================
 # TABLE : notifications
@@ -642,7 +694,7 @@ class Notification(Base):
     __tablename__ = "notifications"
 
     id      = Column(BigInteger, primary_key=True, autoincrement=True)
-    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
 
     type  = Column(String, nullable=False)                          # NotificationTypeEnum
     title = Column(Text,   nullable=False)
@@ -658,6 +710,19 @@ class Notification(Base):
 
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        # File d'envoi du dispatcher push (python -m app.fastApi.push)
+        Index("notifications_pending", "id", postgresql_where=text("NOT is_sent AND send_error IS NULL")),
+        # Un seul envoi par palier de votes et par citation (app.fastApi.milestones)
+        Index(
+            "notifications_vote_milestone_unique",
+            text("(data->>'quote_id')"),
+            text("(data->>'milestone')"),
+            unique=True,
+            postgresql_where=text("type = 'vote_milestone'"),
+        ),
+    )
+
     # Relationships
     user: Mapped["User"] = relationship(
         "User",
@@ -682,11 +747,18 @@ class AppConfig(Base):
 # =============================================================================
 # TABLE : analytics_events
 # Événements custom backend — complément Firebase Analytics
-# Rétention 90 jours via purge_old_analytics_events() (cron hebdo)
+# Partitionnée par mois sur created_at (partitions analytics_events_yYYYYmMM)
+# Rétention 90 jours via purge_old_analytics_events() : les partitions expirées
+# sont détachées puis supprimées (python -m app.fastApi.partitions maintain)
 # =============================================================================
 
 class AnalyticsEvent(Base):
     __tablename__ = "analytics_events"
+    __table_args__ = (
+        Index("analytics_events_by_user",  "user_id",  postgresql_where=text("user_id IS NOT NULL")),
+        Index("analytics_events_by_quote", "quote_id", postgresql_where=text("quote_id IS NOT NULL")),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
     id         = Column(BigInteger, primary_key=True, autoincrement=True)
     event_name = Column(Text, nullable=False, index=True)           # 'quote_viewed', 'vote_cast', etc.
@@ -694,7 +766,7 @@ class AnalyticsEvent(Base):
     device_id  = Column(Text, ForeignKey("devices.id",  ondelete="SET NULL"), nullable=True)
     quote_id   = Column(BigInteger, ForeignKey("quotes.id",   ondelete="SET NULL"), nullable=True)
     properties = Column(JSONB, nullable=True)                       # Propriétés custom de l'événement
-    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), nullable=False, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now(), primary_key=True, index=True)  # clé de partition, dans la PK
 
     # Relationships
     user: Mapped[Optional["User"]] = relationship(
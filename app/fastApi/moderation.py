@@ -0,0 +1,616 @@
+# AI moderation of pending quotes, in batches.
+#
+#   python -m app.fastApi.moderation               # moderate what is pending, then exit
+#   python -m app.fastApi.moderation --loop        # keep polling, for a worker process
+#   python -m app.fastApi.moderation --stub        # deterministic local model, no API calls
+#
+# The queue is quotes.status (pending -> moderating -> approved | rejected |
+# flagged). A worker leases up to MODERATION_CLAIM_BATCH pending quotes,
+# oldest first: one UPDATE over FOR UPDATE SKIP LOCKED marks them moderating
+# with moderation_started_at and commits, so no row lock is held during the
+# model round trips. They go to the model MODERATION_QUOTES_PER_REQUEST per
+# request, so the instructions are paid once per request rather than once
+# per quote. At most MODERATION_CONCURRENCY requests are in flight, spaced
+# to stay under MODERATION_REQUESTS_PER_MINUTE. The verdicts are written
+# back with one UPDATE of quotes and one multi-row INSERT of
+# ai_moderation_logs, in one transaction.
+#
+# A request that fails as a whole (network error, 429, 5xx) puts its quotes
+# back to pending for a later claim. A quote the model gives no usable
+# verdict for is flagged for a human. A lease older than
+# MODERATION_LEASE_SECONDS, whose worker died or lost the database, is put
+# back to pending; a late write of an expired lease is ignored.
+#
+# Each process keeps rolling counters (quotes, tokens, cost, lag) over
+# MODERATION_STATS_WINDOW_SECONDS in app_config under moderation.stats.<worker>;
+# GET /moderation/stats adds up the live ones.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import BigInteger, Numeric, Text, case, cast, column, func, insert, or_, select, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "moderation.stats.{}"
+
+PENDING = models.ModerationStatusEnum.pending.value
+MODERATING = models.ModerationStatusEnum.moderating.value
+APPROVED = models.ModerationStatusEnum.approved.value
+REJECTED = models.ModerationStatusEnum.rejected.value
+FLAGGED = models.ModerationStatusEnum.flagged.value
+DECISIONS = (APPROVED, REJECTED, FLAGGED)
+REJECTION_REASONS = tuple(reason.value for reason in models.RejectionReasonEnum)
+
+INSTRUCTIONS = f"""You moderate short quotes that parents post about things their young children said.
+For every quote of the input, decide:
+- "approved": authentic, funny or touching, safe to show to everyone;
+- "rejected": not publishable, with a rejection_reason among {", ".join(REJECTION_REASONS)};
+- "flagged": unsure, a human will review it.
+Also score safety (1 = harmless) and quality (1 = delightful) between 0 and 1, suggest up to 3 short
+lowercase French tags (e.g. "humour", "philosophique", "tendresse") and give a one-sentence reasoning.
+Answer with a JSON object {{"results": [{{"id": <quote id>, "decision": ..., "safety": ..., "quality": ...,
+"tags": [...], "rejection_reason": ... or null, "reasoning": ...}}]}} with one entry per input quote."""
+
+
+class TransientError(Exception):
+    """The request failed as a whole and can be retried; ``retry_after`` in seconds."""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Verdict:
+    quote_id: int
+    decision: str                           # approved / rejected / flagged
+    safety_score: float | None = None
+    quality_score: float | None = None
+    tags: list[str] | None = None
+    rejection_reason: str | None = None
+    reasoning: str | None = None
+
+
+@dataclass
+class ModerationResult:
+    """Verdicts of one request; its tokens are for all of its quotes."""
+    verdicts: list[Verdict]
+    prompt_tokens: int
+    completion_tokens: int
+    model: str
+    model_version: str | None = None
+
+
+class ModerationClient:
+    """A model behind one request per list of quotes."""
+
+    model: str
+
+    async def moderate(self, quotes: list) -> ModerationResult:
+        """Moderate ``quotes`` (rows with id, quote, context, child_age_years)."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def _score(value) -> float | None:
+    try:
+        return min(1.0, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value, limit: int) -> str | None:
+    """``value`` as text fit for Postgres (which refuses NUL bytes), None when empty."""
+    return str(value).replace("\x00", "")[:limit] or None
+
+
+def parse_verdict(item: dict) -> Verdict | None:
+    """A verdict from one entry of the model's answer, None when it is unusable."""
+    try:
+        quote_id = int(item["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    decision = item.get("decision")
+    if decision not in DECISIONS:
+        return None
+    reason = item.get("rejection_reason")
+    if decision == REJECTED and reason not in REJECTION_REASONS:
+        reason = models.RejectionReasonEnum.other.value
+    tags = item.get("tags")
+    if isinstance(tags, list):
+        tags = [tag for tag in (_text(tag, 40) for tag in tags[:3]) if tag] or None
+    else:
+        tags = None
+    return Verdict(
+        quote_id=quote_id,
+        decision=decision,
+        safety_score=_score(item.get("safety")),
+        quality_score=_score(item.get("quality")),
+        tags=tags,
+        rejection_reason=reason if decision == REJECTED else None,
+        reasoning=_text(item.get("reasoning") or "", 1000),
+    )
+
+
+class OpenAIClient(ModerationClient):
+    """Chat completions in JSON mode, several quotes per request."""
+
+    def __init__(self):
+        if not settings.OPENAI_API_KEY:
+            raise RuntimeError("OPENAI_API_KEY is not set (use --stub to run without it)")
+        self.model = settings.MODERATION_MODEL
+        self._http = httpx.AsyncClient(
+            headers={"Authorization": f"Bearer {settings.OPENAI_API_KEY}"},
+            timeout=settings.MODERATION_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=settings.MODERATION_CONCURRENCY),
+        )
+
+    async def moderate(self, quotes: list) -> ModerationResult:
+        payload = [
+            {"id": quote.id, "quote": quote.quote, "context": quote.context, "child_age": quote.child_age_years}
+            for quote in quotes
+        ]
+        try:
+            response = await self._http.post(
+                settings.MODERATION_API_URL,
+                json={
+                    "model": self.model,
+                    "temperature": 0,
+                    "response_format": {"type": "json_object"},
+                    "messages": [
+                        {"role": "system", "content": INSTRUCTIONS},
+                        {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+                    ],
+                },
+            )
+        except httpx.HTTPError as exc:
+            raise TransientError(f"request failed: {exc}") from exc
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = float(response.headers.get("retry-after") or 0)
+            raise TransientError(f"model API answered {response.status_code}", retry_after)
+        response.raise_for_status()
+        body = response.json()
+        try:
+            results = json.loads(body["choices"][0]["message"]["content"])["results"]
+        except (KeyError, IndexError, TypeError, ValueError):
+            results = []
+        usage = body.get("usage") or {}
+        return ModerationResult(
+            verdicts=[verdict for verdict in map(parse_verdict, results) if verdict is not None],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            model=self.model,
+            model_version=_text(body.get("model") or "", 200),
+        )
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+class StubClient(ModerationClient):
+    """Deterministic local model: same quote, same verdict, plausible token counts."""
+
+    model = "stub"
+    BLOCKED_WORDS = ("merde", "putain", "connard", "salope", "fuck", "shit")
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def verdict(self, quote) -> Verdict:
+        digest = hashlib.blake2b(quote.quote.encode(), digest_size=2).digest()
+        quality = round(0.3 + 0.7 * digest[0] / 255, 3)
+        text = quote.quote.lower()
+        if any(word in text for word in self.BLOCKED_WORDS):
+            return Verdict(quote.id, REJECTED, 0.1, quality, None, "inappropriate_content", "contains a blocked word")
+        if len(quote.quote.strip()) < 10:
+            return Verdict(quote.id, REJECTED, 1.0, quality, None, "too_short", "too short to be a quote")
+        decision = APPROVED if quality >= 0.4 else FLAGGED
+        tags = ["humour" if digest[1] % 2 else "tendresse"]
+        return Verdict(quote.id, decision, round(0.9 + 0.1 * digest[1] / 255, 3), quality, tags, None, "stub verdict")
+
+    async def moderate(self, quotes: list) -> ModerationResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = estimate_tokens(INSTRUCTIONS) + sum(
+            estimate_tokens(quote.quote) + estimate_tokens(quote.context or "") + 12 for quote in quotes
+        )
+        return ModerationResult(
+            verdicts=[self.verdict(quote) for quote in quotes],
+            prompt_tokens=prompt,
+            completion_tokens=45 * len(quotes),
+            model=self.model,
+        )
+
+
+class RateLimiter:
+    """At most ``concurrency`` requests in flight, started at most ``per_minute`` a minute."""
+
+    def __init__(self, per_minute: float, concurrency: int):
+        self.interval = 60.0 / per_minute
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def back_off(self, seconds: float) -> None:
+        """Hold every request back for ``seconds`` (the API asked us to slow down)."""
+        self._next = max(self._next, time.monotonic() + seconds)
+
+
+@dataclass
+class Window:
+    """Counters of one batch, kept while it is inside the rolling window."""
+    at: float
+    quotes: int = 0
+    requests: int = 0
+    deferred: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    lag_seconds_total: float = 0.0
+    lag_seconds_max: float = 0.0
+    decisions: Counter = field(default_factory=Counter)
+
+
+class RollingStats:
+    """Moderation counters over the last ``window_seconds``, per process."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.started = time.monotonic()
+        self._batches: deque[Window] = deque()
+
+    def record(self, batch: Window) -> None:
+        self._batches.append(batch)
+        cutoff = time.monotonic() - self.window_seconds
+        while self._batches and self._batches[0].at < cutoff:
+            self._batches.popleft()
+
+    def snapshot(self, pending: Window | None = None) -> dict:
+        """The counters of the window, plus ``pending`` (a batch not recorded yet) if given."""
+        total = Window(at=0.0)
+        for batch in [*self._batches, *([pending] if pending else [])]:
+            for name in ("quotes", "requests", "deferred", "prompt_tokens", "completion_tokens", "cost_usd", "lag_seconds_total"):
+                setattr(total, name, getattr(total, name) + getattr(batch, name))
+            total.lag_seconds_max = max(total.lag_seconds_max, batch.lag_seconds_max)
+            total.decisions += batch.decisions
+        return {
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            # a process younger than the window has counted for less than it
+            "seconds": min(self.window_seconds, time.monotonic() - self.started),
+            "quotes": total.quotes,
+            "requests": total.requests,
+            "deferred": total.deferred,
+            "prompt_tokens": total.prompt_tokens,
+            "completion_tokens": total.completion_tokens,
+            "cost_usd": round(total.cost_usd, 6),
+            "lag_seconds_total": total.lag_seconds_total,
+            "lag_seconds_max": total.lag_seconds_max,
+            "decisions": dict(total.decisions),
+        }
+
+
+def summarize(snapshots: list[dict]) -> dict:
+    """Rates of the workers' snapshots, added up."""
+    seconds = max((snapshot["seconds"] for snapshot in snapshots), default=0.0)
+    quotes = sum(snapshot["quotes"] for snapshot in snapshots)
+    prompt_tokens = sum(snapshot["prompt_tokens"] for snapshot in snapshots)
+    completion_tokens = sum(snapshot["completion_tokens"] for snapshot in snapshots)
+    cost = sum(snapshot["cost_usd"] for snapshot in snapshots)
+    decisions = sum((Counter(snapshot["decisions"]) for snapshot in snapshots), Counter())
+    return {
+        "workers": len(snapshots),
+        "window_seconds": round(seconds, 1),
+        "quotes": quotes,
+        "requests": sum(snapshot["requests"] for snapshot in snapshots),
+        "deferred": sum(snapshot["deferred"] for snapshot in snapshots),
+        "quotes_per_minute": round(quotes * 60 / seconds, 2) if seconds else 0.0,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "tokens_per_quote": round((prompt_tokens + completion_tokens) / quotes, 1) if quotes else None,
+        "cost_usd": round(cost, 6),
+        "cost_per_quote_usd": round(cost / quotes, 6) if quotes else None,
+        "cost_per_hour_usd": round(cost * 3600 / seconds, 4) if seconds else 0.0,
+        "lag_seconds_avg": round(sum(s["lag_seconds_total"] for s in snapshots) / quotes, 1) if quotes else None,
+        "lag_seconds_max": round(max((s["lag_seconds_max"] for s in snapshots), default=0.0), 1),
+        "decisions": dict(decisions),
+    }
+
+
+def read_stats(db) -> dict:
+    """The summary of the workers that reported within the window."""
+    A = models.AppConfig
+    rows = db.execute(
+        select(A.value).where(
+            A.key.startswith(STATS_KEY.format("")),
+            A.updated_at >= func.now() - timedelta(seconds=settings.MODERATION_STATS_WINDOW_SECONDS),
+        )
+    ).scalars()
+    return summarize([json.loads(value) for value in rows])
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _set_stats(db, snapshot: dict) -> None:
+    stmt = pg_insert(models.AppConfig).values(
+        key=STATS_KEY.format(worker_name()), value=json.dumps(snapshot), description="moderation worker counters"
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.AppConfig.key],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+    )
+
+
+def claim(db, limit: int) -> list:
+    """Mark up to ``limit`` pending quotes as moderating and commit; returns them oldest first."""
+    Q = models.Quote
+    pending = (
+        select(Q.id)
+        .where(Q.status == PENDING, Q.deleted_at.is_(None))
+        .order_by(Q.created_at, Q.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(Q)
+        .where(Q.id.in_(pending))
+        .values(status=MODERATING, moderation_started_at=func.now())
+        .returning(Q.id, Q.quote, Q.context, Q.child_age_years, Q.created_at, Q.moderation_started_at)
+    ).all()
+    db.commit()
+    return sorted(rows, key=lambda row: (row.created_at, row.id))
+
+
+def requeue_stale(db) -> int:
+    """Put back to pending the quotes whose worker never wrote a verdict."""
+    Q = models.Quote
+    cutoff = func.now() - timedelta(seconds=settings.MODERATION_LEASE_SECONDS)
+    result = db.execute(
+        update(Q)
+        .where(Q.status == MODERATING, or_(Q.moderation_started_at < cutoff, Q.moderation_started_at.is_(None)))
+        .values(status=PENDING)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def _shares(total: int, parts: int) -> list[int]:
+    """``total`` split in ``parts`` integers that add up to it."""
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+def cost_usd(prompt_tokens: int, completion_tokens: int) -> float:
+    return (
+        prompt_tokens * settings.MODERATION_PROMPT_USD_PER_MTOK
+        + completion_tokens * settings.MODERATION_COMPLETION_USD_PER_MTOK
+    ) / 1_000_000
+
+
+def outcome_rows(chunk, result: ModerationResult) -> tuple[list[Verdict], list[dict]]:
+    """One verdict and one ai_moderation_logs row per quote of ``chunk``.
+
+    The request's tokens are shared evenly between its quotes. Approvals
+    below MODERATION_MIN_SAFETY and quotes left without a verdict are
+    flagged for a human.
+    """
+    by_id = {verdict.quote_id: verdict for verdict in result.verdicts}
+    prompt_shares = _shares(result.prompt_tokens, len(chunk))
+    completion_shares = _shares(result.completion_tokens, len(chunk))
+    verdicts, logs = [], []
+    for quote, prompt_tokens, completion_tokens in zip(chunk, prompt_shares, completion_shares):
+        verdict = by_id.get(quote.id) or Verdict(quote.id, FLAGGED, reasoning="no verdict from the model")
+        if verdict.decision == APPROVED and (verdict.safety_score or 0) < settings.MODERATION_MIN_SAFETY:
+            verdict.decision = FLAGGED
+        verdicts.append(verdict)
+        logs.append(
+            {
+                "quote_id": quote.id,
+                "ai_model": result.model,
+                "ai_model_version": result.model_version,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": round(cost_usd(prompt_tokens, completion_tokens), 6),
+                "decision": verdict.decision,
+                "safety_score": verdict.safety_score,
+                "quality_score": verdict.quality_score,
+                "suggested_tags": verdict.tags,
+                "rejection_reason": verdict.rejection_reason,
+                "reasoning": verdict.reasoning,
+            }
+        )
+    return verdicts, logs
+
+
+def write_outcomes(db, leased_at, verdicts: list[Verdict], logs: list[dict], deferred: list[int], snapshot: dict) -> None:
+    """Record a batch's verdicts and logs, put its deferred quotes back to pending, and commit.
+
+    Only quotes still under the lease taken at ``leased_at`` are updated: an
+    expired lease may have been requeued and claimed by another worker.
+    """
+    Q = models.Quote
+    leased = (Q.status == MODERATING, Q.moderation_started_at == leased_at)
+    if verdicts:
+        rows = values(
+            column("id", BigInteger),
+            column("status", Text),
+            column("reason", Text),
+            column("safety", Numeric),
+            column("quality", Numeric),
+            column("tags", ARRAY(Text)),
+            name="verdict",
+        ).data(
+            [
+                (v.quote_id, v.decision, v.rejection_reason, v.safety_score, v.quality_score, v.tags)
+                for v in verdicts
+            ]
+        )
+        db.execute(
+            update(Q)
+            .where(Q.id == rows.c.id, *leased)
+            .values(
+                status=rows.c.status,
+                moderation_method=models.ModerationMethodEnum.ai_auto.value,
+                rejection_reason=rows.c.reason,
+                # a VALUES column of NULLs only would be text
+                ai_safety_score=cast(rows.c.safety, Numeric),
+                ai_quality_score=cast(rows.c.quality, Numeric),
+                ai_category_tags=cast(rows.c.tags, ARRAY(Text)),
+                moderated_at=func.now(),
+                published_at=case((rows.c.status == APPROVED, func.coalesce(Q.published_at, func.now())), else_=Q.published_at),
+            )
+        )
+        db.execute(insert(models.AiModerationLog), logs)
+    if deferred:
+        db.execute(update(Q).where(Q.id.in_(deferred), *leased).values(status=PENDING))
+    _set_stats(db, snapshot)
+    db.commit()
+
+
+async def request_chunk(client: ModerationClient, limiter: RateLimiter, chunk) -> ModerationResult | None:
+    """One model request; None when it failed as a whole and the quotes go back to pending."""
+    async with limiter.semaphore:
+        await limiter.wait()
+        try:
+            return await client.moderate(chunk)
+        except TransientError as exc:
+            if exc.retry_after:
+                limiter.back_off(exc.retry_after)
+            logger.warning("moderation: %s, %d quotes deferred", exc, len(chunk))
+        except Exception:
+            logger.exception("moderation: request of %d quotes failed, deferred", len(chunk))
+    return None
+
+
+async def moderate_batch(client: ModerationClient, limiter: RateLimiter, stats: RollingStats) -> Window | None:
+    """Claim, moderate and record one batch; None when nothing was pending."""
+    db = SessionLocal()
+    try:
+        if await asyncio.to_thread(requeue_stale, db):
+            logger.warning("moderation: stale moderating quotes put back to pending")
+        rows = await asyncio.to_thread(claim, db, settings.MODERATION_CLAIM_BATCH)
+        if not rows:
+            return None
+        size = settings.MODERATION_QUOTES_PER_REQUEST
+        chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+        results = await asyncio.gather(*(request_chunk(client, limiter, chunk) for chunk in chunks))
+
+        batch = Window(at=time.monotonic())
+        verdicts, logs, deferred = [], [], []
+        now = datetime.now(timezone.utc)
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                deferred.extend(quote.id for quote in chunk)
+                continue
+            chunk_verdicts, chunk_logs = outcome_rows(chunk, result)
+            verdicts.extend(chunk_verdicts)
+            logs.extend(chunk_logs)
+            batch.requests += 1
+            batch.prompt_tokens += result.prompt_tokens
+            batch.completion_tokens += result.completion_tokens
+            lags = [(now - quote.created_at).total_seconds() for quote in chunk]
+            batch.lag_seconds_total += sum(lags)
+            batch.lag_seconds_max = max(batch.lag_seconds_max, *lags)
+        batch.quotes = len(verdicts)
+        batch.deferred = len(deferred)
+        batch.cost_usd = sum(log["cost_usd"] for log in logs)
+        batch.decisions.update(verdict.decision for verdict in verdicts)
+        leased_at = rows[0].moderation_started_at
+        await asyncio.to_thread(write_outcomes, db, leased_at, verdicts, logs, deferred, stats.snapshot(batch))
+        # counted once written: a batch whose write failed is moderated again after its lease
+        stats.record(batch)
+        return batch
+    finally:
+        # rolls back a write that failed; its quotes stay moderating until the lease expires
+        await asyncio.to_thread(db.close)
+
+
+async def drain(client: ModerationClient, limiter: RateLimiter, stats: RollingStats) -> Counter:
+    """Moderate batches until the queue is empty, or the model API or the database starts failing."""
+    total = Counter()
+    while True:
+        try:
+            batch = await moderate_batch(client, limiter, stats)
+        except Exception:
+            logger.exception("moderation: batch failed, retried on the next poll")
+            return total
+        if batch is None:
+            return total
+        total.update(quotes=batch.quotes, deferred=batch.deferred)
+        if batch.deferred:
+            return total
+
+
+def make_client(stub: bool = False, stub_latency: float = 0.0) -> ModerationClient:
+    return StubClient(stub_latency) if stub else OpenAIClient()
+
+
+async def run(workers: int = 1, loop: bool = False, client: ModerationClient | None = None) -> Counter:
+    client = client or make_client()
+    limiter = RateLimiter(settings.MODERATION_REQUESTS_PER_MINUTE, settings.MODERATION_CONCURRENCY)
+    stats = RollingStats(settings.MODERATION_STATS_WINDOW_SECONDS)
+    total = Counter()
+    try:
+        while True:
+            round_stats = sum(await asyncio.gather(*(drain(client, limiter, stats) for _ in range(workers))), Counter())
+            if round_stats:
+                window = summarize([stats.snapshot()])
+                logger.info(
+                    "moderation: moderated=%d deferred=%d | last %ds: %.1f quotes/min, $%.6f/quote, lag avg %ss max %ss",
+                    round_stats["quotes"], round_stats["deferred"], window["window_seconds"], window["quotes_per_minute"],
+                    window["cost_per_quote_usd"] or 0, window["lag_seconds_avg"], window["lag_seconds_max"],
+                )
+            total += round_stats
+            if not loop:
+                return total
+            await asyncio.sleep(settings.MODERATION_POLL_SECONDS)
+    finally:
+        await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Moderate the pending quotes with the AI model.")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent claim loops in this process")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new quotes")
+    parser.add_argument("--stub", action="store_true", help="use the deterministic local model")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="seconds per stub request")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.workers, args.loop, make_client(args.stub, args.stub_latency)))
+
+
+if __name__ == "__main__":
+    main()
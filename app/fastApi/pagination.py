@@ -0,0 +1,67 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import asc, desc, literal, tuple_
+
+from app.fastApi import models
+
+
+# Sortable feed columns -> (column, parser for the value stored in a cursor).
+# Each one is backed by a composite (column, id) index on quotes.
+SORT_COLUMNS = {
+    "created_at": (models.Quote.created_at, datetime.fromisoformat),
+    "trending_score": (models.Quote.trending_score, Decimal),
+    "bayesian_score": (models.Quote.bayesian_score, Decimal),
+    "vote_count": (models.Quote.vote_count, int),
+}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, order: str, value, quote_id: int) -> str:
+    value = value.isoformat() if isinstance(value, datetime) else str(value)
+    raw = json.dumps([sort, order, value, quote_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sort: str, order: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        cursor_sort, cursor_order, value, quote_id = json.loads(base64.urlsafe_b64decode(padded))
+        value = SORT_COLUMNS[cursor_sort][1](value)
+        quote_id = int(quote_id)
+    except (ValueError, TypeError, KeyError, binascii.Error, InvalidOperation):
+        raise InvalidCursor("Malformed cursor")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise InvalidCursor("Cursor does not match sort and order")
+    return value, quote_id
+
+
+def paginate(query, sort: str, order: str, limit: int, cursor: str | None = None):
+    """Order by (sort column, id) and resume after ``cursor``.
+
+    Works on a ``Query`` as well as on a ``select()``. One extra row is
+    fetched so that ``split_page`` can tell whether a next page exists.
+    """
+    column = SORT_COLUMNS[sort][0]
+    direction = desc if order == "desc" else asc
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort, order)
+        key = tuple_(column, models.Quote.id)
+        bound = tuple_(literal(value, column.type), literal(last_id, models.Quote.id.type))
+        query = query.where(key < bound if order == "desc" else key > bound)
+    return query.order_by(direction(column), direction(models.Quote.id)).limit(limit + 1)
+
+
+def split_page(rows, sort: str, order: str, limit: int):
+    """Drop the look-ahead row and build the cursor of the following page."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(sort, order, getattr(last, sort), last.id)
@@ -0,0 +1,192 @@
+# Monthly partitions: creation ahead of time, retention and archiving.
+#
+#   python -m app.fastApi.partitions maintain             # run daily from cron
+#   python -m app.fastApi.partitions detach votes 2025-01 # archive a month
+#
+# Partitions are named <table>_yYYYYmMM. New ones are created as plain tables
+# and then attached, which only takes a SHARE UPDATE EXCLUSIVE lock on the
+# parent. Expired ones are detached CONCURRENTLY and dropped, so retention
+# is a catalog operation: no DELETE, no bloat, no vacuum debt. A detached
+# partition is left as a standalone table, to dump or move to a cheaper
+# tablespace.
+#
+# There is no DEFAULT partition. Should the daily run lapse, a writer that
+# gets a "no partition of relation" error calls create_missing() itself.
+
+import argparse
+import logging
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import text
+
+from .config import settings
+from .database import engine
+
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _timestamp_range(month: date) -> str:
+    return f"FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+
+
+def _period_list(month: date) -> str:
+    return f"IN ('{month:%Y-%m}')"
+
+
+@dataclass(frozen=True)
+class MonthlyPartitioning:
+    table: str
+    for_values: Callable[[date], str]       # partition bound clause of a month
+    retention_days: int | None = None       # None keeps every partition
+
+    def partition_name(self, month: date) -> str:
+        return f"{self.table}_y{month.year:04d}m{month.month:02d}"
+
+    def month_of(self, partition: str) -> date | None:
+        match = _SUFFIX.search(partition)
+        return date(int(match[1]), int(match[2]), 1) if match and partition.startswith(self.table) else None
+
+
+# RANGE on created_at, stamped by the server
+ANALYTICS_EVENTS = MonthlyPartitioning(
+    "analytics_events", _timestamp_range, retention_days=settings.ANALYTICS_RETENTION_DAYS
+)
+# LIST on vote_period ('YYYY-MM'), one value per partition; kept forever
+VOTES = MonthlyPartitioning("votes", _period_list)
+
+PARTITIONED_TABLES = {spec.table: spec for spec in (ANALYTICS_EVENTS, VOTES)}
+
+
+def existing_partitions(conn, table: str) -> set[str]:
+    return set(
+        conn.execute(
+            text(
+                "SELECT child.relname FROM pg_inherits "
+                "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+                "WHERE parent.relname = :table"
+            ),
+            {"table": table},
+        ).scalars()
+    )
+
+
+def ensure_partitions(conn, spec: MonthlyPartitioning, months_ahead: int, today: date | None = None) -> list[str]:
+    """Create the partitions of the current month and the ``months_ahead`` next ones."""
+    current = (today or datetime.now(timezone.utc).date()).replace(day=1)
+    attached = existing_partitions(conn, spec.table)
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = spec.partition_name(month)
+        if name in attached:
+            continue
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} (LIKE {spec.table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        conn.execute(
+            text(
+                f"ALTER TABLE {spec.table} ATTACH PARTITION {name} FOR VALUES {spec.for_values(month)}"
+            )
+        )
+        conn.commit()
+        created.append(name)
+    return created
+
+
+def missing_partition(exc: Exception) -> bool:
+    """Whether ``exc`` is a row that no partition accepts (their creation fell behind)."""
+    orig = getattr(exc, "orig", exc)
+    return getattr(orig, "pgcode", None) == "23514" and "no partition of relation" in str(orig)
+
+
+def create_missing(spec: MonthlyPartitioning) -> list[str]:
+    """ensure_partitions() outside the daily run, for a writer that found no partition."""
+    with engine.connect() as conn:
+        return ensure_partitions(conn, spec, settings.PARTITIONS_MONTHS_AHEAD)
+
+
+def expired_partitions(conn, spec: MonthlyPartitioning, now: datetime | None = None) -> list[str]:
+    """Partitions whose whole month is older than the retention window."""
+    if spec.retention_days is None:
+        return []
+    cutoff = (now or datetime.now(timezone.utc)).date() - timedelta(days=spec.retention_days)
+    expired = []
+    for name in sorted(existing_partitions(conn, spec.table)):
+        month = spec.month_of(name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            expired.append(name)
+    return expired
+
+
+def detach_partition(conn, spec: MonthlyPartitioning, name: str, drop: bool) -> None:
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block
+    autocommit = conn.execution_options(isolation_level="AUTOCOMMIT")
+    autocommit.execute(text(f"ALTER TABLE {spec.table} DETACH PARTITION {name} CONCURRENTLY"))
+    if drop:
+        autocommit.execute(text(f"DROP TABLE {name}"))
+
+
+def drop_expired(conn, spec: MonthlyPartitioning, now: datetime | None = None) -> list[str]:
+    expired = expired_partitions(conn, spec, now)
+    conn.commit()
+    for name in expired:
+        detach_partition(conn, spec, name, drop=True)
+    return expired
+
+
+def purge_old_analytics_events(now: datetime | None = None) -> list[str]:
+    """Drop the analytics_events partitions past ANALYTICS_RETENTION_DAYS."""
+    with engine.connect() as conn:
+        return drop_expired(conn, ANALYTICS_EVENTS, now)
+
+
+def maintain(months_ahead: int | None = None) -> None:
+    months_ahead = settings.PARTITIONS_MONTHS_AHEAD if months_ahead is None else months_ahead
+    with engine.connect() as conn:
+        for spec in PARTITIONED_TABLES.values():
+            created = ensure_partitions(conn, spec, months_ahead)
+            dropped = drop_expired(conn, spec)
+            logger.info("partitions: %s created=%s dropped=%s", spec.table, created, dropped)
+
+
+def archive(table: str, period: str) -> str:
+    """Detach the ``period`` ('YYYY-MM') partition of ``table`` and keep it as a table."""
+    spec = PARTITIONED_TABLES[table]
+    name = spec.partition_name(datetime.strptime(period, "%Y-%m").date())
+    with engine.connect() as conn:
+        if name not in existing_partitions(conn, table):
+            raise LookupError(f"{name} is not a partition of {table}")
+        conn.commit()
+        detach_partition(conn, spec, name, drop=False)
+    return name
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions.")
+    parser.add_argument("action", choices=["maintain", "detach"])
+    parser.add_argument("table", nargs="?", choices=sorted(PARTITIONED_TABLES), help="detach: partitioned table")
+    parser.add_argument("period", nargs="?", help="detach: month to detach, YYYY-MM")
+    parser.add_argument("--months-ahead", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.action == "maintain":
+        maintain(args.months_ahead)
+    else:
+        if args.table is None or args.period is None:
+            parser.error("detach needs a table and a period")
+        logger.info("partitions: detached %s", archive(args.table, args.period))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolMetrics:
+    """Counters fed by the pool events of one engine.
+
+    Pool events only fire once a connection has been handed out, so the
+    time spent waiting for one (and the timeouts) is measured by the
+    instrumented pool classes below.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_seconds_total = 0.0
+        self.checkout_wait_seconds_max = 0.0
+
+    def _incr(self, attr: str) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def record_wait(self, seconds: float, timed_out: bool) -> None:
+        with self._lock:
+            self.checkout_wait_seconds_total += seconds
+            self.checkout_wait_seconds_max = max(self.checkout_wait_seconds_max, seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            counters = {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_seconds_total": round(self.checkout_wait_seconds_total, 6),
+                "checkout_wait_seconds_max": round(self.checkout_wait_seconds_max, 6),
+            }
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            # QueuePool counts overflow from -pool_size until the pool is full
+            "overflow": max(pool.overflow(), 0),
+            **counters,
+        }
+
+
+class _WaitTimingMixin:
+    metrics: PoolMetrics | None = None
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool, keep feeding the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started, timed_out)
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_registry: dict[str, tuple] = {}
+
+
+def instrument(engine, name: str) -> PoolMetrics:
+    """Attach a ``PoolMetrics`` to ``engine`` (sync Engine or sync_engine of an AsyncEngine)."""
+    metrics = PoolMetrics(name)
+    engine.pool.metrics = metrics
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics._incr("connects")
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics._incr("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics._incr("checkins")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics._incr("invalidations")
+
+    _registry[name] = (engine, metrics)
+    return metrics
+
+
+def snapshot() -> dict:
+    return {name: metrics.snapshot(engine.pool) for name, (engine, metrics) in _registry.items()}
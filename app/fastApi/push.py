@@ -0,0 +1,180 @@
+# Push notification dispatcher: pending notifications -> Expo push service.
+#
+#   python -m app.fastApi.push                 # send what is pending, then exit
+#   python -m app.fastApi.push --loop          # keep polling, for a worker process
+#   python -m app.fastApi.push --workers 4
+#
+# A worker claims up to PUSH_CLAIM_BATCH pending rows with FOR UPDATE SKIP
+# LOCKED, so workers and processes share the queue without sending a row
+# twice. The batch goes to Expo in requests of EXPO_BATCH messages, at most
+# PUSH_CONCURRENCY in flight over one pooled client, and its outcome is
+# written back with a single UPDATE before the claim commits.
+#
+# Per-message errors are recorded in send_error (DeviceNotRegistered also
+# clears the user's push_token). A request that fails as a whole -- network
+# error, 429, 5xx -- leaves its rows pending for a later claim.
+
+import argparse
+import asyncio
+import logging
+from collections import Counter
+
+import httpx
+from sqlalchemy import BigInteger, Boolean, Text, case, column, func, not_, select, update, values
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+EXPO_BATCH = 100    # messages per request accepted by Expo
+
+
+def claim(db, limit: int):
+    """Lock up to ``limit`` pending notifications, with their recipient's token."""
+    N = models.Notification
+    return db.execute(
+        select(N.id, N.title, N.body, N.data, models.User.push_token)
+        .join(models.User, models.User.id == N.user_id)
+        .where(not_(N.is_sent), N.send_error.is_(None))
+        .order_by(N.id)
+        .limit(limit)
+        .with_for_update(of=N, skip_locked=True)
+    ).all()
+
+
+def message(row) -> dict:
+    return {"to": row.push_token, "title": row.title, "body": row.body, "data": row.data or {}, "sound": "default"}
+
+
+def _ticket_outcome(row, ticket: dict) -> tuple[int, bool, str | None]:
+    if ticket.get("status") == "ok":
+        return row.id, True, None
+    error = (ticket.get("details") or {}).get("error") or "error"
+    return row.id, False, f"{error}: {ticket.get('message', '')}"[:500]
+
+
+def unregistered_tokens(chunk, result: list[tuple]) -> list[str]:
+    """Tokens of ``chunk`` that Expo reported as DeviceNotRegistered, to clear from users."""
+    return [row.push_token for row, (_, _, error) in zip(chunk, result) if error and error.startswith("DeviceNotRegistered")]
+
+
+async def send_chunk(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, chunk) -> list[tuple] | None:
+    """Send one Expo request; (id, sent, error) per row, or None to retry later."""
+    async with semaphore:
+        try:
+            response = await client.post(settings.EXPO_PUSH_URL, json=[message(row) for row in chunk])
+        except httpx.HTTPError as exc:
+            logger.warning("push: request of %d messages failed: %s", len(chunk), exc)
+            return None
+    if response.status_code == 429 or response.status_code >= 500:
+        logger.warning("push: Expo answered %d, %d messages deferred", response.status_code, len(chunk))
+        return None
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    tickets = payload.get("data")
+    if response.status_code != 200 or not isinstance(tickets, list) or len(tickets) != len(chunk):
+        # the whole request was rejected: every message carries the reason
+        error = f"request rejected ({response.status_code}): {payload.get('errors')}"[:500]
+        return [(row.id, False, error) for row in chunk]
+    return [_ticket_outcome(row, ticket) for row, ticket in zip(chunk, tickets)]
+
+
+def write_outcomes(db, outcomes: list[tuple], unregistered: list[str]) -> None:
+    """Record a batch's outcome in one UPDATE and commit, releasing the claim."""
+    if outcomes:
+        N = models.Notification
+        rows = values(column("id", BigInteger), column("sent", Boolean), column("error", Text), name="outcome").data(outcomes)
+        db.execute(
+            update(N)
+            .where(N.id == rows.c.id)
+            .values(is_sent=rows.c.sent, sent_at=case((rows.c.sent, func.now())), send_error=rows.c.error)
+        )
+    if unregistered:
+        db.execute(update(models.User).where(models.User.push_token.in_(unregistered)).values(push_token=None))
+    db.commit()
+
+
+async def dispatch_batch(client: httpx.AsyncClient, semaphore: asyncio.Semaphore) -> Counter | None:
+    """Claim, send and record one batch; None when nothing was pending."""
+    db = SessionLocal()
+    try:
+        rows = await asyncio.to_thread(claim, db, settings.PUSH_CLAIM_BATCH)
+        if not rows:
+            return None
+        stats = Counter()
+        outcomes = [(row.id, False, "no push token") for row in rows if not row.push_token]
+        sendable = [row for row in rows if row.push_token]
+        chunks = [sendable[i:i + EXPO_BATCH] for i in range(0, len(sendable), EXPO_BATCH)]
+        results = await asyncio.gather(*(send_chunk(client, semaphore, chunk) for chunk in chunks))
+        unregistered = []
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                stats["deferred"] += len(chunk)
+                continue
+            outcomes.extend(result)
+            unregistered.extend(unregistered_tokens(chunk, result))
+        for _, sent, _ in outcomes:
+            stats["sent" if sent else "failed"] += 1
+        await asyncio.to_thread(write_outcomes, db, outcomes, unregistered)
+        return stats
+    finally:
+        # rolls back, and unlocks, a claim whose outcome was not written
+        await asyncio.to_thread(db.close)
+
+
+async def drain(client: httpx.AsyncClient, semaphore: asyncio.Semaphore) -> Counter:
+    """Dispatch batches until the queue is empty or Expo starts failing."""
+    total = Counter()
+    while True:
+        stats = await dispatch_batch(client, semaphore)
+        if stats is None:
+            return total
+        total += stats
+        if stats["deferred"]:
+            return total
+
+
+def expo_client() -> httpx.AsyncClient:
+    headers = {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+    if settings.EXPO_ACCESS_TOKEN:
+        headers["Authorization"] = f"Bearer {settings.EXPO_ACCESS_TOKEN}"
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=settings.PUSH_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=settings.PUSH_CONCURRENCY, max_keepalive_connections=settings.PUSH_CONCURRENCY),
+    )
+
+
+async def run(workers: int = 1, loop: bool = False) -> Counter:
+    total = Counter()
+    async with expo_client() as client:
+        semaphore = asyncio.Semaphore(settings.PUSH_CONCURRENCY)
+        while True:
+            round_stats = sum(await asyncio.gather(*(drain(client, semaphore) for _ in range(workers))), Counter())
+            if round_stats:
+                logger.info(
+                    "push: sent=%d failed=%d deferred=%d",
+                    round_stats["sent"], round_stats["failed"], round_stats["deferred"],
+                )
+            total += round_stats
+            if not loop:
+                return total
+            await asyncio.sleep(settings.PUSH_POLL_SECONDS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Send the pending notifications through Expo.")
+    parser.add_argument("--workers", type=int, default=1, help="concurrent claim loops in this process")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new notifications")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args.workers, args.loop))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Monthly ranking snapshots (monthly_rankings).
+#
+#   python -m app.fastApi.rankings build 2026-09     # (re)build the top list, still open
+#   python -m app.fastApi.rankings finalize 2026-09  # build once more and freeze it
+#
+# finalize defaults to the previous month, so it can run from a monthly cron.
+
+import argparse
+import heapq
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, exists, func, not_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+
+
+logger = logging.getLogger(__name__)
+
+PERIOD_PATTERN = r"^\d{4}-(0[1-9]|1[0-2])$"
+
+
+class PeriodFinalized(Exception):
+    pass
+
+
+def previous_period(now: datetime | None = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    year, month = (now.year, now.month - 1) if now.month > 1 else (now.year - 1, 12)
+    return f"{year:04d}-{month:02d}"
+
+
+def vote_counts_statement(period: str):
+    """(quote_id, votes) of every quote voted for in ``period``: a single votes partition."""
+    return select(models.Vote.quote_id, func.count()).where(models.Vote.vote_period == period).group_by(models.Vote.quote_id)
+
+
+def top_quotes(db, period: str, top_n: int) -> list[tuple[int, int, int]]:
+    """(rank, quote_id, votes) of the ``top_n`` most voted quotes of ``period``.
+
+    The per-quote counts are streamed from one GROUP BY and only the best
+    ``top_n`` are kept in a min-heap, whatever the number of voted quotes.
+    Ties go to the older quote (lower id).
+    """
+    counts = db.execute(vote_counts_statement(period).execution_options(yield_per=5000))
+    heap: list[tuple[int, int]] = []
+    for quote_id, votes in counts:
+        item = (votes, -quote_id)
+        if len(heap) < top_n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    ranked = sorted(heap, reverse=True)
+    return [(rank, -neg_id, votes) for rank, (votes, neg_id) in enumerate(ranked, start=1)]
+
+
+def _lock_period(db, period: str) -> None:
+    # serialize builders of the same period until the transaction ends
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext("monthly_rankings:" + period))))
+
+
+def _is_finalized(db, period: str) -> bool:
+    MR = models.MonthlyRanking
+    return db.execute(select(exists().where(MR.period == period, MR.is_finalized))).scalar()
+
+
+def _write_snapshot(db, period: str, top_n: int) -> int:
+    MR = models.MonthlyRanking
+    entries = top_quotes(db, period, top_n)
+    if entries:
+        stmt = pg_insert(MR).values(
+            [{"period": period, "quote_id": quote_id, "rank": rank, "vote_count": votes} for rank, quote_id, votes in entries]
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="monthly_rankings_unique",
+                set_={"rank": stmt.excluded.rank, "vote_count": stmt.excluded.vote_count},
+                where=not_(MR.is_finalized),
+            )
+        )
+    # quotes that dropped out of the top since the previous build
+    db.execute(
+        delete(MR).where(
+            MR.period == period,
+            MR.quote_id.not_in([quote_id for _, quote_id, _ in entries]),
+            not_(MR.is_finalized),
+        )
+    )
+    return len(entries)
+
+
+def build_ranking(db, period: str, top_n: int | None = None) -> int:
+    """Upsert the current top list of ``period``; returns its length."""
+    _lock_period(db, period)
+    if _is_finalized(db, period):
+        raise PeriodFinalized(period)
+    count = _write_snapshot(db, period, top_n or settings.RANKING_TOP_N)
+    db.commit()
+    return count
+
+
+def finalize_ranking(db, period: str, top_n: int | None = None) -> int:
+    """Build ``period`` one last time and freeze it, in a single transaction."""
+    _lock_period(db, period)
+    if _is_finalized(db, period):
+        raise PeriodFinalized(period)
+    count = _write_snapshot(db, period, top_n or settings.RANKING_TOP_N)
+    db.execute(
+        update(models.MonthlyRanking)
+        .where(models.MonthlyRanking.period == period)
+        .values(is_finalized=True)
+    )
+    db.commit()
+    return count
+
+
+def finalized_statement(period: str):
+    MR = models.MonthlyRanking
+    return (
+        select(MR.rank, MR.vote_count, models.Quote.id.label("quote_id"), models.Quote.quote, models.Quote.child_name)
+        .join(models.Quote, models.Quote.id == MR.quote_id)
+        .where(MR.period == period, MR.is_finalized)
+        .order_by(MR.rank)
+    )
+
+
+def finalized_entries(db, period: str):
+    return db.execute(finalized_statement(period)).all()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or finalize a monthly_rankings snapshot.")
+    parser.add_argument("action", choices=["build", "finalize"])
+    parser.add_argument("period", nargs="?", help="YYYY-MM, defaults to the previous month")
+    parser.add_argument("--top", type=int, default=None, help=f"size of the top list (default {settings.RANKING_TOP_N})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    period = args.period or previous_period()
+    with SessionLocal() as db:
+        if args.action == "build":
+            count = build_ranking(db, period, args.top)
+        else:
+            count = finalize_ranking(db, period, args.top)
+    logger.info("rankings: %s %s, %d entries", args.action, period, count)
+
+
+if __name__ == "__main__":
+    main()
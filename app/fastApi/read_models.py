@@ -0,0 +1,24 @@
+# Column-projected reads for the list and detail endpoints.
+#
+# Each statement selects exactly the columns of its response schema and
+# returns plain rows: no ORM entity, no identity map, and nothing decoded
+# or sent over the wire that the response drops anyway.
+
+from sqlalchemy import select
+
+from app.fastApi import models
+
+
+# schemas.QuoteRead
+QUOTE_READ = (models.Quote.id, models.Quote.quote, models.Quote.child_name)
+# schemas.UserRead
+USER_READ = (models.User.id, models.User.display_name, models.User.email)
+
+
+def quote_statement(quote_id: int):
+    return select(*QUOTE_READ).where(models.Quote.id == quote_id)
+
+
+def users_statement(limit: int | None = None):
+    stmt = select(*USER_READ).order_by(models.User.id)
+    return stmt if limit is None else stmt.limit(limit)
@@ -1,6 +1,10 @@
 from .user import UserBase, UserCreate, UserUpdate, UserRead
-from .quote import QuoteBase, QuoteCreate, QuoteUpdate, QuoteRead, QuoteWithVoteRead
-from .vote import VoteBase, VoteCreate, VoteUpdate, VoteRead
+from .quote import QuoteBase, QuoteCreate, QuoteUpdate, QuoteRead, QuoteWithVoteRead, QuotePage
+from .vote import VoteBase, VoteCreate, VoteUpdate, VoteRead, VoteQueued
+from .ranking import RankingEntryRead, RankingRead
+from .analytics import AnalyticsEventCreate, AnalyticsEventsAccepted
+from .data_export import DataExportStatus
+from .moderation import ModerationStats
 
 __all__ = [
     "UserBase",
@@ -12,8 +16,16 @@ __all__ = [
     "QuoteUpdate",
     "QuoteRead",
     "QuoteWithVoteRead",
+    "QuotePage",
     "VoteBase",
     "VoteCreate",
     "VoteUpdate",
     "VoteRead",
+    "VoteQueued",
+    "RankingEntryRead",
+    "RankingRead",
+    "AnalyticsEventCreate",
+    "AnalyticsEventsAccepted",
+    "DataExportStatus",
+    "ModerationStats",
 ]
@@ -0,0 +1,15 @@
+from typing import Any
+
+from pydantic import BaseModel, Field
+
+
+class AnalyticsEventCreate(BaseModel):
+    event_name: str = Field(min_length=1, max_length=100)
+    user_id: int | None = None
+    device_id: str | None = None
+    quote_id: int | None = None
+    properties: dict[str, Any] | None = None
+
+
+class AnalyticsEventsAccepted(BaseModel):
+    accepted: int
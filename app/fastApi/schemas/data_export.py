@@ -0,0 +1,11 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class DataExportStatus(BaseModel):
+    status: Literal["queued", "running", "done", "failed", "expired"]   # expired: archive deleted after retention
+    requested_at: str | None = None
+    section: str | None = None      # table being written
+    rows: int = 0                   # rows written so far
+    finished_at: str | None = None
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+
+
+class ModerationStats(BaseModel):
+    workers: int                            # moderation processes that reported within the window
+    window_seconds: float
+    quotes: int
+    requests: int
+    deferred: int                           # quotes left pending by failed requests
+    quotes_per_minute: float
+    prompt_tokens: int
+    completion_tokens: int
+    tokens_per_quote: float | None = None
+    cost_usd: float
+    cost_per_quote_usd: float | None = None
+    cost_per_hour_usd: float
+    lag_seconds_avg: float | None = None    # from submission to verdict
+    lag_seconds_max: float
+    decisions: dict[str, int]
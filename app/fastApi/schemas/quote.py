@@ -22,3 +22,8 @@ class QuoteRead(QuoteBase):
 
 class QuoteWithVoteRead(QuoteRead):
     user_has_voted: bool
+
+
+class QuotePage(BaseModel):
+    items: list[QuoteWithVoteRead]
+    next_cursor: str | None = None
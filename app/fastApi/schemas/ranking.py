@@ -0,0 +1,14 @@
+from pydantic import BaseModel
+
+
+class RankingEntryRead(BaseModel):
+    rank: int
+    vote_count: int
+    quote_id: int
+    quote: str | None
+    child_name: str | None
+
+
+class RankingRead(BaseModel):
+    period: str
+    entries: list[RankingEntryRead]
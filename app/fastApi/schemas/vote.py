@@ -5,7 +5,6 @@ class VoteBase(BaseModel):
     quote_id: int
     user_id: int | None = None
     device_id: str | None = None
-    vote_period: str
 
     @model_validator(mode="after")
     def user_or_device(self):
@@ -27,4 +26,9 @@ class VoteRead(VoteBase):
     quote_id: int
     user_id: int | None
     device_id: str | None
+    vote_period: str        # 'YYYY-MM' of the vote, set by the server
+
+
+class VoteQueued(VoteBase):
     vote_period: str
+    queued: bool = True
@@ -0,0 +1,289 @@
+# Incremental trending_score / bayesian_score engine.
+#
+#   python -m app.fastApi.scoring            # fold in the votes since the last run
+#   python -m app.fastApi.scoring --rebuild  # recompute every quote (backfill)
+#
+# trending_score is a time-decayed vote count kept in log2 space:
+#     trending = log2(sum(2 ** ((t_vote - EPOCH) / half_life)))
+# Ordering by it is the same as ordering by sum(2 ** -((now - t_vote) / half_life))
+# at any instant, but a vote never has to be re-decayed: a new vote is folded
+# in with a log-add, and quotes nobody voted for keep their value untouched.
+#
+# bayesian_score is the posterior mean of a quote's daily vote rate, with a
+# Gamma prior centred on the global rate and worth SCORING_PRIOR_WEIGHT_DAYS:
+#     bayesian = (prior_weight * prior_rate + votes) / (prior_weight + age_days)
+# It falls as the quote ages, so once the new votes are folded in, every pass
+# also re-ages the bayesian_score of all the quotes still in the feed window,
+# with or without new votes (one UPDATE per pass, not per batch of votes).
+
+import argparse
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, Float, Numeric, cast, column, func, literal, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.fastApi import models
+from .config import settings
+from .database import SessionLocal
+from .feed import FEED_WINDOW
+
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SCORE_STEP = Decimal("0.0001")    # quotes.*_score are NUMERIC(12, 4)
+WRITE_CHUNK = 1000
+
+LAST_VOTE_KEY = "scoring.last_vote_id"
+PRIOR_RATE_KEY = "scoring.prior_rate"
+
+
+def vote_weight(created_at: datetime) -> float:
+    """log2 weight of one vote, in half-lives since EPOCH."""
+    return (created_at - EPOCH).total_seconds() / (settings.SCORING_HALF_LIFE_HOURS * 3600)
+
+
+def log2_add(a: float | None, b: float) -> float:
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def bayesian_rate(votes: int, age_days: float, prior_rate: float) -> float:
+    weight = settings.SCORING_PRIOR_WEIGHT_DAYS
+    return (weight * prior_rate + votes) / (weight + max(age_days, 0.0))
+
+
+def _score(value: float) -> Decimal:
+    return Decimal(value).quantize(SCORE_STEP)
+
+
+def _get_state(db, key: str, default: str) -> str:
+    value = db.execute(select(models.AppConfig.value).where(models.AppConfig.key == key)).scalar()
+    return default if value is None else value
+
+
+def _set_state(db, key: str, value) -> None:
+    stmt = pg_insert(models.AppConfig).values(key=key, value=str(value), description="scoring engine state")
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[models.AppConfig.key],
+            set_={"value": stmt.excluded.value, "updated_at": func.now()},
+        )
+    )
+
+
+def write_scores(db, changed: list[tuple]) -> None:
+    """Bulk UPDATE ... FROM (VALUES ...) of (id, trending, bayesian[, vote_count]) rows."""
+    with_counts = bool(changed) and len(changed[0]) == 4
+    columns = [column("id", BigInteger), column("trending", Numeric(12, 4)), column("bayesian", Numeric(12, 4))]
+    if with_counts:
+        columns.append(column("vote_count", BigInteger))
+    for start in range(0, len(changed), WRITE_CHUNK):
+        scores = values(*columns, name="s").data(changed[start:start + WRITE_CHUNK])
+        new_values = {"trending_score": scores.c.trending, "bayesian_score": scores.c.bayesian}
+        if with_counts:
+            new_values["vote_count"] = scores.c.vote_count
+        db.execute(update(models.Quote).where(models.Quote.id == scores.c.id).values(**new_values))
+
+
+def run_incremental(db, now: datetime | None = None) -> int:
+    """Fold the votes recorded since the last pass into the scores.
+
+    Votes younger than SCORING_LAG_SECONDS are left for the next pass, and
+    the pass stops at the first of them, so a slow transaction that commits
+    a lower vote id late is not skipped. Returns the number of votes folded in.
+    """
+    now = now or datetime.now(timezone.utc)
+    settled_before = now - timedelta(seconds=settings.SCORING_LAG_SECONDS)
+    last_vote_id = int(_get_state(db, LAST_VOTE_KEY, "0"))
+    prior_rate = float(_get_state(db, PRIOR_RATE_KEY, "0"))
+
+    rows = db.execute(
+        select(models.Vote.id, models.Vote.quote_id, models.Vote.created_at)
+        .where(models.Vote.id > last_vote_id)
+        .order_by(models.Vote.id)
+        .limit(settings.SCORING_BATCH_SIZE)
+    ).all()
+    settled = []
+    for row in rows:
+        if row.created_at >= settled_before:
+            break
+        settled.append(row)
+
+    if not settled:
+        return 0
+
+    new_weight: dict[int, float] = {}
+    for row in settled:
+        new_weight[row.quote_id] = log2_add(new_weight.get(row.quote_id), vote_weight(row.created_at))
+
+    quote_ids = list(new_weight)
+    counts = dict(
+        db.execute(
+            select(models.Vote.quote_id, func.count())
+            .where(models.Vote.quote_id.in_(quote_ids))
+            .group_by(models.Vote.quote_id)
+        ).all()
+    )
+    quotes = db.execute(
+        select(
+            models.Quote.id,
+            models.Quote.trending_score,
+            models.Quote.bayesian_score,
+            func.coalesce(models.Quote.published_at, models.Quote.created_at).label("since"),
+        ).where(models.Quote.id.in_(quote_ids))
+    ).all()
+
+    changed = []
+    for quote in quotes:
+        # 0 is the "no vote yet" value, any real vote weighs more than that
+        current = float(quote.trending_score) if quote.trending_score > 0 else None
+        trending = _score(log2_add(current, new_weight[quote.id]))
+        age_days = (now - quote.since).total_seconds() / 86400
+        bayesian = _score(bayesian_rate(counts.get(quote.id, 0), age_days, prior_rate))
+        if (trending, bayesian) != (quote.trending_score, quote.bayesian_score):
+            changed.append((quote.id, trending, bayesian))
+
+    write_scores(db, changed)
+    _set_state(db, LAST_VOTE_KEY, settled[-1].id)
+    db.commit()
+    logger.info("scoring: %d votes folded in, %d quotes updated", len(settled), len(changed))
+    return len(settled)
+
+
+def run_pass(db, now: datetime | None = None) -> int:
+    """Fold in every settled vote, batch by batch, then re-age the feed window once.
+
+    Returns the number of votes folded in.
+    """
+    now = now or datetime.now(timezone.utc)
+    folded = 0
+    while True:
+        batch = run_incremental(db, now)
+        folded += batch
+        if batch < settings.SCORING_BATCH_SIZE:
+            break
+    # every quote of the feed ages, voted for or not: once per pass, not per batch
+    aged = refresh_window(db, now, float(_get_state(db, PRIOR_RATE_KEY, "0")))
+    db.commit()
+    logger.info("scoring: %d bayesian scores re-aged", aged)
+    return folded
+
+
+def refresh_window(db, now: datetime, prior_rate: float) -> int:
+    """Recompute bayesian_score from vote_count for every quote still in the feed.
+
+    The score divides by the quote's age, so it keeps falling without new
+    votes; run_incremental only sees the quotes that got some. Run once
+    per pass by run_pass(). One UPDATE
+    over the feed window, leaving the rows whose rounded score did not move.
+    Returns the number of quotes updated.
+    """
+    Q = models.Quote
+    weight = settings.SCORING_PRIOR_WEIGHT_DAYS
+    age_days = func.greatest(func.extract("epoch", literal(now) - func.coalesce(Q.published_at, Q.created_at)) / 86400, 0)
+    bayesian = func.round(cast((weight * prior_rate + Q.vote_count) / (weight + age_days), Numeric), 4)
+    result = db.execute(
+        update(Q)
+        .where(Q.created_at >= now - FEED_WINDOW, Q.bayesian_score.is_distinct_from(bayesian))
+        .values(bayesian_score=bayesian)
+    )
+    return result.rowcount
+
+
+def rebuild(db, now: datetime | None = None) -> int:
+    """Recompute vote_count and both scores for every quote from ``votes``.
+
+    Also refreshes the global prior. Only rows whose values differ are
+    written. Returns the number of quotes updated.
+    """
+    now = now or datetime.now(timezone.utc)
+    max_vote_id = db.execute(select(func.max(models.Vote.id))).scalar() or 0
+    since = func.coalesce(models.Quote.published_at, models.Quote.created_at)
+    age_days = func.extract("epoch", literal(now) - since) / 86400
+
+    total_votes = db.execute(select(func.count()).where(models.Vote.id <= max_vote_id)).scalar()
+    total_days = db.execute(select(func.sum(func.greatest(age_days, 0)))).scalar() or 0
+    prior_rate = float(total_votes) / float(total_days) if total_days else 0.0
+
+    # per-quote log2-sum-exp2 of the vote weights, shifted by the max weight
+    # so that power() stays in range; 2 ** -60 is below the score resolution
+    half_life = settings.SCORING_HALF_LIFE_HOURS * 3600
+    weights = (
+        select(
+            models.Vote.quote_id,
+            (func.extract("epoch", models.Vote.created_at - literal(EPOCH)) / half_life).label("w"),
+        )
+        .where(models.Vote.id <= max_vote_id)
+        .subquery()
+    )
+    peaks = select(
+        weights.c.quote_id,
+        weights.c.w,
+        func.max(weights.c.w).over(partition_by=weights.c.quote_id).label("peak"),
+    ).subquery()
+    shifted = func.greatest(peaks.c.w - peaks.c.peak, -60)
+    aggregates = (
+        select(
+            peaks.c.quote_id,
+            func.count().label("votes"),
+            (peaks.c.peak + func.ln(func.sum(func.power(2.0, shifted))) / math.log(2)).cast(Float).label("trending"),
+        )
+        .group_by(peaks.c.quote_id, peaks.c.peak)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            models.Quote.id,
+            models.Quote.vote_count,
+            models.Quote.trending_score,
+            models.Quote.bayesian_score,
+            age_days.cast(Float).label("age_days"),
+            func.coalesce(aggregates.c.votes, 0).label("votes"),
+            aggregates.c.trending,
+        )
+        .outerjoin(aggregates, aggregates.c.quote_id == models.Quote.id)
+        .execution_options(yield_per=WRITE_CHUNK)
+    )
+
+    updated = 0
+    changed = []
+    for row in rows:
+        trending = _score(row.trending) if row.trending is not None else Decimal(0)
+        bayesian = _score(bayesian_rate(row.votes, row.age_days, prior_rate))
+        if (row.votes, trending, bayesian) != (row.vote_count, row.trending_score, row.bayesian_score):
+            changed.append((row.id, trending, bayesian, row.votes))
+        if len(changed) >= WRITE_CHUNK:
+            write_scores(db, changed)
+            updated += len(changed)
+            changed = []
+    write_scores(db, changed)
+    updated += len(changed)
+
+    _set_state(db, LAST_VOTE_KEY, max_vote_id)
+    _set_state(db, PRIOR_RATE_KEY, repr(prior_rate))
+    db.commit()
+    logger.info("scoring: rebuilt, %d quotes updated, prior rate %.4f votes/day", updated, prior_rate)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Update quotes.trending_score and quotes.bayesian_score.")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every quote instead of the new votes only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    with SessionLocal() as db:
+        if args.rebuild:
+            rebuild(db)
+        else:
+            run_pass(db)
+
+
+if __name__ == "__main__":
+    main()
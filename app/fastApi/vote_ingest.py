@@ -0,0 +1,240 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import NamedTuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import BigInteger, Integer, Text, cast, column, exists, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.fastApi import milestones, models, schemas
+from .config import settings
+from .database import SessionLocal, is_transient_error
+from .feed_cache import feed_cache
+from .leaderboard import current_period, leaderboard
+from .voted_sets import viewer_key, voted_sets
+
+
+logger = logging.getLogger(__name__)
+
+# backoff while the database is unavailable; a few attempts more on shutdown
+RETRY_MIN_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30.0
+SHUTDOWN_RETRIES = 3
+
+
+class PendingVote(NamedTuple):
+    quote_id: int
+    user_id: int | None
+    device_id: str | None
+    vote_period: str
+
+
+def insert_votes(db, votes: list[PendingVote]):
+    """Insert ``votes`` with one multi-row statement and bump quotes.vote_count.
+
+    Duplicates are skipped: within a period by ON CONFLICT DO NOTHING, across
+    periods by no_earlier_vote().
+    Milestones crossed by the new counts are notified in the same transaction.
+    Rows pointing at a quote, user or device that no longer exists are
+    filtered out rather than failing the whole batch. Returns the inserted
+    rows; the caller owns the transaction.
+    """
+    rows = values(
+        column("quote_id", BigInteger),
+        column("user_id", BigInteger),
+        column("device_id", Text),
+        column("vote_period", Text),
+        name="v",
+    ).data(votes)
+    source = select(
+        cast(rows.c.quote_id, BigInteger),
+        cast(rows.c.user_id, BigInteger),
+        cast(rows.c.device_id, Text),
+        cast(rows.c.vote_period, Text),
+    ).where(
+        exists().where(models.Quote.id == rows.c.quote_id),
+        or_(rows.c.user_id.is_(None), exists().where(models.User.id == rows.c.user_id)),
+        or_(rows.c.device_id.is_(None), exists().where(models.Device.id == rows.c.device_id)),
+        milestones.no_earlier_vote(rows.c.quote_id, rows.c.user_id, rows.c.device_id, rows.c.vote_period),
+    )
+    stmt = (
+        pg_insert(models.Vote)
+        .from_select(["quote_id", "user_id", "device_id", "vote_period"], source)
+        .on_conflict_do_nothing()
+        .returning(models.Vote.quote_id, models.Vote.user_id, models.Vote.device_id, models.Vote.vote_period)
+    )
+    inserted = db.execute(stmt).all()
+
+    counts = Counter(row.quote_id for row in inserted)
+    if counts:
+        increments = values(column("id", BigInteger), column("n", Integer), name="inc").data(sorted(counts.items()))
+        bumped = db.execute(
+            update(models.Quote)
+            .where(models.Quote.id == increments.c.id)
+            .values(vote_count=models.Quote.vote_count + increments.c.n)
+            .returning(models.Quote.id, models.Quote.vote_count)
+        ).all()
+        milestones.notify_crossed(db, [(quote_id, vote_count, counts[quote_id]) for quote_id, vote_count in bumped])
+    return inserted
+
+
+class VoteWriteBehind:
+    """In-process vote queue flushed in batches by a background thread.
+
+    A batch is written when it reaches ``batch_size`` votes or when its
+    oldest vote has waited ``flush_interval`` seconds. The queue is drained
+    on shutdown, but votes still buffered when the process dies are lost.
+    While the database is unavailable the batch is kept and retried with a
+    backoff; a vote that fails on its own is logged and dropped.
+    ``listeners`` are called with the inserted rows after each commit.
+    """
+
+    def __init__(self, session_factory, batch_size: int, flush_interval: float, max_pending: int):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.listeners: list = []
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def enqueue(self, vote: PendingVote) -> bool:
+        try:
+            self._queue.put_nowait(vote)
+        except queue.Full:
+            return False
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vote-write-behind", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        retry: list[PendingVote] = []
+        delay = 0.0
+        while not self._stop.is_set():
+            batch = retry or self._take()
+            if not batch:
+                continue
+            retry = self._flush_safely(batch)
+            if retry:
+                delay = min(max(2 * delay, RETRY_MIN_SECONDS), RETRY_MAX_SECONDS)
+                logger.warning("database unavailable, %d votes kept for a retry in %.1fs", len(retry), delay)
+                self._stop.wait(delay)
+            else:
+                delay = 0.0
+        # shutdown: drain the queue, with a few more attempts if the database is down
+        attempts = 0
+        while batch := retry or self._take(block=False):
+            retry = self._flush_safely(batch)
+            if retry:
+                attempts += 1
+                if attempts > SHUTDOWN_RETRIES:
+                    logger.error("database unavailable at shutdown, %d votes lost", len(retry) + self.pending())
+                    return
+                time.sleep(RETRY_MIN_SECONDS * attempts)
+
+    def _flush_safely(self, batch: list[PendingVote]) -> list[PendingVote]:
+        # the writer thread must outlive any error: a dead thread loses every vote queued after it
+        try:
+            return self.flush(batch)
+        except Exception:
+            logger.exception("vote batch of %d could not be written, dropped", len(batch))
+            return []
+
+    def _take(self, block: bool = True) -> list[PendingVote]:
+        batch: list[PendingVote] = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_interval) if block else self._queue.get_nowait())
+        except queue.Empty:
+            return batch
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if block and remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self, batch: list[PendingVote]) -> list[PendingVote]:
+        """Write ``batch``; returns the votes to retry because the database was unavailable.
+
+        A batch that fails for another reason is written row by row, and only
+        the votes that fail on their own are dropped.
+        """
+        retry: list[PendingVote] = []
+        with self.session_factory() as db:
+            try:
+                inserted = insert_votes(db, batch)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                if is_transient_error(exc):
+                    return batch
+                logger.warning("vote batch of %d failed (%r), retrying row by row", len(batch), exc)
+                inserted, retry = self._flush_one_by_one(db, batch)
+        if inserted:
+            for listener in self.listeners:
+                try:
+                    listener(inserted)
+                except Exception:
+                    logger.exception("vote flush listener failed")
+        return retry
+
+    def _flush_one_by_one(self, db, batch: list[PendingVote]) -> tuple[list, list[PendingVote]]:
+        inserted = []
+        for i, vote in enumerate(batch):
+            try:
+                inserted.extend(insert_votes(db, [vote]))
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                if is_transient_error(exc):
+                    return inserted, batch[i:]
+                logger.exception("dropping vote %r", vote)
+        return inserted, []
+
+
+def mark_voted(inserted) -> None:
+    """Vote flush listener: only stored votes show in the viewers' voted sets."""
+    for row in inserted:
+        voted_sets.add(viewer_key(row.user_id, row.device_id), row.quote_id)
+
+
+vote_writer = (
+    VoteWriteBehind(
+        SessionLocal,
+        batch_size=settings.VOTE_BATCH_SIZE,
+        flush_interval=settings.VOTE_FLUSH_INTERVAL_SECONDS,
+        max_pending=settings.VOTE_QUEUE_MAX,
+    )
+    if settings.VOTE_INGEST_MODE == "write_behind"
+    else None
+)
+if vote_writer is not None:
+    vote_writer.listeners.append(lambda inserted: feed_cache.invalidate("vote_count"))
+    vote_writer.listeners.append(leaderboard.record_inserted)
+    vote_writer.listeners.append(mark_voted)
+
+
+def accept(vote: schemas.VoteCreate) -> JSONResponse:
+    """Queue ``vote`` for the next batch and answer 202 right away."""
+    pending = PendingVote(vote.quote_id, vote.user_id, vote.device_id, current_period())
+    if not vote_writer.enqueue(pending):
+        raise HTTPException(status_code=503, detail="Vote queue is full, retry later")
+    return JSONResponse(status_code=202, content=schemas.VoteQueued(**pending._asdict()).model_dump())
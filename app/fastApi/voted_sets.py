@@ -0,0 +1,178 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from app.fastApi import models
+from .config import settings
+from .feed import FEED_WINDOW
+from .leaderboard import current_period
+
+
+# rough per-entry overhead (array header, key tuple, dict slot)
+_ENTRY_OVERHEAD = 200
+
+
+class VotedSet:
+    """Sorted array of the quote ids a viewer voted for (8 bytes per vote)."""
+
+    __slots__ = ("_ids",)
+
+    def __init__(self, quote_ids=()):
+        self._ids = array("q", sorted(set(quote_ids)))
+
+    def __contains__(self, quote_id: int) -> bool:
+        i = bisect_left(self._ids, quote_id)
+        return i < len(self._ids) and self._ids[i] == quote_id
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, quote_id: int) -> bool:
+        if quote_id in self:
+            return False
+        insort(self._ids, quote_id)
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return self._ids.itemsize * len(self._ids) + _ENTRY_OVERHEAD
+
+
+EMPTY = VotedSet()
+
+
+def viewer_key(user_id: int | None, device_id: str | None) -> tuple | None:
+    if user_id is not None:
+        return ("user", user_id)
+    if device_id is not None:
+        return ("device", device_id)
+    return None
+
+
+def load_statement(key: tuple, now: datetime | None = None):
+    """Votes of a viewer on quotes that can still be in the feed.
+
+    A quote leaves the feed FEED_WINDOW after its creation, so its votes
+    carry that month or a later one: the period predicate lets the planner
+    skip every older votes partition.
+    """
+    kind, viewer = key
+    column = models.Vote.user_id if kind == "user" else models.Vote.device_id
+    oldest_period = current_period((now or datetime.now(timezone.utc)) - FEED_WINDOW)
+    return select(models.Vote.quote_id).where(column == viewer, models.Vote.vote_period >= oldest_period)
+
+
+class VotedSetIndex:
+    """Per-viewer voted sets, loaded lazily, LRU-evicted under a byte budget.
+
+    Sets are updated in place when this process records a vote. The TTL
+    bounds how long votes recorded by other workers can go unseen. Votes
+    recorded while a set is being loaded are kept aside and merged in once
+    the load finishes, so a concurrent load cannot drop them.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._loading: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> VotedSet | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, voted = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return voted
+
+    def get_or_load(self, key: tuple | None, fetch) -> VotedSet:
+        """Return the viewer's set, calling ``fetch()`` for its quote ids on a miss."""
+        if key is None:
+            return EMPTY
+        voted = self.get(key)
+        if voted is not None:
+            return voted
+        self._begin_load(key)
+        try:
+            quote_ids = fetch()
+        except BaseException:
+            self._end_load(key, None)
+            raise
+        return self._end_load(key, quote_ids)
+
+    async def aget_or_load(self, key: tuple | None, fetch) -> VotedSet:
+        """``get_or_load`` for the async stack, ``fetch`` is a coroutine function."""
+        if key is None:
+            return EMPTY
+        voted = self.get(key)
+        if voted is not None:
+            return voted
+        self._begin_load(key)
+        try:
+            quote_ids = await fetch()
+        except BaseException:
+            self._end_load(key, None)
+            raise
+        return self._end_load(key, quote_ids)
+
+    def add(self, key: tuple | None, quote_id: int) -> None:
+        if key is None:
+            return
+        with self._lock:
+            loading = self._loading.get(key)
+            if loading is not None:
+                loading[1].append(quote_id)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1].add(quote_id):
+                self._bytes += array("q").itemsize
+                self._evict()
+
+    def evict(self, key: tuple | None) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+
+    def _begin_load(self, key: tuple) -> None:
+        with self._lock:
+            self._loading.setdefault(key, [0, []])[0] += 1
+
+    def _end_load(self, key: tuple, quote_ids) -> VotedSet | None:
+        with self._lock:
+            loading = self._loading[key]
+            loading[0] -= 1
+            if loading[0] == 0:
+                del self._loading[key]
+            if quote_ids is None:
+                return None
+            voted = VotedSet(quote_ids)
+            for quote_id in loading[1]:
+                voted.add(quote_id)
+            if key in self._entries:
+                self._drop(key)
+            if voted.nbytes <= self.max_bytes:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, voted)
+                self._bytes += voted.nbytes
+                self._evict()
+            return voted
+
+    def _drop(self, key: tuple) -> None:
+        _, voted = self._entries.pop(key)
+        self._bytes -= voted.nbytes
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+
+
+voted_sets = VotedSetIndex(settings.VOTED_SETS_MAX_BYTES, settings.VOTED_SETS_TTL_SECONDS)
@@ -0,0 +1,85 @@
+# Shared helpers of the benchmark scripts: latency statistics, run metadata,
+# result files and sample ids picked from the seeded database.
+
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app.fastApi.config import settings
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linear-interpolated percentile (0 <= q <= 100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    values = sorted(samples_ms)
+    return {
+        "n": len(values),
+        "min_ms": round(values[0], 3) if values else 0.0,
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(**extra) -> dict:
+    """What a run has to record to be compared with another one."""
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": {
+            key: getattr(settings, key)
+            for key in ("DB_ASYNC", "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "FEED_CACHE_TTL_SECONDS", "VOTE_INGEST_MODE")
+        },
+        **extra,
+    }
+
+
+def save(kind: str, payload: dict, path: str | None = None) -> str:
+    """Write a run to ``path``, by default benchmarks/results/<kind>-<timestamp>.json."""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        path = os.path.join(RESULTS_DIR, f"{kind}-{stamp}.json")
+    with open(path, "w") as file:
+        json.dump({"kind": kind, **payload}, file, indent=2, default=str)
+    return path
+
+
+def sample_ids(conn, table: str, column: str = "id", count: int = 1000, where: str = "TRUE") -> list:
+    """Up to ``count`` values of ``column``, read from a ~1% block sample of ``table``."""
+    values = conn.execute(
+        text(f"SELECT {column} FROM {table} TABLESAMPLE SYSTEM (1) WHERE {where} LIMIT :count"), {"count": count}
+    ).scalars().all()
+    if not values:
+        # small tables: the block sample can come back empty
+        values = conn.execute(text(f"SELECT {column} FROM {table} WHERE {where} LIMIT :count"), {"count": count}).scalars().all()
+    return values
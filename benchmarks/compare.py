@@ -0,0 +1,67 @@
+# Compare two benchmark result files, case by case.
+#
+#   python -m benchmarks.compare benchmarks/results/endpoints-A.json benchmarks/results/endpoints-B.json
+#
+# Prints p50/p95/p99 of both runs and the relative change; changes beyond
+# --threshold percent are flagged. Exits with 1 when a regression is flagged,
+# so it can gate a CI job.
+
+import argparse
+import json
+import sys
+
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def _cases(run: dict) -> dict:
+    results = run["results"]
+    if run["kind"] == "load":
+        return {"overall": results["overall"], **results["by_kind"]}
+    return results
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def compare(before: dict, after: dict, threshold: float) -> bool:
+    """Print the comparison; True when a case got slower by more than ``threshold`` percent."""
+    regressed = False
+    old, new = _cases(before), _cases(after)
+    print(f"{before['meta'].get('git_commit')} -> {after['meta'].get('git_commit')}")
+    print(f"{'case':30}" + "".join(f"{metric:>28}" for metric in METRICS))
+    for name in sorted(old.keys() & new.keys()):
+        cells = []
+        for metric in METRICS:
+            change = _change(old[name][metric], new[name][metric])
+            flag = " !" if change > threshold else "  "
+            regressed |= change > threshold
+            cells.append(f"{old[name][metric]:>9.2f} {new[name][metric]:>9.2f} {change:+6.1f}%{flag}")
+        print(f"{name:30}" + "".join(cells))
+    for name in sorted(old.keys() ^ new.keys()):
+        print(f"{name:30} only in {'the first' if name in old else 'the second'} run")
+    if before["kind"] == "load" and after["kind"] == "load":
+        rps = (old["overall"]["requests_per_second"], new["overall"]["requests_per_second"])
+        print(f"throughput: {rps[0]} -> {rps[1]} req/s ({_change(*rps):+.1f}%)")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="flag slowdowns above this, in percent")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    if before["kind"] != after["kind"]:
+        raise SystemExit(f"cannot compare a {before['kind']} run with a {after['kind']} run")
+    sys.exit(1 if compare(before, after, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Micro-benchmarks of the main.py handlers, through the ASGI app in-process.
+#
+#   python -m benchmarks.endpoints                      # every read case
+#   python -m benchmarks.endpoints --writes             # POST/PUT cases too
+#   python -m benchmarks.endpoints -k quotes --iterations 500
+#
+# Each case is warmed up, then timed request by request with the app's
+# lifespan running (background workers included), against the database of
+# DATABASE_URL -- seed it first with benchmarks.seed. Cases named *_cold
+# clear the feed cache before every request. Results are written as JSON
+# under benchmarks/results/; compare two runs with benchmarks.compare.
+
+import argparse
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from fastapi.testclient import TestClient
+
+from app.fastApi.database import engine
+from app.fastApi.feed_cache import feed_cache
+from app.fastApi.main import app
+from app.fastApi.rankings import previous_period
+from .common import metadata, sample_ids, save, summarize
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Case:
+    name: str
+    method: str
+    url: Callable[[random.Random], str]
+    json: Callable[[random.Random], dict] | None = None
+    setup: Callable[[], None] | None = None     # before every timed request
+    write: bool = False
+    expected: tuple[int, ...] = (200,)
+
+
+def cases(samples: dict, first_cursor: str | None) -> list[Case]:
+    quote_ids, user_ids, device_ids = samples["quotes"], samples["users"], samples["devices"]
+    counter = iter(range(1, 1 << 62))
+
+    return [
+        Case("root", "GET", lambda rng: "/"),
+        Case("users_list", "GET", lambda rng: "/users"),
+        Case("user_detail", "GET", lambda rng: f"/users/{rng.choice(user_ids)}"),
+        Case("quotes_feed", "GET", lambda rng: "/quotes?limit=20"),
+        Case("quotes_feed_cold", "GET", lambda rng: "/quotes?limit=20", setup=feed_cache.invalidate),
+        Case(
+            "quotes_feed_vote_count_cold", "GET", lambda rng: "/quotes?limit=20&sort=vote_count",
+            setup=feed_cache.invalidate,
+        ),
+        Case(
+            "quotes_feed_trending_cold", "GET", lambda rng: "/quotes?limit=20&sort=trending_score",
+            setup=feed_cache.invalidate,
+        ),
+        Case("quotes_feed_user", "GET", lambda rng: f"/quotes?limit=20&user_id={rng.choice(user_ids)}"),
+        Case("quotes_feed_device", "GET", lambda rng: f"/quotes?limit=20&device_id={rng.choice(device_ids)}"),
+        Case(
+            "quotes_feed_page_2_cold", "GET",
+            lambda rng: f"/quotes?limit=20&cursor={first_cursor}" if first_cursor else "/quotes?limit=20",
+            setup=feed_cache.invalidate,
+        ),
+        Case("quote_detail", "GET", lambda rng: f"/quotes/{rng.choice(quote_ids)}"),
+        Case("leaderboard_current", "GET", lambda rng: "/leaderboard/current"),
+        Case("ranking_previous", "GET", lambda rng: f"/rankings/{previous_period()}", expected=(200, 404)),
+        Case("metrics", "GET", lambda rng: "/metrics"),
+        Case(
+            "user_create", "POST", lambda rng: "/users",
+            json=lambda rng: {"display_name": "bench", "email": f"bench-{next(counter)}@example.test"}, write=True,
+        ),
+        Case(
+            "user_update", "PUT", lambda rng: f"/users/{rng.choice(user_ids)}",
+            json=lambda rng: {"display_name": "bench", "email": None}, write=True,
+        ),
+        Case(
+            # may collide with a seeded vote: answered 409
+            "vote_create", "POST", lambda rng: "/votes",
+            json=lambda rng: {
+                "quote_id": quote_ids[next(counter) % len(quote_ids)],
+                "device_id": rng.choice(device_ids),
+            },
+            write=True, expected=(200, 202, 409),
+        ),
+    ]
+
+
+def load_samples() -> dict:
+    with engine.connect() as conn:
+        return {
+            "quotes": sample_ids(conn, "quotes", where="status = 'approved'"),
+            "users": sample_ids(conn, "users"),
+            "devices": sample_ids(conn, "devices"),
+        }
+
+
+def run_case(client: TestClient, case: Case, rng: random.Random, warmup: int, iterations: int) -> dict:
+    samples_ms, statuses = [], {}
+    for i in range(warmup + iterations):
+        if case.setup is not None:
+            case.setup()
+        url = case.url(rng)
+        body = case.json(rng) if case.json is not None else None
+        started = time.perf_counter()
+        response = client.request(case.method, url, json=body)
+        elapsed = (time.perf_counter() - started) * 1000
+        if i >= warmup:
+            samples_ms.append(elapsed)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    unexpected = {status: n for status, n in statuses.items() if status not in case.expected}
+    if unexpected:
+        logger.warning("endpoints: %s answered %s", case.name, unexpected)
+    return {"method": case.method, **summarize(samples_ms), "statuses": statuses}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API handlers in-process.")
+    parser.add_argument("-k", dest="pattern", help="only the cases whose name contains this")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--writes", action="store_true", help="also run the cases that write to the database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="result file, default benchmarks/results/endpoints-<time>.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    samples = load_samples()
+    results = {}
+    with TestClient(app, raise_server_exceptions=False) as client:
+        first_cursor = client.get("/quotes?limit=20").json().get("next_cursor")
+        for case in cases(samples, first_cursor):
+            if (case.write and not args.writes) or (args.pattern and args.pattern not in case.name):
+                continue
+            # every case replays the same sequence of ids
+            results[case.name] = run_case(client, case, random.Random(args.seed), args.warmup, args.iterations)
+            logger.info(
+                "endpoints: %-28s p50 %8.2f ms  p95 %8.2f ms  p99 %8.2f ms",
+                case.name, results[case.name]["p50_ms"], results[case.name]["p95_ms"], results[case.name]["p99_ms"],
+            )
+
+    path = save(
+        "endpoints",
+        {"meta": metadata(iterations=args.iterations, warmup=args.warmup, seed=args.seed), "results": results},
+        args.output,
+    )
+    logger.info("endpoints: results written to %s", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# Load scenario: concurrent clients replaying a weighted mix of requests.
+#
+#   python -m benchmarks.load --url http://localhost:8000 --concurrency 64 --duration 60
+#   python -m benchmarks.load --concurrency 16        # the app in-process, no server
+#
+# Against --url it measures the real deployment (uvicorn workers, pool sizes);
+# without it the ASGI app runs in this process, lifespan included. Reports
+# p50/p95/p99 and throughput, overall and per request kind, and writes them
+# as JSON under benchmarks/results/. Votes are cast with --votes only, from
+# devices created for the run, so that every (quote, device) pair is new.
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+import httpx
+from sqlalchemy import text
+
+from app.fastApi.database import engine
+from .common import metadata, sample_ids, save, summarize
+
+
+logger = logging.getLogger(__name__)
+
+LOAD_DEVICES = 1000
+
+# (kind, weight): roughly the traffic of the app, the feed first
+MIX = (
+    ("feed", 50),
+    ("feed_next_page", 10),
+    ("quote_detail", 15),
+    ("leaderboard", 10),
+    ("user_detail", 5),
+    ("vote", 10),
+)
+
+
+class Scenario:
+    def __init__(self, samples: dict, rng: random.Random, votes: bool, run_id: str | None):
+        self.quote_ids = samples["quotes"]
+        self.user_ids = samples["users"]
+        self.device_ids = samples["devices"]
+        self.rng = rng
+        self.run_id = run_id
+        self.votes_cast = 0
+        self.cursors: list[str] = []
+        mix = [(kind, weight) for kind, weight in MIX if votes or kind != "vote"]
+        self.kinds = [kind for kind, _ in mix]
+        self.weights = [weight for _, weight in mix]
+
+    def _viewer(self) -> str:
+        if self.rng.random() < 0.3:
+            return f"&user_id={self.rng.choice(self.user_ids)}"
+        return f"&device_id={self.rng.choice(self.device_ids)}"
+
+    def next_request(self) -> tuple[str, str, str, dict | None]:
+        """(kind, method, url, json body) of the next request."""
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        if kind == "feed_next_page" and self.cursors:
+            return kind, "GET", f"/quotes?limit=20&cursor={self.rng.choice(self.cursors)}{self._viewer()}", None
+        if kind in ("feed", "feed_next_page"):
+            return "feed", "GET", f"/quotes?limit=20{self._viewer()}", None
+        if kind == "quote_detail":
+            return kind, "GET", f"/quotes/{self.rng.choice(self.quote_ids)}", None
+        if kind == "leaderboard":
+            return kind, "GET", "/leaderboard/current", None
+        if kind == "user_detail":
+            return kind, "GET", f"/users/{self.rng.choice(self.user_ids)}", None
+        index = self.votes_cast
+        self.votes_cast += 1
+        body = {
+            "quote_id": self.quote_ids[(index // LOAD_DEVICES) % len(self.quote_ids)],
+            "device_id": load_device_id(self.run_id, index % LOAD_DEVICES),
+        }
+        return kind, "POST", "/votes", body
+
+    def observe(self, kind: str, response: httpx.Response) -> None:
+        if kind == "feed" and response.status_code == 200 and len(self.cursors) < 100:
+            cursor = response.json().get("next_cursor")
+            if cursor:
+                self.cursors.append(cursor)
+
+
+def load_device_id(run_id: str, index: int) -> str:
+    return f"load-{run_id}-{index:04d}"
+
+
+def create_load_devices(run_id: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO devices (id, device_fingerprint) VALUES (:id, :id) ON CONFLICT DO NOTHING"),
+            [{"id": load_device_id(run_id, index)} for index in range(LOAD_DEVICES)],
+        )
+
+
+async def worker(client: httpx.AsyncClient, scenario: Scenario, deadline: float, samples: dict, statuses: dict) -> None:
+    while time.perf_counter() < deadline:
+        kind, method, url, body = scenario.next_request()
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=body)
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] = statuses.get(type(exc).__name__, 0) + 1
+            continue
+        samples.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        key = f"{kind}:{response.status_code}"
+        statuses[key] = statuses.get(key, 0) + 1
+        scenario.observe(kind, response)
+
+
+async def run(args) -> dict:
+    with engine.connect() as conn:
+        samples_ids = {
+            "quotes": sample_ids(conn, "quotes", where="status = 'approved'"),
+            "users": sample_ids(conn, "users"),
+            "devices": sample_ids(conn, "devices"),
+        }
+    run_id = uuid.uuid4().hex[:8] if args.votes else None
+    if run_id is not None:
+        create_load_devices(run_id)
+    scenario = Scenario(samples_ids, random.Random(args.seed), args.votes, run_id)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        lifespan = None
+    else:
+        from app.fastApi.main import app
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+        lifespan = app.router.lifespan_context(app)
+
+    samples: dict[str, list[float]] = {}
+    statuses: dict[str, int] = {}
+    async with client:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        try:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*(worker(client, scenario, deadline, {}, {}) for _ in range(args.concurrency)))
+            started = time.perf_counter()
+            deadline = started + args.duration
+            await asyncio.gather(
+                *(worker(client, scenario, deadline, samples, statuses) for _ in range(args.concurrency))
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    every = [sample for values in samples.values() for sample in values]
+    return {
+        "overall": {**summarize(every), "requests_per_second": round(len(every) / elapsed, 1)},
+        "by_kind": {
+            kind: {**summarize(values), "requests_per_second": round(len(values) / elapsed, 1)}
+            for kind, values in sorted(samples.items())
+        },
+        "statuses": statuses,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the load scenario and report latency percentiles.")
+    parser.add_argument("--url", help="base URL of a running server; default: the app in-process")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--votes", action="store_true", help="include vote writes in the mix")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="result file, default benchmarks/results/load-<time>.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    results = asyncio.run(run(args))
+    overall = results["overall"]
+    logger.info(
+        "load: %.1f req/s  p50 %.2f ms  p95 %.2f ms  p99 %.2f ms",
+        overall["requests_per_second"], overall["p50_ms"], overall["p95_ms"], overall["p99_ms"],
+    )
+    meta = metadata(
+        url=args.url, concurrency=args.concurrency, duration=args.duration, votes=args.votes, seed=args.seed
+    )
+    logger.info("load: results written to %s", save("load", {"meta": meta, "results": results}, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# Query-plan regression checks for the hot-path SQL.
+#
+#   python -m benchmarks.plans                        # check every statement
+#   python -m benchmarks.plans --save plans.json      # and keep the plans as a baseline
+#   python -m benchmarks.plans --diff plans.json      # print what changed since the baseline
+#
+# Each check builds the statement the way its handler does, runs
+# EXPLAIN (FORMAT JSON) on it against DATABASE_URL (seed it first with
+# benchmarks.seed, plans on a near-empty database mean nothing) and asserts:
+#   - one of the expected indexes is used (partition indexes count for the
+#     partitioned index they are attached to),
+#   - no sequential scan is estimated above --max-seq-scan-rows rows,
+#   - the estimated total cost stays under the check's bound,
+#   - on votes, partition pruning leaves at most max_partitions partitions.
+# Exits with 1 when a check fails, so it can gate a deploy.
+
+import argparse
+import difflib
+import json
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import select, text
+
+from app.fastApi import feed, models, pagination, read_models, rankings
+from app.fastApi.config import settings
+from app.fastApi.database import engine
+from app.fastApi.leaderboard import current_period, quote_text_statement
+from app.fastApi.voted_sets import load_statement, viewer_key
+
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_SUFFIX = re.compile(r"_y\d{4}m\d{2}")
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    statement: Callable[[dict], object]     # samples -> statement
+    indexes: tuple[str, ...] = ()           # at least one of them must be used
+    max_cost: float | None = None
+    allow_seq_scan: bool = False
+    max_partitions: int | None = None       # votes partitions left after pruning
+
+
+def checks() -> list[PlanCheck]:
+    feed_checks = [
+        PlanCheck(
+            f"feed_{sort}",
+            lambda s, sort=sort: feed.feed_statement(sort, "desc", 20),
+            # a window filter on created_at, or a walk down the sort index
+            indexes=(f"quotes_feed_{sort}", "quotes_feed_created_at"),
+            max_cost=10_000,
+        )
+        for sort in pagination.SORT_COLUMNS
+    ]
+    # votes partitions that can hold votes on quotes still in the feed
+    window_partitions = 2 + settings.PARTITIONS_MONTHS_AHEAD
+    return [
+        *feed_checks,
+        PlanCheck(
+            "feed_created_at_next_page",
+            lambda s: feed.feed_statement("created_at", "desc", 20, cursor=s["cursor"]),
+            indexes=("quotes_feed_created_at",),
+            max_cost=10_000,
+        ),
+        PlanCheck(
+            "feed_language",
+            lambda s: feed.feed_statement("created_at", "desc", 20, language="fr"),
+            indexes=("quotes_feed_created_at",),
+            max_cost=10_000,
+        ),
+        PlanCheck(
+            "voted_set_user",
+            lambda s: load_statement(viewer_key(s["user_id"], None)),
+            indexes=("votes_by_user", "votes_unique_user"),
+            max_cost=10_000,
+            max_partitions=window_partitions,
+        ),
+        PlanCheck(
+            "voted_set_device",
+            lambda s: load_statement(viewer_key(None, s["device_id"])),
+            indexes=("votes_by_device", "votes_unique_device"),
+            max_cost=10_000,
+            max_partitions=window_partitions,
+        ),
+        PlanCheck(
+            "quote_detail", lambda s: read_models.quote_statement(s["quote_id"]), indexes=("quotes_pkey",), max_cost=50
+        ),
+        PlanCheck(
+            # the ORM query of GET /users/{user_id}
+            "user_detail",
+            lambda s: select(models.User).where(models.User.id == s["user_id"]).limit(1),
+            indexes=("users_pkey",),
+            max_cost=50,
+        ),
+        PlanCheck(
+            "users_list",
+            lambda s: read_models.users_statement(settings.LIST_STREAM_THRESHOLD + 1),
+            indexes=("users_pkey",),
+            max_cost=5_000,
+        ),
+        PlanCheck(
+            "leaderboard_quote_text",
+            lambda s: quote_text_statement(s["quote_ids"]),
+            indexes=("quotes_pkey",),
+            max_cost=2_000,
+        ),
+        PlanCheck(
+            # a whole month is aggregated: a scan is expected, but of one partition
+            "leaderboard_vote_counts",
+            lambda s: rankings.vote_counts_statement(current_period()),
+            allow_seq_scan=True,
+            max_partitions=1,
+        ),
+        PlanCheck(
+            "ranking_finalized",
+            lambda s: rankings.finalized_statement(rankings.previous_period()),
+            indexes=("monthly_rankings_unique",),
+            max_cost=5_000,
+        ),
+    ]
+
+
+def load_samples(conn) -> dict:
+    """Fixed, existing values to bind, so that plans compare from run to run."""
+    quote_id = conn.execute(text("SELECT min(id) FROM quotes")).scalar() or 1
+    row = conn.execute(
+        select(models.Quote.created_at, models.Quote.id).order_by(models.Quote.created_at.desc(), models.Quote.id.desc()).limit(1)
+    ).first()
+    return {
+        "quote_id": quote_id,
+        "quote_ids": list(range(quote_id, quote_id + settings.LEADERBOARD_SIZE)),
+        "user_id": conn.execute(text("SELECT min(id) FROM users")).scalar() or 1,
+        "device_id": conn.execute(text("SELECT min(id) FROM devices")).scalar() or "",
+        "cursor": pagination.encode_cursor("created_at", "desc", row.created_at, row.id) if row else None,
+    }
+
+
+def explain(conn, statement) -> dict:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    return conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()[0]["Plan"]
+
+
+def nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from nodes(child)
+
+
+def attached_indexes(conn, names) -> dict[str, str]:
+    """index name -> the expected index it stands for, partition indexes included."""
+    resolved = {name: name for name in names}
+    rows = conn.execute(
+        text(
+            "SELECT parent.relname, child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "WHERE parent.relname = ANY(:names)"
+        ),
+        {"names": list(names)},
+    ).all()
+    resolved.update({child: parent for parent, child in rows})
+    return resolved
+
+
+def problems(check: PlanCheck, plan: dict, index_names: dict[str, str], max_seq_scan_rows: int, cost_factor: float) -> list[str]:
+    found = []
+    used = {index_names[node["Index Name"]] for node in nodes(plan) if node.get("Index Name") in index_names}
+    if check.indexes and not used & set(check.indexes):
+        found.append(f"none of {', '.join(check.indexes)} is used")
+    if not check.allow_seq_scan:
+        for node in nodes(plan):
+            if node["Node Type"] == "Seq Scan" and node["Plan Rows"] > max_seq_scan_rows:
+                found.append(f"seq scan on {node['Relation Name']} ({node['Plan Rows']} rows)")
+    if check.max_cost is not None and plan["Total Cost"] > check.max_cost * cost_factor:
+        found.append(f"estimated cost {plan['Total Cost']} > {check.max_cost * cost_factor:g}")
+    if check.max_partitions is not None:
+        scanned = {
+            node["Relation Name"] for node in nodes(plan) if node.get("Relation Name", "").startswith("votes_")
+        }
+        if len(scanned) > check.max_partitions:
+            found.append(f"{len(scanned)} votes partitions scanned, at most {check.max_partitions} expected")
+    return found
+
+
+def outline(plan: dict, depth: int = 0) -> list[str]:
+    """The shape of a plan, one line per node, without costs or literals.
+
+    Partition suffixes are masked so that plans taken in different months
+    compare equal.
+    """
+    label = plan["Node Type"]
+    if "Join Type" in plan:
+        label += f" ({plan['Join Type']})"
+    if "Index Name" in plan:
+        label += f" using {plan['Index Name']}"
+    if "Relation Name" in plan:
+        label += f" on {plan['Relation Name']}"
+    lines = ["  " * depth + _PARTITION_SUFFIX.sub("_yYYYYmMM", label)]
+    for child in plan.get("Plans", ()):
+        lines.extend(outline(child, depth + 1))
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the query plans of the hot-path statements.")
+    parser.add_argument("-k", dest="pattern", help="only the checks whose name contains this")
+    parser.add_argument("--max-seq-scan-rows", type=int, default=1000)
+    parser.add_argument("--cost-factor", type=float, default=1.0, help="scale every cost bound (bigger datasets)")
+    parser.add_argument("--save", help="write the plans to this file")
+    parser.add_argument("--diff", help="print the plan changes against this file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    selected = [check for check in checks() if not args.pattern or args.pattern in check.name]
+    plans, failed = {}, []
+    with engine.connect() as conn:
+        samples = load_samples(conn)
+        index_names = attached_indexes(conn, {name for check in selected for name in check.indexes})
+        for check in selected:
+            plan = explain(conn, check.statement(samples))
+            plans[check.name] = plan
+            found = problems(check, plan, index_names, args.max_seq_scan_rows, args.cost_factor)
+            logger.info("%s %-28s cost %10.2f", "FAIL" if found else "ok  ", check.name, plan["Total Cost"])
+            for problem in found:
+                logger.info("       %s", problem)
+            if found:
+                failed.append(check.name)
+
+    if args.diff:
+        with open(args.diff) as file:
+            baseline = json.load(file)
+        for name, plan in plans.items():
+            if name not in baseline:
+                logger.info("%s: not in the baseline", name)
+                continue
+            diff = list(
+                difflib.unified_diff(outline(baseline[name]), outline(plan), f"{name} (baseline)", name, lineterm="")
+            )
+            if diff:
+                logger.info("\n".join(diff))
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(plans, file, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
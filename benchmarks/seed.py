@@ -0,0 +1,283 @@
+# Seed a local database with benchmark volumes, through COPY.
+#
+#   python -m benchmarks.seed --reset                       # defaults below
+#   python -m benchmarks.seed --reset --quotes 100000 --votes 500000
+#
+# Rows are generated on the fly and streamed to COPY ... FROM STDIN, so
+# memory does not grow with the volumes. Tables are truncated with RESTART
+# IDENTITY first (--reset), which makes ids 1..N and lets later tables refer
+# to earlier ones without reading them back. Everything respects models.py:
+# author checks, age and length ranges, one vote per viewer and quote,
+# vote_period matching created_at. vote_count and the scores are then
+# rebuilt by the scoring engine, past months get a finalized ranking and the
+# tables are analyzed. The same --seed gives the same rows.
+#
+# Meant for a disposable local PostgreSQL: never point it at production.
+
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from app.fastApi import partitions, rankings, scoring
+from app.fastApi.config import settings
+from app.fastApi.database import SessionLocal, engine
+
+
+logger = logging.getLogger(__name__)
+
+TRUNCATED = (
+    "users", "devices", "quotes", "votes", "analytics_events", "reports", "ai_moderation_logs",
+    "monthly_rankings", "notifications", "iap_purchases", "pdf_booklets",
+)
+
+WORDS = (
+    "papa maman pourquoi le chat la lune dodo gâteau école copain dinosaure nuage mer bisou "
+    "doudou voiture pluie soleil dragon princesse bateau tracteur sorcière fourmi étoile "
+    "jamais toujours demain hier vraiment beaucoup trop petit grand gentil rigolo"
+).split()
+NAMES = ("Léa", "Hugo", "Emma", "Louis", "Jade", "Gabriel", "Chloé", "Arthur", "Inès", "Jules", "Lina", "Noah")
+EVENT_NAMES = ("quote_viewed", "quote_shared", "vote_cast", "app_opened", "feed_scrolled")
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    value = str(value)
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+class CopyStream:
+    """File-like object over generated rows, in COPY text format."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = "\t".join(map(_copy_value, row)) + "\n"
+            parts.append(line)
+            length += len(line)
+            self.count += 1
+        data = "".join(parts)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    readline = read
+
+
+def copy_rows(raw, table: str, columns: tuple[str, ...], rows) -> int:
+    started = time.perf_counter()
+    stream = CopyStream(rows)
+    with raw.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream)
+    raw.commit()
+    elapsed = time.perf_counter() - started
+    logger.info("seed: %s %d rows in %.1fs (%.0f rows/s)", table, stream.count, elapsed, stream.count / max(elapsed, 1e-9))
+    return stream.count
+
+
+def _moment(rng: random.Random, start: datetime, end: datetime) -> datetime:
+    return start + (end - start) * rng.random()
+
+
+def _skewed(rng: random.Random, count: int) -> int:
+    # id in 1..count, low ids much more popular: a few quotes get most votes
+    return int(count * rng.random() ** 3) + 1
+
+
+def users(rng, count, start, now):
+    for i in range(1, count + 1):
+        yield (
+            rng.choice(("apple", "google")),
+            f"bench-{i}",
+            f"user{i}@example.test" if rng.random() < 0.8 else None,
+            rng.choice(NAMES),
+            "fr" if rng.random() < 0.8 else "en",
+            _moment(rng, start, now),
+        )
+
+
+def device_id(index: int) -> str:
+    return f"bench-device-{index:08d}"
+
+
+def devices(rng, count, user_count, start, now):
+    for i in range(1, count + 1):
+        yield (
+            device_id(i),
+            f"bench-fingerprint-{i:08d}",
+            rng.randint(1, user_count) if user_count and rng.random() < 0.3 else None,
+            "fr" if rng.random() < 0.8 else "en",
+            rng.choice(("ios", "android")),
+            rng.choice(("1.4.0", "1.5.0", "1.5.1")),
+            _moment(rng, start, now),
+        )
+
+
+def _quote_text(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(3, 40))]
+    return (" ".join(words).capitalize() + rng.choice((" !", " ?", ".")))[:800]
+
+
+def quotes(rng, count, user_count, device_count, start, now):
+    for _ in range(count):
+        by_user = user_count and (not device_count or rng.random() < 0.4)
+        created_at = _moment(rng, start, now)
+        approved = rng.random() < 0.9
+        yield (
+            rng.randint(1, user_count) if by_user else None,
+            None if by_user else device_id(rng.randint(1, device_count)),
+            rng.choice(NAMES),
+            rng.randint(2, 10),
+            rng.randint(0, 11),
+            _quote_text(rng),
+            "fr" if rng.random() < 0.8 else "en",
+            "approved" if approved else "pending",
+            created_at + timedelta(minutes=rng.randint(1, 600)) if approved else None,
+            created_at,
+        )
+
+
+def votes(rng, target, quote_count, user_count, device_count, start, now):
+    """About ``target`` votes, each viewer voting once per quote."""
+    viewers = user_count + device_count
+    per_viewer = target / viewers
+    emitted = 0
+    for viewer in range(1, viewers + 1):
+        seen = set()
+        wanted = min(quote_count, round(rng.expovariate(1 / per_viewer)))
+        for _ in range(4 * wanted):
+            if len(seen) >= wanted:
+                break
+            created_at = _moment(rng, start, now)
+            quote_id = _skewed(rng, quote_count)
+            if quote_id in seen:
+                continue
+            seen.add(quote_id)
+            yield (
+                quote_id,
+                viewer if viewer <= user_count else None,
+                None if viewer <= user_count else device_id(viewer - user_count),
+                created_at.strftime("%Y-%m"),
+                created_at,
+            )
+            emitted += 1
+            if emitted >= target:
+                return
+
+
+def analytics_events(rng, count, quote_count, user_count, device_count, start, now):
+    for _ in range(count):
+        by_user = user_count and rng.random() < 0.3
+        name = rng.choice(EVENT_NAMES)
+        yield (
+            name,
+            rng.randint(1, user_count) if by_user else None,
+            None if by_user else device_id(rng.randint(1, device_count)),
+            _skewed(rng, quote_count) if name.startswith(("quote", "vote")) else None,
+            json.dumps({"screen": rng.choice(("feed", "detail", "leaderboard"))}),
+            _moment(rng, start, now),
+        )
+
+
+def _months(start: date, end: date) -> list[date]:
+    months = [start.replace(day=1)]
+    while months[-1] < end.replace(day=1):
+        months.append(partitions.add_months(months[-1], 1))
+    return months
+
+
+def seed(args) -> None:
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+    first_month = partitions.add_months(now.date().replace(day=1), -(args.months - 1))
+    start = datetime.combine(first_month, datetime.min.time(), tzinfo=timezone.utc)
+    # older analytics partitions would be dropped by the next maintenance run
+    events_start = max(start, now - timedelta(days=settings.ANALYTICS_RETENTION_DAYS))
+
+    with engine.connect() as conn:
+        if args.reset:
+            conn.execute(text(f"TRUNCATE {', '.join(TRUNCATED)} RESTART IDENTITY CASCADE"))
+            conn.commit()
+        elif conn.execute(text("SELECT EXISTS (SELECT 1 FROM quotes)")).scalar():
+            raise SystemExit("quotes is not empty, rerun with --reset to truncate the seeded tables")
+        for spec in partitions.PARTITIONED_TABLES.values():
+            partitions.ensure_partitions(conn, spec, args.months - 1 + settings.PARTITIONS_MONTHS_AHEAD, today=first_month)
+
+    raw = engine.raw_connection()
+    try:
+        copy_rows(
+            raw, "users", ("auth_provider", "provider_user_id", "email", "display_name", "locale", "created_at"),
+            users(rng, args.users, start, now),
+        )
+        copy_rows(
+            raw, "devices", ("id", "device_fingerprint", "user_id", "locale", "platform", "app_version", "created_at"),
+            devices(rng, args.devices, args.users, start, now),
+        )
+        copy_rows(
+            raw,
+            "quotes",
+            (
+                "user_id", "device_id", "child_name", "child_age_years", "child_age_months", "quote", "language",
+                "status", "published_at", "created_at",
+            ),
+            quotes(rng, args.quotes, args.users, args.devices, start, now),
+        )
+        copy_rows(
+            raw, "votes", ("quote_id", "user_id", "device_id", "vote_period", "created_at"),
+            votes(rng, args.votes, args.quotes, args.users, args.devices, start, now),
+        )
+        copy_rows(
+            raw, "analytics_events", ("event_name", "user_id", "device_id", "quote_id", "properties", "created_at"),
+            analytics_events(rng, args.events, args.quotes, args.users, args.devices, events_start, now),
+        )
+    finally:
+        raw.close()
+
+    with SessionLocal() as db:
+        scoring.rebuild(db, now)
+        for month in _months(first_month, now.date())[:-1]:
+            rankings.finalize_ranking(db, f"{month:%Y-%m}")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in ("users", "devices", "quotes", "votes", "analytics_events", "monthly_rankings"):
+            conn.execute(text(f"ANALYZE {table}"))
+    logger.info("seed: done")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the database with benchmark volumes (local use only).")
+    parser.add_argument("--reset", action="store_true", help="truncate the seeded tables first")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--devices", type=int, default=500_000)
+    parser.add_argument("--quotes", type=int, default=1_000_000)
+    parser.add_argument("--votes", type=int, default=5_000_000)
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--months", type=int, default=6, help="months of history, the current one included")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    seed(args)
+
+
+if __name__ == "__main__":
+    main()
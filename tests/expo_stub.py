@@ -0,0 +1,138 @@
+# Local stand-in for the Expo push service, to exercise the dispatcher.
+#
+#   python -m tests.expo_stub --port 8765 --latency 0.05 --failure-rate 0.01
+#   EXPO_PUSH_URL=http://localhost:8765/--/api/v2/push/send python -m app.fastApi.push --workers 4
+#
+# Answers like Expo: one ticket per message, in order, and a request-level
+# error above 100 messages. Tokens containing "unregistered" get a
+# DeviceNotRegistered ticket; --failure-rate answers that share of requests
+# with --failure-status (503 by default, 429 to exercise throttling).
+# Counters (requests, messages, peak concurrency) are logged on exit and
+# exposed on GET /stats.
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logger = logging.getLogger(__name__)
+
+EXPO_BATCH = 100
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.messages = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "messages": self.messages,
+                "failures": self.failures,
+                "peak_in_flight": self.peak_in_flight,
+            }
+
+
+def ticket(message: dict) -> dict:
+    if "unregistered" in str(message.get("to", "")):
+        return {
+            "status": "error",
+            "message": f"{message['to']} is not a registered push notification recipient",
+            "details": {"error": "DeviceNotRegistered"},
+        }
+    return {"status": "ok", "id": str(uuid.uuid4())}
+
+
+def make_handler(stats: Stats, latency: float, failure_rate: float, failure_status: int = 503):
+    class ExpoStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(200, stats.as_dict())
+
+        def do_POST(self):
+            messages = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+            if isinstance(messages, dict):
+                messages = [messages]
+            with stats.lock:
+                stats.requests += 1
+                stats.in_flight += 1
+                stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            try:
+                time.sleep(latency)
+                if random.random() < failure_rate:
+                    with stats.lock:
+                        stats.failures += 1
+                    code = "TOO_MANY_REQUESTS" if failure_status == 429 else "INTERNAL_SERVER_ERROR"
+                    self._reply(failure_status, {"errors": [{"code": code, "message": "stub failure"}]})
+                    return
+                if len(messages) > EXPO_BATCH:
+                    self._reply(
+                        400,
+                        {"errors": [{"code": "PUSH_TOO_MANY_NOTIFICATIONS", "message": f"more than {EXPO_BATCH} messages"}]},
+                    )
+                    return
+                with stats.lock:
+                    stats.messages += len(messages)
+                self._reply(200, {"data": [ticket(message) for message in messages]})
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    return ExpoStubHandler
+
+
+def serve(
+    port: int = 0, latency: float = 0.0, failure_rate: float = 0.0, failure_status: int = 503
+) -> tuple[ThreadingHTTPServer, Stats]:
+    """Start the stub in a background thread; port 0 picks a free one (server.server_port)."""
+    stats = Stats()
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(stats, latency, failure_rate, failure_status))
+    threading.Thread(target=server.serve_forever, name="expo-stub", daemon=True).start()
+    return server, stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local stub of the Expo push service.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--failure-status", type=int, default=503, help="status of those errors, e.g. 429")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    server, stats = serve(args.port, args.latency, args.failure_rate, args.failure_status)
+    logger.info("expo stub: http://127.0.0.1:%d/--/api/v2/push/send", server.server_port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        logger.info("expo stub: %s", stats.as_dict())
+
+
+if __name__ == "__main__":
+    main()
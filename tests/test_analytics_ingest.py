@@ -0,0 +1,94 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.fastApi import analytics_ingest
+from app.fastApi.analytics_ingest import EventBuffer
+from app.fastApi.instrumentation import analytics_events_dropped
+
+
+class NoPartition(Exception):
+    pgcode = "23514"
+
+    def __str__(self):
+        return 'no partition of relation "analytics_events" found for row'
+
+
+def no_partition_error():
+    return IntegrityError("INSERT INTO analytics_events ...", {}, NoPartition())
+
+
+class Session:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def event(name: str) -> tuple:
+    return (name, None, "device-1", None, {}, datetime.now(timezone.utc))
+
+
+def dropped(reason: str) -> float:
+    return analytics_events_dropped._values.get((reason,), 0)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """insert_events fails with "no partition" until create_missing has run."""
+    state = {"partitions": False, "written": [], "created": 0, "create_fails": False}
+
+    def insert_events(db, rows):
+        if not state["partitions"]:
+            raise no_partition_error()
+        state["written"].extend(row[0] for row in rows)
+
+    def create_missing(spec):
+        state["created"] += 1
+        if state["create_fails"]:
+            raise RuntimeError("permission denied for schema public")
+        state["partitions"] = True
+        return ["analytics_events_y2026m10"]
+
+    monkeypatch.setattr(analytics_ingest, "insert_events", insert_events)
+    monkeypatch.setattr(analytics_ingest, "create_missing", create_missing)
+    return state
+
+
+def buffer() -> EventBuffer:
+    return EventBuffer(Session, batch_size=10, flush_interval=1.0, max_events=100)
+
+
+def test_missing_partition_is_created_and_the_batch_retried(database):
+    assert buffer()._write([event("a"), event("b")])
+    assert database["created"] == 1
+    assert database["written"] == ["a", "b"]
+
+
+def test_events_without_partition_are_dropped_and_counted(database):
+    database["create_fails"] = True
+    before = dropped("no_partition")
+    events = buffer()
+    assert events._write([event("a"), event("b")])
+    # the creation is not attempted again within PARTITION_RETRY_SECONDS
+    assert events._write([event("c")])
+    assert database["created"] == 1
+    assert database["written"] == []
+    assert dropped("no_partition") - before == 3
+
+
+def test_requeue_counts_what_does_not_fit():
+    events = EventBuffer(Session, batch_size=10, flush_interval=1.0, max_events=3)
+    before = dropped("buffer_full")
+    events._events.extend([event("queued")] * 2)
+    events._requeue([event("a"), event("b")])
+    assert events.pending() == 3
+    assert dropped("buffer_full") - before == 1
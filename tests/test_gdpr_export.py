@@ -0,0 +1,44 @@
+import contextlib
+import os
+import time
+
+import pytest
+
+from app.fastApi import gdpr_export
+from app.fastApi.config import settings
+
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GDPR_EXPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def touch(path, age: float) -> None:
+    path.write_bytes(b"zip")
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+def test_purge_archives(export_dir, monkeypatch):
+    states = {1: {"status": "done", "job": "a"}, 2: {"status": "done", "job": "b"}}
+    written = []
+    monkeypatch.setattr(gdpr_export, "get_progress", lambda db, user_id: states.get(user_id))
+    monkeypatch.setattr(gdpr_export, "_set_progress", lambda user_id, state, only_if=None: written.append((user_id, state)))
+    monkeypatch.setattr(gdpr_export, "SessionLocal", contextlib.nullcontext)
+
+    retention, stale = settings.GDPR_EXPORT_RETENTION_SECONDS, settings.GDPR_EXPORT_STALE_SECONDS
+    touch(export_dir / "user-1.zip", retention + 60)            # expired
+    touch(export_dir / "user-2.zip", retention - 60)            # kept
+    touch(export_dir / "user-3.zip.0f1e.part", stale + 60)      # abandoned
+    touch(export_dir / "user-4.zip.9a8b.part", 10)              # being written
+    touch(export_dir / "notes.txt", retention + 60)             # not ours
+
+    assert gdpr_export.purge_archives() == 2
+    assert sorted(os.listdir(export_dir)) == ["notes.txt", "user-2.zip", "user-4.zip.9a8b.part"]
+    assert written == [(1, {"status": "expired", "job": "a"})]
+
+
+def test_purge_archives_without_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "GDPR_EXPORT_DIR", str(tmp_path / "missing"))
+    assert gdpr_export.purge_archives() == 0
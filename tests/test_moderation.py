@@ -0,0 +1,156 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.fastApi import moderation
+from app.fastApi.config import settings
+from app.fastApi.moderation import APPROVED, FLAGGED, REJECTED, ModerationResult, RollingStats, Verdict
+
+
+def quote(id: int, text: str = "Maman, les nuages c'est de la fumée de moutons ?"):
+    return SimpleNamespace(
+        id=id,
+        quote=text,
+        context=None,
+        child_age_years=4,
+        created_at=datetime.now(timezone.utc) - timedelta(seconds=30),
+        moderation_started_at=datetime.now(timezone.utc),
+    )
+
+
+def test_parse_verdict():
+    verdict = moderation.parse_verdict(
+        {"id": "12", "decision": "approved", "safety": 1.4, "quality": "0.7", "tags": ["humour", 3, "a", "b"], "reasoning": "ok"}
+    )
+    assert verdict == Verdict(12, APPROVED, 1.0, 0.7, ["humour", "3", "a"], None, "ok")
+
+
+@pytest.mark.parametrize(
+    "item",
+    [{}, {"id": "x", "decision": "approved"}, {"id": 1, "decision": "maybe"}, {"id": 1}],
+)
+def test_parse_verdict_unusable(item):
+    assert moderation.parse_verdict(item) is None
+
+
+def test_parse_verdict_rejection_reason():
+    assert moderation.parse_verdict({"id": 1, "decision": "rejected", "rejection_reason": "nope"}).rejection_reason == "other"
+    assert moderation.parse_verdict({"id": 1, "decision": "rejected", "rejection_reason": "too_short"}).rejection_reason == "too_short"
+    assert moderation.parse_verdict({"id": 1, "decision": "flagged", "rejection_reason": "too_short"}).rejection_reason is None
+
+
+def test_parse_verdict_strips_nul_bytes():
+    verdict = moderation.parse_verdict({"id": 1, "decision": "flagged", "tags": ["hu\x00mour", "\x00"], "reasoning": "a\x00b"})
+    assert verdict.tags == ["humour"]
+    assert verdict.reasoning == "ab"
+    assert moderation.parse_verdict({"id": 1, "decision": "flagged", "reasoning": "\x00"}).reasoning is None
+
+
+def test_outcome_rows_shares_tokens():
+    chunk = [quote(1), quote(2), quote(3)]
+    result = ModerationResult([Verdict(i, REJECTED, 0.9) for i in (1, 2, 3)], prompt_tokens=100, completion_tokens=10, model="m")
+    verdicts, logs = moderation.outcome_rows(chunk, result)
+    assert [log["prompt_tokens"] for log in logs] == [34, 33, 33]
+    assert [log["completion_tokens"] for log in logs] == [4, 3, 3]
+    assert [log["quote_id"] for log in logs] == [1, 2, 3]
+    assert [verdict.decision for verdict in verdicts] == [REJECTED] * 3
+
+
+def test_outcome_rows_flags_unsafe_approvals_and_missing_verdicts():
+    chunk = [quote(1), quote(2), quote(3), quote(4)]
+    safe, unsafe, unscored = settings.MODERATION_MIN_SAFETY, settings.MODERATION_MIN_SAFETY - 0.01, None
+    result = ModerationResult(
+        [Verdict(1, APPROVED, safe), Verdict(2, APPROVED, unsafe), Verdict(3, APPROVED, unscored)],
+        prompt_tokens=40,
+        completion_tokens=8,
+        model="m",
+    )
+    verdicts, logs = moderation.outcome_rows(chunk, result)
+    assert [verdict.decision for verdict in verdicts] == [APPROVED, FLAGGED, FLAGGED, FLAGGED]
+    assert verdicts[3].reasoning == "no verdict from the model"
+    assert [log["decision"] for log in logs] == [APPROVED, FLAGGED, FLAGGED, FLAGGED]
+
+
+def test_summarize():
+    snapshot = {
+        "seconds": 60.0,
+        "quotes": 10,
+        "requests": 2,
+        "deferred": 1,
+        "prompt_tokens": 900,
+        "completion_tokens": 100,
+        "cost_usd": 0.01,
+        "lag_seconds_total": 50.0,
+        "lag_seconds_max": 8.0,
+        "decisions": {APPROVED: 7, FLAGGED: 3},
+    }
+    summary = moderation.summarize([snapshot, {**snapshot, "seconds": 30.0, "lag_seconds_max": 12.0, "decisions": {REJECTED: 10}}])
+    assert summary["workers"] == 2
+    assert summary["quotes"] == 20
+    assert summary["quotes_per_minute"] == 20.0
+    assert summary["tokens_per_quote"] == 100.0
+    assert summary["cost_per_quote_usd"] == 0.001
+    assert summary["cost_per_hour_usd"] == 1.2
+    assert summary["lag_seconds_avg"] == 5.0
+    assert summary["lag_seconds_max"] == 12.0
+    assert summary["decisions"] == {APPROVED: 7, FLAGGED: 3, REJECTED: 10}
+
+
+def test_summarize_nothing():
+    summary = moderation.summarize([])
+    assert summary["quotes"] == 0
+    assert summary["quotes_per_minute"] == 0.0
+    assert summary["tokens_per_quote"] is None
+
+
+def test_stub_client_is_deterministic():
+    client = moderation.StubClient()
+    chunk = [quote(1), quote(2, "merde alors, c'est pas juste"), quote(3, "non")]
+    first = asyncio.run(client.moderate(chunk))
+    assert first == asyncio.run(client.moderate(chunk))
+    assert [verdict.decision for verdict in first.verdicts][1:] == [REJECTED, REJECTED]
+    assert [verdict.rejection_reason for verdict in first.verdicts][1:] == ["inappropriate_content", "too_short"]
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """moderate_batch over two leased quotes, with the database calls replaced."""
+    rows = [quote(1), quote(2)]
+    calls = {"claims": 0, "writes": []}
+
+    def claim(db, limit):
+        calls["claims"] += 1
+        return rows if calls["claims"] == 1 else []
+
+    monkeypatch.setattr(moderation, "requeue_stale", lambda db: 0)
+    monkeypatch.setattr(moderation, "claim", claim)
+    monkeypatch.setattr(moderation, "write_outcomes", lambda *args: calls["writes"].append(args))
+    return calls
+
+
+def drain(stats):
+    limiter = moderation.RateLimiter(per_minute=60_000, concurrency=2)
+    return asyncio.run(moderation.drain(moderation.StubClient(), limiter, stats))
+
+
+def test_drain_records_written_batches(batch):
+    stats = RollingStats(60)
+    assert drain(stats) == {"quotes": 2, "deferred": 0}
+    (_, leased_at, verdicts, logs, deferred, snapshot), = batch["writes"]
+    assert [verdict.quote_id for verdict in verdicts] == [1, 2] and deferred == []
+    assert snapshot["quotes"] == 2
+    assert stats.snapshot()["quotes"] == 2
+
+
+def test_drain_survives_a_failed_write(batch, monkeypatch):
+    def fail(*args):
+        raise OperationalError("UPDATE quotes", {}, Exception("server closed the connection"))
+
+    monkeypatch.setattr(moderation, "write_outcomes", fail)
+    stats = RollingStats(60)
+    assert drain(stats) == {}
+    # not counted: the quotes are moderated again once their lease expires
+    assert stats.snapshot()["quotes"] == 0
@@ -0,0 +1,136 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.fastApi import push
+from app.fastApi.config import settings
+from tests import expo_stub
+
+
+def row(id: int, token: str = "ExponentPushToken[ok]"):
+    return SimpleNamespace(id=id, push_token=token, title="title", body="body", data=None)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start the Expo stub with the given failure settings and point the dispatcher at it."""
+    servers = []
+
+    def start(**kwargs):
+        server, stats = expo_stub.serve(**kwargs)
+        servers.append(server)
+        monkeypatch.setattr(settings, "EXPO_PUSH_URL", f"http://127.0.0.1:{server.server_port}/--/api/v2/push/send")
+        return stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def send(chunk):
+    async def run():
+        async with httpx.AsyncClient(timeout=5) as client:
+            return await push.send_chunk(client, asyncio.Semaphore(1), chunk)
+
+    return asyncio.run(run())
+
+
+def test_send_chunk_success(stub):
+    stats = stub()
+    chunk = [row(1), row(2), row(3)]
+    assert send(chunk) == [(1, True, None), (2, True, None), (3, True, None)]
+    assert stats.requests == 1 and stats.messages == 3
+
+
+def test_send_chunk_device_not_registered(stub):
+    stub()
+    chunk = [row(1), row(2, "ExponentPushToken[unregistered]")]
+    result = send(chunk)
+    assert result[0] == (1, True, None)
+    id, sent, error = result[1]
+    assert (id, sent) == (2, False)
+    assert error.startswith("DeviceNotRegistered: ")
+    assert push.unregistered_tokens(chunk, result) == ["ExponentPushToken[unregistered]"]
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_send_chunk_defers_on_throttling_and_server_errors(stub, status):
+    stats = stub(failure_rate=1.0, failure_status=status)
+    assert send([row(1), row(2)]) is None
+    assert stats.failures == 1
+
+
+def test_send_chunk_defers_on_network_error(monkeypatch):
+    monkeypatch.setattr(settings, "EXPO_PUSH_URL", "http://127.0.0.1:9/--/api/v2/push/send")
+    assert send([row(1)]) is None
+
+
+def test_send_chunk_rejected_request_fails_every_row(stub):
+    stub()
+    chunk = [row(i) for i in range(expo_stub.EXPO_BATCH + 1)]
+    result = send(chunk)
+    assert len(result) == len(chunk)
+    assert all(not sent and error.startswith("request rejected") for _, sent, error in result)
+
+
+def test_ticket_outcome():
+    assert push._ticket_outcome(row(7), {"status": "ok", "id": "x"}) == (7, True, None)
+    assert push._ticket_outcome(row(7), {"status": "error", "message": "too big", "details": {"error": "MessageTooBig"}}) == (
+        7,
+        False,
+        "MessageTooBig: too big",
+    )
+    assert push._ticket_outcome(row(7), {"status": "error"}) == (7, False, "error: ")
+    assert len(push._ticket_outcome(row(7), {"status": "error", "message": "x" * 1000})[2]) == 500
+
+
+def test_unregistered_tokens_ignores_other_errors():
+    chunk = [row(1, "a"), row(2, "b"), row(3, "c")]
+    result = [(1, True, None), (2, False, "MessageRateExceeded: slow down"), (3, False, "DeviceNotRegistered: gone")]
+    assert push.unregistered_tokens(chunk, result) == ["c"]
+
+
+class RecordingSession:
+    """Keeps the statements it is given, compiled for Postgres."""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def execute(self, statement):
+        self.statements.append(" ".join(str(statement.compile(dialect=postgresql.dialect())).split()))
+        return SimpleNamespace(all=list)
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_claim_skips_locked_rows():
+    db = RecordingSession()
+    push.claim(db, 50)
+    (sql,) = db.statements
+    assert sql.startswith("SELECT notifications.id, ")
+    assert "ORDER BY notifications.id LIMIT" in sql
+    assert sql.endswith("FOR UPDATE OF notifications SKIP LOCKED")
+
+
+def test_write_outcomes_is_one_update_from_values():
+    db = RecordingSession()
+    outcomes = [(1, True, None), (2, False, "MessageTooBig: too big"), (3, False, "DeviceNotRegistered: gone")]
+    push.write_outcomes(db, outcomes, ["ExponentPushToken[gone]"])
+    notifications, users = db.statements
+    assert notifications.startswith("UPDATE notifications SET ")
+    assert "FROM (VALUES (" in notifications and ") AS outcome (id, sent, error)" in notifications
+    assert notifications.count("VALUES") == 1
+    assert users.startswith("UPDATE users SET push_token=")
+    assert db.commits == 1
+
+
+def test_write_outcomes_nothing_to_write():
+    db = RecordingSession()
+    push.write_outcomes(db, [], [])
+    assert db.statements == [] and db.commits == 1